@@ -165,11 +165,34 @@ FLUTTERWAVE_PUBLIC_KEY = os.environ.get("FLUTTERWAVE_PUBLIC_KEY", "FLW_TEST_PUBL
 FLUTTERWAVE_SECRET_KEY = os.environ.get("FLUTTERWAVE_SECRET_KEY", "FLW_TEST_SECRET_KEY")
 FLUTTERWAVE_BASE_URL = "https://api.flutterwave.com/v3"
 
+# ================================
+# REDIS (channel layer + shared cache)
+# ================================
+REDIS_URL = os.environ.get("REDIS_URL")
+
 CHANNEL_LAYERS = {
     "default": {
         "BACKEND": "channels_redis.core.RedisChannelLayer",
         "CONFIG": {
-            "hosts": [("127.0.0.1", 6379)],
+            "hosts": [REDIS_URL or ("127.0.0.1", 6379)],
         },
     },
-}
\ No newline at end of file
+}
+
+# Read caches (provider cards, schedules, dispatch pools, live positions)
+# are invalidated from signals and written by both the WSGI and ASGI
+# processes, so in production every worker must share one cache.
+# Without REDIS_URL each process keeps its own (single-process dev only).
+if REDIS_URL:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": REDIS_URL,
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
\ No newline at end of file
@@ -4,11 +4,17 @@ from .models import (
     ProviderProfile,
     ServiceCategory,
     ProviderService,
+    ServiceFacetCount,
     Job,
     Booking,
     JobMilestone,
+    JobOffer,
+    JobTrack,
+    MilestoneTemplate,
+    ProviderAvailability,
     ChatRoom,
-    Message
+    Message,
+    Review,
 )
 
 # ----------------------------
@@ -26,10 +32,18 @@ class CustomUserAdmin(admin.ModelAdmin):
 # ----------------------------
 @admin.register(ProviderProfile)
 class ProviderProfileAdmin(admin.ModelAdmin):
-    list_display = ('user', 'slug', 'location', 'rating', 'created_at')
+    list_display = ('user', 'slug', 'location', 'rating', 'rating_count', 'created_at')
+    readonly_fields = ('rating', 'rating_count', 'rating_sum')
     search_fields = ('user__username', 'slug', 'location')
     ordering = ('user__username',)
 
+@admin.register(ProviderAvailability)
+class ProviderAvailabilityAdmin(admin.ModelAdmin):
+    list_display = ('provider', 'weekday', 'start_time', 'end_time')
+    search_fields = ('provider__user__username',)
+    list_filter = ('weekday',)
+    ordering = ('provider__user__username', 'weekday', 'start_time')
+
 # ----------------------------
 # ServiceCategory admin
 # ----------------------------
@@ -60,6 +74,8 @@ class JobAdmin(admin.ModelAdmin):
         'customer',
         'provider',
         'status',
+        'scheduled_for',
+        'scheduled_end',
         'created_at'
     )
     search_fields = (
@@ -72,7 +88,7 @@ class JobAdmin(admin.ModelAdmin):
     ordering = ('-created_at',)
 
     def service_title(self, obj):
-        return obj.service.title
+        return obj.service.title if obj.service else "-"
     service_title.short_description = "Service"
 
     def customer(self, obj):
@@ -80,7 +96,7 @@ class JobAdmin(admin.ModelAdmin):
     customer.short_description = "Customer"
 
     def provider(self, obj):
-        return obj.service.provider.user
+        return obj.provider.user if obj.provider else "-"
     provider.short_description = "Provider"
 
 # ----------------------------
@@ -114,11 +130,11 @@ class BookingAdmin(admin.ModelAdmin):
     customer.short_description = "Customer"
 
     def provider(self, obj):
-        return obj.job.service.provider.user
+        return obj.job.provider.user if obj.job.provider else "-"
     provider.short_description = "Provider"
 
     def service_title(self, obj):
-        return obj.job.service.title
+        return obj.job.service.title if obj.job.service else "-"
     service_title.short_description = "Service"
 
 # ----------------------------
@@ -131,6 +147,30 @@ class JobMilestoneAdmin(admin.ModelAdmin):
     list_filter = ('status',)
     ordering = ('-created_at',)
 
+@admin.register(JobOffer)
+class JobOfferAdmin(admin.ModelAdmin):
+    list_display = ('job', 'provider', 'score', 'status', 'created_at')
+    search_fields = ('job__id', 'provider__user__username')
+    list_filter = ('status',)
+    ordering = ('-created_at',)
+
+@admin.register(MilestoneTemplate)
+class MilestoneTemplateAdmin(admin.ModelAdmin):
+    list_display = ('title', 'category', 'amount_percent', 'position')
+    search_fields = ('title', 'category__name')
+    list_filter = ('category',)
+    ordering = ('category__name', 'position')
+
+
+# ----------------------------
+# Reviews
+# ----------------------------
+@admin.register(Review)
+class ReviewAdmin(admin.ModelAdmin):
+    list_display = ('job', 'provider', 'customer', 'rating', 'created_at')
+    search_fields = ('job__id', 'provider__user__username', 'customer__username')
+    list_filter = ('rating',)
+    ordering = ('-created_at',)
 
 
 # ----------------------------
@@ -138,9 +178,9 @@ class JobMilestoneAdmin(admin.ModelAdmin):
 # ----------------------------
 @admin.register(ChatRoom)
 class ChatRoomAdmin(admin.ModelAdmin):
-    list_display = ('id', 'job', 'created_at')
+    list_display = ('id', 'job', 'created_at', 'last_activity_at')
     search_fields = ('job__id',)
-    readonly_fields = ('created_at',)
+    readonly_fields = ('created_at', 'last_message', 'last_activity_at')
 
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
@@ -179,4 +219,23 @@ class TransactionAdmin(admin.ModelAdmin):
     list_display = ('wallet', 'transaction_type', 'amount', 'description', 'created_at')
     search_fields = ('wallet__user__username', 'transaction_type', 'description')
     list_filter = ('transaction_type',)
-    ordering = ('-created_at',)
\ No newline at end of file
+    ordering = ('-created_at',)
+
+# ----------------------------
+# Service facet counts (maintained by signals)
+# ----------------------------
+@admin.register(ServiceFacetCount)
+class ServiceFacetCountAdmin(admin.ModelAdmin):
+    list_display = ('category', 'price_bucket', 'count')
+    list_filter = ('category',)
+    readonly_fields = ('category', 'price_bucket', 'count')
+
+# ----------------------------
+# Simplified job tracks (built by compact_job_tracks)
+# ----------------------------
+@admin.register(JobTrack)
+class JobTrackAdmin(admin.ModelAdmin):
+    list_display = ('job', 'raw_point_count', 'tolerance_m', 'raw_pruned', 'compacted_at')
+    search_fields = ('job__id',)
+    list_filter = ('raw_pruned',)
+    readonly_fields = ('job', 'points', 'tolerance_m', 'raw_point_count', 'raw_pruned', 'started_at', 'ended_at')
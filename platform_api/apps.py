@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class PlatformApiConfig(AppConfig):
     name = 'platform_api'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -10,8 +10,13 @@ class MessageSerializer(serializers.ModelSerializer):
 
 
 class ChatRoomSerializer(serializers.ModelSerializer):
-    messages = MessageSerializer(many=True, read_only=True)
+    """
+    Inbox row. The history itself is paged through the room's messages
+    endpoint; `unread_count` is annotated by ChatRoomListView.
+    """
+    last_message = MessageSerializer(read_only=True)
+    unread_count = serializers.IntegerField(read_only=True)
 
     class Meta:
         model = ChatRoom
-        fields = ["id", "job", "messages"]
+        fields = ["id", "job", "last_message", "unread_count", "last_activity_at"]
@@ -0,0 +1,122 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import haversine_km
+
+
+def _min_distance_m():
+    return getattr(settings, "LOCATION_MIN_DISTANCE_M", 10)
+
+
+def _min_interval():
+    return getattr(settings, "LOCATION_BROADCAST_INTERVAL", 1.0)
+
+
+def _heartbeat():
+    return getattr(settings, "LOCATION_HEARTBEAT", 15.0)
+
+
+def is_significant(last, lat, lng, status, now):
+    """
+    Whether an update is worth broadcasting given the last one sent
+    (a (lat, lng, status, sent_at) tuple or None): a status change, a move
+    of at least LOCATION_MIN_DISTANCE_M, or LOCATION_HEARTBEAT seconds of
+    silence.
+    """
+    if last is None:
+        return True
+    last_lat, last_lng, last_status, sent_at = last
+    if status != last_status or now - sent_at >= _heartbeat():
+        return True
+    if None in (lat, lng, last_lat, last_lng):
+        return False
+    return haversine_km(last_lat, last_lng, lat, lng) * 1000 >= _min_distance_m()
+
+
+# ----------------------------
+# WebSocket path (per process)
+# ----------------------------
+class _JobState:
+    __slots__ = ("last", "pending", "timer")
+
+    def __init__(self):
+        self.last = None
+        self.pending = None
+        self.timer = None
+
+
+class LocationCoalescer:
+    """
+    Per-job broadcast gate for consumers. Insignificant updates are dropped;
+    significant ones go out at most once per LOCATION_BROADCAST_INTERVAL,
+    and updates arriving inside an interval replace each other so only the
+    latest position is sent when the interval ends.
+    """
+
+    def __init__(self):
+        self._jobs = {}
+
+    def offer(self, job_id, lat, lng, status, send):
+        """
+        `send(lat, lng, status)` is a coroutine function called for every
+        update that is broadcast.
+        """
+        state = self._jobs.setdefault(job_id, _JobState())
+        now = time.monotonic()
+        if state.pending is None and not is_significant(state.last, lat, lng, status, now):
+            return
+        if state.pending is not None:
+            state.pending = (lat, lng, status, send)
+            return
+
+        wait = 0 if state.last is None else state.last[3] + _min_interval() - now
+        if wait <= 0:
+            self._send(state, lat, lng, status, send, now)
+        else:
+            state.pending = (lat, lng, status, send)
+            state.timer = asyncio.get_running_loop().call_later(wait, self._flush, job_id)
+
+    def _flush(self, job_id):
+        state = self._jobs.get(job_id)
+        if state is None or state.pending is None:
+            return
+        lat, lng, status, send = state.pending
+        state.pending = state.timer = None
+        self._send(state, lat, lng, status, send, time.monotonic())
+
+    def _send(self, state, lat, lng, status, send, now):
+        state.last = (lat, lng, status, now)
+        asyncio.ensure_future(send(lat, lng, status))
+
+    def forget(self, job_id):
+        state = self._jobs.pop(job_id, None)
+        if state is not None and state.timer is not None:
+            state.timer.cancel()
+
+
+coalescer = LocationCoalescer()
+
+
+# ----------------------------
+# HTTP path (shared through the cache)
+# ----------------------------
+def should_broadcast(job_id, lat, lng, status):
+    """
+    Cross-process gate for JobLocationUpdateView. There is no timer to hold
+    back a throttled update on this path, so it is dropped; the client's
+    next ping carries a newer position anyway.
+    """
+    last_key = f"job-broadcast:{job_id}"
+    now = time.time()
+    last = cache.get(last_key)
+    if not is_significant(last, lat, lng, status, now):
+        return False
+    status_changed = last is None or last[2] != status
+    # cache.add is atomic: one broadcast per interval across processes.
+    if not cache.add(f"job-broadcast-tick:{job_id}", 1, _min_interval()) and not status_changed:
+        return False
+    cache.set(last_key, (lat, lng, status, now), _heartbeat() * 4)
+    return True
@@ -1,12 +1,41 @@
 import json
+from channels.db import database_sync_to_async
 from channels.generic.websocket import AsyncWebsocketConsumer
-from asgiref.sync import sync_to_async
-from .models import JobLocationLog
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from . import eta
+from .coalescing import coalescer
+from .frames import SUBPROTOCOL, FrameDecoder, FrameEncoder
+from .geo import parse_coordinates
+from .chat_serializers import MessageSerializer
+from .location_buffer import location_buffer
+from .models import ChatRoom, Job, Message
+from .positions import last_position, last_positions, record_position
+
+def participant_job_ids(user, job_ids):
+    """
+    The subset of job_ids the user may follow: staff see every job, other
+    users the jobs they are the customer or provider of.
+    """
+    jobs = Job.objects.filter(pk__in=job_ids)
+    if not user.is_staff:
+        jobs = jobs.filter(Q(customer=user) | Q(provider__user=user))
+    return set(jobs.values_list("id", flat=True))
+
 
 class JobConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         self.job_id = self.scope['url_route']['kwargs']['job_id']
+        user = self.scope["user"]
+        if not user.is_authenticated or not await database_sync_to_async(participant_job_ids)(user, [self.job_id]):
+            await self.close()
+            return
         self.group_name = f"job_{self.job_id}"
+        # Binary frames if the client negotiated them, JSON text otherwise
+        self.binary = SUBPROTOCOL in self.scope.get("subprotocols", [])
+        self.encoder = FrameEncoder()
+        self.decoder = FrameDecoder()
 
         # Join the job group
         await self.channel_layer.group_add(
@@ -14,10 +43,26 @@ class JobConsumer(AsyncWebsocketConsumer):
             self.channel_name
         )
 
-        await self.accept()
+        await self.accept(subprotocol=SUBPROTOCOL if self.binary else None)
         print(f"WebSocket connected for job {self.job_id}")
 
+        # Send the last known position right away instead of waiting for
+        # the next ping
+        snapshot = await database_sync_to_async(last_position)(self.job_id)
+        if snapshot is None:
+            pass
+        elif self.binary:
+            await self.send_position(snapshot)
+        else:
+            await self.send(text_data=json.dumps(snapshot))
+
     async def disconnect(self, close_code):
+        if not hasattr(self, "group_name"):
+            return
+        user = self.scope["user"]
+        if user.role == "provider":
+            coalescer.forget(self.job_id)
+
         # Leave the group
         await self.channel_layer.group_discard(
             self.group_name,
@@ -25,36 +70,69 @@ class JobConsumer(AsyncWebsocketConsumer):
         )
         print(f"WebSocket disconnected for job {self.job_id}")
 
-    async def receive(self, text_data):
+    async def receive(self, text_data=None, bytes_data=None):
         """
-        Receive a message from the WebSocket.
-        Expected format from provider:
+        Receive a location from the job's provider:
         {
             "lat": 6.5244,
-            "lng": 3.3792,
-            "status": "in_progress"
+            "lng": 3.3792
         }
+        or a binary frame (see frames.py) on the binary subprotocol.
+        Malformed messages and out-of-range coordinates are ignored. A
+        status in the message is ignored too: broadcasts and the position
+        cache carry the job's own status, which only changes through
+        transitions. Frames from other participants are ignored.
         """
-        data = json.loads(text_data)
-        lat = data.get("lat")
-        lng = data.get("lng")
-        status = data.get("status", "in_progress")
+        if self.scope["user"].role != "provider":
+            return
+        if bytes_data is not None:
+            try:
+                lat, lng, _ = self.decoder.decode(bytes_data)
+                # Frames carry any 32-bit fixed-point value; range-check
+                # them like JSON coordinates.
+                lat, lng = parse_coordinates(lat, lng)
+            except ValueError:
+                return
+        else:
+            try:
+                data = json.loads(text_data)
+                lat, lng = parse_coordinates(data.get("lat"), data.get("lng"))
+            except (ValueError, AttributeError):
+                return
+        if lat is None or lng is None:
+            return
 
-        user = self.scope["user"]
-        # Save provider location to database if authenticated
-        if user.is_authenticated and user.role == "provider" and lat is not None and lng is not None:
-            await sync_to_async(JobLocationLog.objects.create)(
-                job_id=self.job_id,
-                provider=user,
-                lat=lat,
-                lng=lng,
+        # Queue the ping for the next batched write; everything else about
+        # it waits for the coalesced tick.
+        location_buffer.add(self.job_id, self.scope["user"].id, lat, lng, timezone.now())
+        coalescer.offer(self.job_id, lat, lng, None, self.publish)
+
+    async def publish(self, lat, lng, status):
+        """
+        Coalesced tick of a provider's pings: run the ETA and geofence
+        checks, remember the position, then broadcast it with the job's
+        status (the coalesced `status` is always None). Runs at most once
+        per LOCATION_BROADCAST_INTERVAL per job rather than on every ping.
+        """
+        status, events = await database_sync_to_async(self.track)(lat, lng)
+        await self.broadcast(lat, lng, status)
+        for event in events:
+            await self.channel_layer.group_send(
+                self.group_name, {"type": "job_event", "job_id": self.job_id, "data": event}
             )
 
-        # Broadcast the location update to the group
+    def track(self, lat, lng):
+        # ETA first: arriving moves the job to in_progress, and the
+        # recorded position should already show that.
+        events = eta.process_ping(self.job_id, lat, lng)
+        return record_position(self.job_id, lat, lng)["status"], events
+
+    async def broadcast(self, lat, lng, status):
         await self.channel_layer.group_send(
             self.group_name,
             {
                 "type": "job_update",  # matches the handler below
+                "job_id": self.job_id,
                 "data": {
                     "lat": lat,
                     "lng": lng,
@@ -66,6 +144,195 @@ class JobConsumer(AsyncWebsocketConsumer):
     async def job_update(self, event):
         """
         Send location updates to all clients in the group.
-        Frontend receives: { lat, lng, status }
+        Frontend receives: { lat, lng, status }, or a binary frame.
+        """
+        await self.send_position(event["data"])
+
+    async def job_event(self, event):
         """
-        await self.send(text_data=json.dumps(event["data"]))
\ No newline at end of file
+        ETA and arrival events: {"event": "eta" | "approaching" | "arrived", ...}.
+        Always JSON text, also on the binary subprotocol.
+        """
+        await self.send(text_data=json.dumps(event["data"]))
+
+    async def send_position(self, data):
+        if self.binary:
+            await self.send(bytes_data=self.encoder.encode(data["lat"], data["lng"], data["status"]))
+        else:
+            await self.send(text_data=json.dumps(data))
+
+
+class JobsConsumer(AsyncWebsocketConsumer):
+    """
+    One socket for many jobs (ws/jobs/). Clients send
+        {"action": "subscribe", "job_ids": [1, 2]}
+        {"action": "unsubscribe", "job_ids": [2]}
+    and receive {"type": "position", "job_id", "lat", "lng", "status"}
+    for every subscribed job, starting with its last known position, plus
+    {"type": "event", "job_id", "event", ...} ETA and arrival events.
+    Staff may watch any job; other users only jobs they are the customer
+    or provider of.
+    """
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        if not self.user.is_authenticated:
+            await self.close()
+            return
+        self.job_ids = set()
+        self.max_subscriptions = getattr(settings, "JOBS_SOCKET_MAX_SUBSCRIPTIONS", 200)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        for job_id in getattr(self, "job_ids", ()):
+            await self.channel_layer.group_discard(f"job_{job_id}", self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or "")
+            action = data["action"]
+            job_ids = {int(job_id) for job_id in data["job_ids"]}
+        except (ValueError, KeyError, TypeError):
+            await self.send_json({"type": "error", "detail": "Expected {action, job_ids}."})
+            return
+
+        if action == "subscribe":
+            await self.subscribe(job_ids - self.job_ids)
+        elif action == "unsubscribe":
+            for job_id in job_ids & self.job_ids:
+                await self.channel_layer.group_discard(f"job_{job_id}", self.channel_name)
+            self.job_ids -= job_ids
+            await self.send_json({"type": "unsubscribed", "job_ids": sorted(job_ids)})
+        else:
+            await self.send_json({"type": "error", "detail": f"Unknown action '{action}'."})
+
+    async def subscribe(self, job_ids):
+        room = self.max_subscriptions - len(self.job_ids)
+        allowed = sorted(await database_sync_to_async(participant_job_ids)(self.user, job_ids))[:max(room, 0)]
+        for job_id in allowed:
+            await self.channel_layer.group_add(f"job_{job_id}", self.channel_name)
+        self.job_ids.update(allowed)
+        await self.send_json({
+            "type": "subscribed",
+            "job_ids": allowed,
+            "denied": sorted(job_ids - set(allowed)),
+        })
+
+        snapshots = await database_sync_to_async(last_positions)(allowed)
+        for job_id in allowed:
+            if job_id in snapshots:
+                await self.send_position(job_id, snapshots[job_id])
+
+    async def job_update(self, event):
+        await self.send_position(event["job_id"], event["data"])
+
+    async def job_event(self, event):
+        await self.send_json(dict(event["data"], type="event", job_id=int(event["job_id"])))
+
+    async def send_position(self, job_id, data):
+        await self.send_json(dict(data, type="position", job_id=int(job_id)))
+
+    async def send_json(self, content):
+        await self.send(text_data=json.dumps(content))
+
+
+class ChatConsumer(AsyncWebsocketConsumer):
+    """
+    Live chat for a job (ws/chat/<job_id>/), open to its customer, its
+    provider and staff. Clients send
+        {"action": "send", "text": "...", "client_id": "..."}
+        {"action": "typing", "typing": true}
+        {"action": "read", "up_to": <message id>}
+    The sender gets {"type": "ack", "client_id", "message"} once the message
+    is stored; the room receives {"type": "message", "message"} (also for
+    messages sent over HTTP), {"type": "typing", "user_id", "typing"} (not
+    echoed to the typist) and {"type": "read", "user_id", "up_to"}. After a
+    reconnect, clients catch up with the history endpoint's `after` cursor.
+    """
+
+    async def connect(self):
+        self.user = self.scope["user"]
+        self.job_id = self.scope["url_route"]["kwargs"]["job_id"]
+        if not self.user.is_authenticated or not await database_sync_to_async(participant_job_ids)(
+            self.user, [self.job_id]
+        ):
+            await self.close()
+            return
+        self.group_name = f"chat_{self.job_id}"
+        self.room_id = None
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+
+    async def disconnect(self, close_code):
+        if hasattr(self, "group_name"):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data=None, bytes_data=None):
+        try:
+            data = json.loads(text_data or "")
+            action = data["action"]
+        except (ValueError, KeyError, TypeError):
+            await self.send_json({"type": "error", "detail": "Expected {action, ...}."})
+            return
+
+        if action == "send":
+            await self.send_message(data)
+        elif action == "typing":
+            await self.channel_layer.group_send(self.group_name, {
+                "type": "chat_typing",
+                "user_id": self.user.id,
+                "typing": bool(data.get("typing", True)),
+                "sender_channel": self.channel_name,
+            })
+        elif action == "read":
+            await self.mark_read(data)
+        else:
+            await self.send_json({"type": "error", "detail": f"Unknown action '{action}'."})
+
+    async def send_message(self, data):
+        text = data.get("text")
+        if not isinstance(text, str) or not text.strip():
+            await self.send_json({"type": "error", "detail": "Message text is required."})
+            return
+        message = await database_sync_to_async(self.store_message)(text)
+        await self.send_json({"type": "ack", "client_id": data.get("client_id"), "message": message})
+        await self.channel_layer.group_send(
+            self.group_name, {"type": "chat_message", "job_id": self.job_id, "message": message}
+        )
+
+    async def mark_read(self, data):
+        try:
+            up_to = int(data["up_to"])
+        except (KeyError, TypeError, ValueError):
+            await self.send_json({"type": "error", "detail": "Expected {action, up_to}."})
+            return
+        await database_sync_to_async(self.store_read)(up_to)
+        await self.channel_layer.group_send(
+            self.group_name, {"type": "chat_read", "user_id": self.user.id, "up_to": up_to}
+        )
+
+    def store_message(self, text):
+        if self.room_id is None:
+            self.room_id = ChatRoom.objects.get_or_create(job_id=self.job_id)[0].id
+        message = Message.objects.create(room_id=self.room_id, sender=self.user, text=text)
+        return dict(MessageSerializer(message).data)
+
+    def store_read(self, up_to):
+        if self.room_id is None:
+            self.room_id = ChatRoom.objects.filter(job_id=self.job_id).values_list("id", flat=True).first()
+        Message.objects.filter(room_id=self.room_id, id__lte=up_to, read=False).exclude(
+            sender=self.user
+        ).update(read=True)
+
+    async def chat_message(self, event):
+        await self.send_json({"type": "message", "message": event["message"]})
+
+    async def chat_typing(self, event):
+        if event["sender_channel"] != self.channel_name:
+            await self.send_json({"type": "typing", "user_id": event["user_id"], "typing": event["typing"]})
+
+    async def chat_read(self, event):
+        await self.send_json({"type": "read", "user_id": event["user_id"], "up_to": event["up_to"]})
+
+    async def send_json(self, content):
+        await self.send(text_data=json.dumps(content))
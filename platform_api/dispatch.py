@@ -0,0 +1,198 @@
+import heapq
+import threading
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, Q
+
+from .geo import haversine_km
+from .job_workflow import lock_provider_schedule, reprice_milestones, transition_job
+from .models import Job, JobOffer, ProviderProfile
+from .scheduling import ScheduleConflict, check_conflicts
+
+ACTIVE_JOB_STATUSES = ("accepted", "in_progress")
+POOL_TTL = 60
+VERSION_TTL = 60 * 60 * 24
+DEFAULT_WEIGHTS = {"distance": 0.5, "rating": 0.3, "workload": 0.2}
+
+
+def _weights():
+    return getattr(settings, "DISPATCH_WEIGHTS", DEFAULT_WEIGHTS)
+
+
+def _max_distance_km():
+    return getattr(settings, "DISPATCH_MAX_DISTANCE_KM", 50)
+
+
+def _offers_per_job():
+    return getattr(settings, "DISPATCH_OFFERS_PER_JOB", 5)
+
+
+def _version_key(category_id):
+    return f"dispatch:pool-version:{category_id}"
+
+
+def invalidate_pools(category_ids):
+    """
+    Mark candidate pools stale in every process that shares the cache
+    (REDIS_URL); each reloads its copy on the next lookup instead of on
+    every job. With a process-local cache only this process is told, and
+    POOL_TTL bounds how stale the others get.
+    """
+    cache.set_many(
+        {_version_key(category_id): uuid.uuid4().hex for category_id in category_ids}, VERSION_TTL
+    )
+
+
+class CandidatePool:
+    __slots__ = ("version", "loaded_at", "providers")
+
+    def __init__(self, version, providers):
+        self.version = version
+        self.loaded_at = time.monotonic()
+        # provider_id -> [lat, lng, rating, active_jobs]
+        self.providers = providers
+
+
+class Dispatcher:
+    """
+    Per-category candidate pools held in memory, so ranking a job is a pass
+    over that category's providers with no database access. Pools are
+    reloaded (one query) when another process invalidates them or after
+    POOL_TTL; workload changes seen by this process are applied in place.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pools = {}
+
+    def pool(self, category_id):
+        version = cache.get(_version_key(category_id))
+        with self._lock:
+            pool = self._pools.get(category_id)
+            if pool and pool.version == version and time.monotonic() - pool.loaded_at < POOL_TTL:
+                return pool
+        pool = CandidatePool(version, self._load(category_id))
+        with self._lock:
+            self._pools[category_id] = pool
+        return pool
+
+    def _load(self, category_id):
+        rows = (
+            ProviderProfile.objects.filter(services__category_id=category_id)
+            .annotate(active_jobs=Count(
+                "provider_jobs",
+                filter=Q(provider_jobs__status__in=ACTIVE_JOB_STATUSES),
+                distinct=True,
+            ))
+            .values_list("id", "latitude", "longitude", "rating", "active_jobs")
+            .distinct()
+        )
+        return {
+            provider_id: [lat, lng, float(rating), active_jobs]
+            for provider_id, lat, lng, rating, active_jobs in rows
+        }
+
+    def adjust_workload(self, provider_id, delta):
+        with self._lock:
+            for pool in self._pools.values():
+                entry = pool.providers.get(provider_id)
+                if entry is not None:
+                    entry[3] = max(entry[3] + delta, 0)
+
+    def rank(self, job, limit=None, exclude=()):
+        """
+        Return [(provider_id, score), ...] best first for an open job.
+        """
+        weights = _weights()
+        max_distance = _max_distance_km()
+        has_site = job.site_latitude is not None and job.site_longitude is not None
+
+        def scored():
+            for provider_id, (lat, lng, rating, active_jobs) in self.pool(job.category_id).providers.items():
+                if provider_id in exclude:
+                    continue
+                if has_site and lat is not None and lng is not None:
+                    distance = haversine_km(job.site_latitude, job.site_longitude, lat, lng)
+                    if distance > max_distance:
+                        continue
+                    distance_score = 1 / (1 + distance / 10)
+                else:
+                    distance_score = 0.5
+                score = (
+                    weights["distance"] * distance_score
+                    + weights["rating"] * rating / 5
+                    + weights["workload"] / (1 + active_jobs)
+                )
+                yield score, provider_id
+
+        best = heapq.nlargest(limit or _offers_per_job(), scored())
+        return [(provider_id, round(score, 4)) for score, provider_id in best]
+
+
+dispatcher = Dispatcher()
+
+
+# ----------------------------
+# Offers
+# ----------------------------
+def dispatch_jobs(jobs, limit=None):
+    """
+    Offer each open job to its best candidates. All offers for the batch are
+    written with a single bulk insert.
+    """
+    jobs = [job for job in jobs if job.provider_id is None and job.category_id is not None]
+    already_offered = {}
+    for job_id, provider_id in JobOffer.objects.filter(job__in=jobs).values_list("job_id", "provider_id"):
+        already_offered.setdefault(job_id, set()).add(provider_id)
+
+    offers = []
+    for job in jobs:
+        offers += [
+            JobOffer(job=job, provider_id=provider_id, score=score)
+            for provider_id, score in dispatcher.rank(job, limit, exclude=already_offered.get(job.pk, ()))
+        ]
+    return JobOffer.objects.bulk_create(offers, ignore_conflicts=True)
+
+
+class OfferUnavailable(Exception):
+    pass
+
+
+def accept_offer(offer):
+    """
+    Bind the job to the offer's provider, expire the competing offers and
+    move the job to 'accepted'.
+    """
+    with transaction.atomic():
+        job = Job.objects.select_for_update().get(pk=offer.job_id)
+        offer = JobOffer.objects.select_for_update().get(pk=offer.pk)
+        if offer.status != "pending" or job.provider_id is not None:
+            raise OfferUnavailable("This job is no longer available.")
+
+        service = (
+            offer.provider.services.filter(category_id=job.category_id)
+            .order_by("price", "id")
+            .first()
+        )
+        if service is None:
+            raise OfferUnavailable("You no longer offer this service category.")
+        lock_provider_schedule(offer.provider_id)
+        try:
+            check_conflicts(offer.provider_id, job.scheduled_for, job.scheduled_end)
+        except ScheduleConflict as e:
+            raise OfferUnavailable(str(e))
+
+        job.provider_id = offer.provider_id
+        job.service = service
+        job.save(update_fields=["provider", "service", "updated_at"])
+        reprice_milestones(job, service)
+
+        offer.status = "accepted"
+        offer.save(update_fields=["status"])
+        job.offers.filter(status="pending").exclude(pk=offer.pk).update(status="expired")
+        transition_job(job, "accepted")
+    return job
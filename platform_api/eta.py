@@ -0,0 +1,121 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .geo import haversine_km
+from .job_workflow import InvalidTransition, transition_job
+from .models import Job
+
+# Phases only move forward: en_route -> approaching -> arrived.
+PHASES = ("en_route", "approaching", "arrived")
+SPEED_SMOOTHING = 0.3       # EMA weight of the newest speed sample
+MAX_SPEED_MPS = 50          # faster samples are GPS jumps and are ignored
+STALE_AFTER_SECONDS = 300   # a longer gap restarts the speed estimate
+MIN_MOVING_SPEED_MPS = 0.5  # below this no ETA is given
+STATE_TTL = 60 * 60 * 12
+
+
+def _approach_radius_m():
+    return getattr(settings, "ETA_APPROACH_RADIUS_M", 500)
+
+
+def _arrival_radius_m():
+    return getattr(settings, "ETA_ARRIVAL_RADIUS_M", 75)
+
+
+def _broadcast_interval():
+    return getattr(settings, "ETA_BROADCAST_INTERVAL", 10)
+
+
+def _key(job_id):
+    return f"job-eta:{job_id}"
+
+
+def _initial_state(job_id):
+    site = (
+        Job.objects.filter(pk=job_id)
+        .values_list("site_latitude", "site_longitude")
+        .first()
+    )
+    return {
+        "site": site if site and None not in site else None,
+        "lat": None,
+        "lng": None,
+        "t": None,
+        "speed": None,
+        "phase": "en_route",
+        "eta_sent_at": 0,
+    }
+
+
+def update(job_id, lat, lng, now=None):
+    """
+    Feed one ping into the job's tracker and return the events to
+    broadcast: [{"event": "eta", ...}, {"event": "approaching"}, ...].
+
+    The state (previous fix, smoothed speed, phase) lives in the cache, so
+    each ping is one cache read and write; the job site is read from the
+    database once, when the tracker is created.
+    """
+    now = time.time() if now is None else now
+    state = cache.get(_key(job_id)) or _initial_state(job_id)
+    if state["site"] is None:
+        cache.set(_key(job_id), state, STATE_TTL)
+        return []
+
+    if state["t"] is not None:
+        elapsed = now - state["t"]
+        if elapsed > STALE_AFTER_SECONDS:
+            state["speed"] = None
+        elif elapsed > 0:
+            sample = haversine_km(state["lat"], state["lng"], lat, lng) * 1000 / elapsed
+            if sample <= MAX_SPEED_MPS:
+                state["speed"] = sample if state["speed"] is None else (
+                    SPEED_SMOOTHING * sample + (1 - SPEED_SMOOTHING) * state["speed"]
+                )
+    state["lat"], state["lng"], state["t"] = lat, lng, now
+
+    distance_m = haversine_km(lat, lng, *state["site"]) * 1000
+    phase = "arrived" if distance_m <= _arrival_radius_m() else (
+        "approaching" if distance_m <= _approach_radius_m() else "en_route"
+    )
+    events = []
+    if PHASES.index(phase) > PHASES.index(state["phase"]):
+        # Skipping straight to "arrived" still announces the approach.
+        for passed in PHASES[PHASES.index(state["phase"]) + 1:PHASES.index(phase) + 1]:
+            events.append({"event": passed, "distance_m": round(distance_m)})
+        state["phase"] = phase
+
+    if state["phase"] != "arrived" and (events or now - state["eta_sent_at"] >= _broadcast_interval()):
+        speed = state["speed"]
+        events.insert(0, {
+            "event": "eta",
+            "distance_m": round(distance_m),
+            "speed_mps": round(speed, 2) if speed is not None else None,
+            "eta_seconds": round(distance_m / speed) if speed and speed >= MIN_MOVING_SPEED_MPS else None,
+        })
+        state["eta_sent_at"] = now
+
+    cache.set(_key(job_id), state, STATE_TTL)
+    return events
+
+
+def process_ping(job_id, lat, lng):
+    """
+    update() plus the side effect of arriving: an accepted job moves to
+    in_progress automatically.
+    """
+    events = update(job_id, lat, lng)
+    if any(event["event"] == "arrived" for event in events):
+        job = Job.objects.filter(pk=job_id).only("id", "provider_id", "status").first()
+        if job is not None and job.status == "accepted":
+            try:
+                transition_job(job, "in_progress")
+            except InvalidTransition:
+                pass
+    return events
+
+
+def discard(job_id):
+    cache.delete(_key(job_id))
@@ -0,0 +1,103 @@
+from bisect import bisect_right
+from decimal import Decimal
+
+from django.db.models import Case, Count, F, IntegerField, Value, When
+
+from .models import ServiceCategory, ServiceFacetCount
+
+# Upper bounds (exclusive, NGN) of every price bucket but the last.
+PRICE_BUCKET_BOUNDS = (5000, 10000, 25000, 50000, 100000)
+
+
+def price_bucket(price):
+    # Prices are not coerced until the row is reloaded, so a service
+    # created with price="7500" still carries the string here.
+    return bisect_right(PRICE_BUCKET_BOUNDS, Decimal(str(price)))
+
+
+def bucket_range(bucket):
+    lower = PRICE_BUCKET_BOUNDS[bucket - 1] if bucket > 0 else 0
+    upper = PRICE_BUCKET_BOUNDS[bucket] if bucket < len(PRICE_BUCKET_BOUNDS) else None
+    return lower, upper
+
+
+def _bucket_expression():
+    return Case(
+        *[When(price__lt=bound, then=Value(index)) for index, bound in enumerate(PRICE_BUCKET_BOUNDS)],
+        default=Value(len(PRICE_BUCKET_BOUNDS)),
+        output_field=IntegerField(),
+    )
+
+
+# ----------------------------
+# Maintenance (called from signals)
+# ----------------------------
+def adjust(category_id, bucket, delta):
+    updated = ServiceFacetCount.objects.filter(
+        category_id=category_id, price_bucket=bucket
+    ).update(count=F('count') + delta)
+    if not updated:
+        facet, created = ServiceFacetCount.objects.get_or_create(
+            category_id=category_id, price_bucket=bucket, defaults={'count': delta}
+        )
+        if not created:
+            ServiceFacetCount.objects.filter(pk=facet.pk).update(count=F('count') + delta)
+
+
+def record_service_change(previous, current):
+    """
+    previous/current are (category_id, bucket) pairs or None.
+    """
+    if previous == current:
+        return
+    if previous is not None:
+        adjust(*previous, -1)
+    if current is not None:
+        adjust(*current, 1)
+
+
+# ----------------------------
+# Facet queries
+# ----------------------------
+def _format(category_counts, bucket_counts):
+    names = dict(ServiceCategory.objects.filter(id__in=category_counts).values_list('id', 'name'))
+    categories = [
+        {'id': category_id, 'name': names[category_id], 'count': count}
+        for category_id, count in sorted(category_counts.items(), key=lambda item: names.get(item[0], ''))
+        if count > 0 and category_id in names
+    ]
+    price_buckets = []
+    for bucket in range(len(PRICE_BUCKET_BOUNDS) + 1):
+        lower, upper = bucket_range(bucket)
+        price_buckets.append({'min': lower, 'max': upper, 'count': bucket_counts.get(bucket, 0)})
+    return {'categories': categories, 'price_buckets': price_buckets}
+
+
+def facets_from_counts(category_id=None):
+    """
+    Facets for the unfiltered or category-filtered listing, read from the
+    maintained aggregate table. Category counts ignore the category filter
+    so clients can offer the other categories as alternatives.
+    """
+    category_counts, bucket_counts = {}, {}
+    for row_category, bucket, count in ServiceFacetCount.objects.values_list('category_id', 'price_bucket', 'count'):
+        category_counts[row_category] = category_counts.get(row_category, 0) + count
+        if category_id is None or row_category == category_id:
+            bucket_counts[bucket] = bucket_counts.get(bucket, 0) + count
+    return _format(category_counts, bucket_counts)
+
+
+def facets_from_queryset(queryset, category_queryset):
+    """
+    Facets for narrower filters (price range, provider), grouped over the
+    index-narrowed querysets. category_queryset is the same filter without
+    the category restriction.
+    """
+    category_counts = dict(
+        category_queryset.order_by().values('category_id').annotate(count=Count('id')).values_list('category_id', 'count')
+    )
+    bucket_counts = dict(
+        queryset.order_by().annotate(bucket=_bucket_expression())
+        .values('bucket').annotate(count=Count('id')).values_list('bucket', 'count')
+    )
+    return _format(category_counts, bucket_counts)
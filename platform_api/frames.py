@@ -0,0 +1,77 @@
+import struct
+
+from .models import Job
+
+# Binary location frames, negotiated with the "mimi.location.v1" WebSocket
+# subprotocol; clients that don't ask for it keep getting JSON text.
+#
+#   key frame   <BBii  type=1, status, lat * 1e6, lng * 1e6     (10 bytes)
+#   delta frame <BBhh  type=2, status, dlat * 1e6, dlng * 1e6  (6 bytes)
+#
+# Deltas are against the previous frame on the same connection in the same
+# direction; a key frame is sent first and whenever a delta would overflow
+# int16 (about 3 km). Coordinates resolve to ~0.1 m. A key frame with both
+# coordinates set to NO_POSITION carries a status without a position.
+SUBPROTOCOL = "mimi.location.v1"
+KEY_FRAME = struct.Struct("<BBii")
+DELTA_FRAME = struct.Struct("<BBhh")
+KEY, DELTA = 1, 2
+SCALE = 1_000_000
+NO_POSITION = -2 ** 31
+INT16_RANGE = range(-2 ** 15, 2 ** 15)
+
+STATUSES = [code for code, _ in Job.STATUS_CHOICES]
+UNKNOWN_STATUS = 255
+
+
+def _status_code(status):
+    return STATUSES.index(status) if status in STATUSES else UNKNOWN_STATUS
+
+
+def _status(code):
+    return STATUSES[code] if code < len(STATUSES) else None
+
+
+class FrameEncoder:
+    def __init__(self):
+        self._previous = None
+
+    def encode(self, lat, lng, status):
+        status_code = _status_code(status)
+        if lat is None or lng is None:
+            self._previous = None
+            return KEY_FRAME.pack(KEY, status_code, NO_POSITION, NO_POSITION)
+
+        point = (round(lat * SCALE), round(lng * SCALE))
+        previous, self._previous = self._previous, point
+        if previous is not None:
+            dlat, dlng = point[0] - previous[0], point[1] - previous[1]
+            if dlat in INT16_RANGE and dlng in INT16_RANGE:
+                return DELTA_FRAME.pack(DELTA, status_code, dlat, dlng)
+        return KEY_FRAME.pack(KEY, status_code, *point)
+
+
+class FrameDecoder:
+    def __init__(self):
+        self._previous = None
+
+    def decode(self, data):
+        """
+        (lat, lng, status) from one frame; ValueError if it is malformed or
+        a delta arrives before any key frame.
+        """
+        if data[:1] == bytes([KEY]) and len(data) == KEY_FRAME.size:
+            _, status_code, lat, lng = KEY_FRAME.unpack(data)
+            if lat == NO_POSITION and lng == NO_POSITION:
+                self._previous = None
+                return None, None, _status(status_code)
+            self._previous = (lat, lng)
+        elif data[:1] == bytes([DELTA]) and len(data) == DELTA_FRAME.size:
+            if self._previous is None:
+                raise ValueError("Delta frame without a preceding key frame.")
+            _, status_code, dlat, dlng = DELTA_FRAME.unpack(data)
+            lat, lng = self._previous[0] + dlat, self._previous[1] + dlng
+            self._previous = (lat, lng)
+        else:
+            raise ValueError("Malformed location frame.")
+        return lat / SCALE, lng / SCALE, _status(status_code)
@@ -0,0 +1,196 @@
+import math
+
+from django.core.cache import cache
+from django.db.models import Q
+
+from .models import ProviderProfile
+
+EARTH_RADIUS_KM = 6371.0
+GEOHASH_PRECISION = 9
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+
+# Approximate (width, height) in km of a geohash cell at the equator for each
+# precision; the grid lookup uses the finest precision whose cells are still
+# larger than the search radius.
+_CELL_SIZE_KM = {
+    1: (5009.4, 4992.6),
+    2: (1252.3, 624.1),
+    3: (156.5, 156.0),
+    4: (39.1, 19.5),
+    5: (4.9, 4.9),
+    6: (1.2, 0.61),
+}
+GRID_PRECISIONS = tuple(sorted(_CELL_SIZE_KM))
+MAX_RADIUS_KM = 500
+GRID_CACHE_TIMEOUT = 60 * 10
+
+
+# ----------------------------
+# Geohash helpers
+# ----------------------------
+def encode_geohash(lat, lng, precision=GEOHASH_PRECISION):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, bounds = (lng, lng_range) if even else (lat, lat_range)
+        middle = (bounds[0] + bounds[1]) / 2
+        bits <<= 1
+        if value >= middle:
+            bits |= 1
+            bounds[0] = middle
+        else:
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return ''.join(chars)
+
+
+def decode_geohash_bounds(geohash):
+    lat_range, lng_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _DECODE[char]
+        for shift in range(4, -1, -1):
+            bounds = lng_range if even else lat_range
+            middle = (bounds[0] + bounds[1]) / 2
+            if (bits >> shift) & 1:
+                bounds[0] = middle
+            else:
+                bounds[1] = middle
+            even = not even
+    return lat_range, lng_range
+
+
+def neighbouring_cells(geohash):
+    """
+    The cell itself plus its eight neighbours, at the same precision.
+    """
+    (lat_min, lat_max), (lng_min, lng_max) = decode_geohash_bounds(geohash)
+    lat_step, lng_step = lat_max - lat_min, lng_max - lng_min
+    lat_center, lng_center = (lat_min + lat_max) / 2, (lng_min + lng_max) / 2
+    cells = set()
+    for dlat in (-1, 0, 1):
+        lat = lat_center + dlat * lat_step
+        if not -90 <= lat <= 90:
+            continue
+        for dlng in (-1, 0, 1):
+            lng = (lng_center + dlng * lng_step + 180) % 360 - 180
+            cells.add(encode_geohash(lat, lng, len(geohash)))
+    return cells
+
+
+def haversine_km(lat1, lng1, lat2, lng2):
+    lat1, lng1, lat2, lng2 = map(math.radians, (lat1, lng1, lat2, lng2))
+    a = (
+        math.sin((lat2 - lat1) / 2) ** 2
+        + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+
+def parse_coordinates(lat, lng):
+    """
+    (lat, lng) as floats, or (None, None) if neither is given. ValueError
+    unless both are finite numbers within the valid ranges.
+    """
+    if lat in (None, "") and lng in (None, ""):
+        return None, None
+    try:
+        lat, lng = float(lat), float(lng)
+    except (TypeError, ValueError):
+        raise ValueError("lat and lng must be numbers")
+    if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+        raise ValueError("lat and lng must be valid coordinates")
+    return lat, lng
+
+
+def grid_precision_for(lat, radius_km):
+    shrink = max(math.cos(math.radians(lat)), 0.01)
+    for precision in reversed(GRID_PRECISIONS):
+        width, height = _CELL_SIZE_KM[precision]
+        if min(width * shrink, height) >= radius_km:
+            return precision
+    return GRID_PRECISIONS[0]
+
+
+# ----------------------------
+# Grid cache
+# ----------------------------
+def _cell_key(cell):
+    return f"geo:cell:{cell}"
+
+
+def invalidate_cells(*geohashes):
+    """
+    Drop cached grid cells covering the given provider geohashes at every
+    precision the lookup can use.
+    """
+    keys = {
+        _cell_key(geohash[:precision])
+        for geohash in geohashes if geohash
+        for precision in GRID_PRECISIONS
+    }
+    if keys:
+        cache.delete_many(list(keys))
+
+
+def _load_cells(cells):
+    """
+    Return {cell: [(provider_id, lat, lng, category_ids), ...]}, reading
+    missing cells from the database in a single geohash-prefix query.
+    """
+    cached = cache.get_many([_cell_key(cell) for cell in cells])
+    result = {cell: cached[_cell_key(cell)] for cell in cells if _cell_key(cell) in cached}
+    missing = [cell for cell in cells if cell not in result]
+    if not missing:
+        return result
+
+    prefix_filter = Q()
+    for cell in missing:
+        prefix_filter |= Q(geohash__startswith=cell)
+    rows = (
+        ProviderProfile.objects
+        .filter(prefix_filter, latitude__isnull=False, longitude__isnull=False)
+        .values_list('id', 'latitude', 'longitude', 'geohash', 'services__category_id')
+    )
+    providers = {}
+    for provider_id, lat, lng, geohash, category_id in rows:
+        entry = providers.setdefault(provider_id, [provider_id, lat, lng, geohash, set()])
+        if category_id is not None:
+            entry[4].add(category_id)
+
+    precision = len(missing[0])
+    loaded = {cell: [] for cell in missing}
+    for provider_id, lat, lng, geohash, categories in providers.values():
+        cell = geohash[:precision]
+        if cell in loaded:
+            loaded[cell].append((provider_id, lat, lng, tuple(sorted(categories))))
+    cache.set_many(
+        {_cell_key(cell): entries for cell, entries in loaded.items()},
+        GRID_CACHE_TIMEOUT,
+    )
+    result.update(loaded)
+    return result
+
+
+def nearby_providers(lat, lng, radius_km, category_id=None, limit=20):
+    """
+    Return [(provider_id, distance_km), ...] for providers within radius_km,
+    nearest first. Only the nine grid cells around the point are read.
+    """
+    precision = grid_precision_for(lat, radius_km)
+    cells = neighbouring_cells(encode_geohash(lat, lng, precision))
+    matches = []
+    for entries in _load_cells(sorted(cells)).values():
+        for provider_id, provider_lat, provider_lng, categories in entries:
+            if category_id is not None and category_id not in categories:
+                continue
+            distance = haversine_km(lat, lng, provider_lat, provider_lng)
+            if distance <= radius_km:
+                matches.append((provider_id, distance))
+    matches.sort(key=lambda match: (match[1], match[0]))
+    return matches[:limit]
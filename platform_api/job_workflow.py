@@ -0,0 +1,167 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.cache import cache
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import Booking, ChatRoom, Job, JobMilestone, JobStatusLog, MilestoneTemplate, ProviderProfile
+from .scheduling import check_conflicts
+
+# Allowed status moves; anything else is rejected by transition_job().
+ALLOWED_TRANSITIONS = {
+    "created": {"accepted", "closed"},
+    "accepted": {"in_progress", "closed"},
+    "in_progress": {"completed"},
+    "completed": {"closed"},
+    "closed": set(),
+}
+
+# Sent after the transaction commits, with job_id, provider_id, previous
+# and status.
+job_status_changed = Signal()
+
+# Used for categories without any MilestoneTemplate rows.
+DEFAULT_MILESTONES = (
+    ("Initial Assessment", Decimal("0")),
+    ("Work In Progress", Decimal("0")),
+    ("Final Review", Decimal("0")),
+)
+TEMPLATE_CACHE_TIMEOUT = 60 * 60
+
+
+# ----------------------------
+# Milestone templates
+# ----------------------------
+def _template_key(category_id):
+    return f"milestone-templates:{category_id}"
+
+
+def milestone_templates(category_id):
+    """
+    [(title, amount_percent), ...] for a category, cached between edits.
+    """
+    templates = cache.get(_template_key(category_id))
+    if templates is None:
+        templates = list(
+            MilestoneTemplate.objects.filter(category_id=category_id)
+            .order_by("position", "id")
+            .values_list("title", "amount_percent")
+        ) or list(DEFAULT_MILESTONES)
+        cache.set(_template_key(category_id), templates, TEMPLATE_CACHE_TIMEOUT)
+    return templates
+
+
+def discard_milestone_templates(category_id):
+    cache.delete(_template_key(category_id))
+
+
+# ----------------------------
+# Job creation
+# ----------------------------
+def create_job(customer, scheduled_for, service=None, category=None, site=None, duration_minutes=60):
+    """
+    Create a job with its milestones, booking, chat room and initial status
+    log in one transaction: five INSERTs however many milestones there are.
+
+    With a service the job is bound to that service's provider, and
+    scheduling.ScheduleConflict is raised if the provider is not free; with
+    only a category it is left open for dispatch (see platform_api.dispatch).
+    """
+    category_id = service.category_id if service else category.id
+    templates = milestone_templates(category_id)
+    site_latitude, site_longitude = site or (None, None)
+    with transaction.atomic():
+        if service:
+            lock_provider_schedule(service.provider_id)
+            check_conflicts(
+                service.provider_id, scheduled_for, scheduled_for + timedelta(minutes=duration_minutes)
+            )
+        job = Job.objects.create(
+            customer=customer,
+            provider_id=service.provider_id if service else None,
+            service=service,
+            category_id=category_id,
+            site_latitude=site_latitude,
+            site_longitude=site_longitude,
+            scheduled_for=scheduled_for,
+            duration_minutes=duration_minutes,
+        )
+        JobMilestone.objects.bulk_create([
+            JobMilestone(job=job, title=title, amount=_milestone_amount(service, percent))
+            for title, percent in templates
+        ])
+        Booking.objects.create(job=job)
+        ChatRoom.objects.create(job=job)
+        JobStatusLog.objects.create(job=job, status=job.status)
+    return job
+
+
+def lock_provider_schedule(provider_id):
+    """
+    Serialize bookings per provider: conflict checks made while holding this
+    row lock cannot race another booking for the same provider.
+    """
+    list(ProviderProfile.objects.select_for_update().filter(pk=provider_id).values_list("pk", flat=True))
+
+
+def _milestone_amount(service, percent):
+    if service is None:
+        return Decimal("0.00")
+    return (service.price * percent / 100).quantize(Decimal("0.01"))
+
+
+def reprice_milestones(job, service):
+    """
+    Set milestone amounts from the category templates once an open job has
+    been given a service.
+    """
+    milestones = list(job.milestones.order_by("id"))
+    templates = milestone_templates(service.category_id)
+    for milestone, (_, percent) in zip(milestones, templates):
+        milestone.amount = _milestone_amount(service, percent)
+    JobMilestone.objects.bulk_update(milestones, ["amount"])
+
+
+# ----------------------------
+# Status transitions
+# ----------------------------
+class InvalidTransition(Exception):
+    pass
+
+
+def can_transition(current, status):
+    return status == current or status in ALLOWED_TRANSITIONS.get(current, ())
+
+
+def transition_job(job, status):
+    """
+    Move a job to `status`, validating against ALLOWED_TRANSITIONS and
+    writing the JobStatusLog row in the same transaction. Returns False
+    (and writes nothing) when the job already has that status.
+    """
+    if status not in dict(Job.STATUS_CHOICES):
+        raise InvalidTransition(f"Unknown status '{status}'.")
+
+    with transaction.atomic():
+        previous = (
+            Job.objects.select_for_update()
+            .filter(pk=job.pk)
+            .values_list("status", flat=True)
+            .get()
+        )
+        if previous == status:
+            job.status = status
+            return False
+        if not can_transition(previous, status):
+            raise InvalidTransition(f"Cannot move job from '{previous}' to '{status}'.")
+
+        Job.objects.filter(pk=job.pk).update(status=status, updated_at=timezone.now())
+        JobStatusLog.objects.create(job_id=job.pk, status=status)
+        transaction.on_commit(lambda: job_status_changed.send(
+            sender=Job, job_id=job.pk, provider_id=job.provider_id, previous=previous, status=status
+        ))
+
+    job.status = status
+    return True
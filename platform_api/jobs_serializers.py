@@ -1,35 +1,65 @@
 # platform_api/jobs_serializers.py
 
 from rest_framework import serializers
-from .models import Job, Booking, JobMilestone
+from .models import Job, Booking, JobMilestone, JobOffer, JobStatusLog, ProviderService
 from .provider_serializers import ProviderServiceSerializer, ProviderProfileSerializer
+from .sparse_fields import SparseFieldsMixin
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 # Serializer for Job Milestones
-class JobMilestoneSerializer(serializers.ModelSerializer):
+class JobMilestoneSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = JobMilestone
-        fields = ("id", "title", "amount", "completed")
+        fields = ("id", "title", "amount", "funded", "released", "status")
+        # Funding and release go through the escrow views, never a PATCH.
+        read_only_fields = ("funded", "released", "status")
 
 
 # Serializer for Job
-class JobSerializer(serializers.ModelSerializer):
+class JobSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     service = ProviderServiceSerializer(read_only=True)
     provider = ProviderProfileSerializer(read_only=True)
     customer = serializers.StringRelatedField(read_only=True)
     milestones = JobMilestoneSerializer(many=True, read_only=True)  # <-- added
+    service_id = serializers.PrimaryKeyRelatedField(
+        queryset=ProviderService.objects.all(), source="service", write_only=True, required=False
+    )
 
     class Meta:
         model = Job
         fields = '__all__'
 
+    def validate(self, attrs):
+        # A job is either booked with a specific service, or opened for a
+        # category and offered to providers by the dispatcher. Only checked
+        # on create; updates keep whatever the job was created with.
+        if self.instance is None and not attrs.get("service") and not attrs.get("category"):
+            raise serializers.ValidationError("Provide either service_id or category.")
+        return attrs
+
 
 # Serializer for Booking
-class BookingSerializer(serializers.ModelSerializer):
+class BookingSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     job = JobSerializer(read_only=True)
 
     class Meta:
         model = Booking
         fields = '__all__'
+
+
+# Serializer for Job status timeline entries
+class JobStatusLogSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = JobStatusLog
+        fields = ("id", "status", "timestamp")
+
+
+# Serializer for dispatch offers
+class JobOfferSerializer(serializers.ModelSerializer):
+    job = JobSerializer(read_only=True)
+
+    class Meta:
+        model = JobOffer
+        fields = ("id", "job", "provider", "score", "status", "created_at")
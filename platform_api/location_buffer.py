@@ -0,0 +1,147 @@
+import asyncio
+import atexit
+import logging
+import time
+from collections import deque
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DataError, IntegrityError, transaction
+
+from .track_storage import write_pings
+
+logger = logging.getLogger(__name__)
+
+# Errors caused by the pings themselves (a deleted job, a bad coordinate),
+# as opposed to the database being unavailable.
+BAD_PING_ERRORS = (DataError, IntegrityError, TypeError, ValueError)
+
+
+class LocationBuffer:
+    """
+    Collects location pings from every consumer in the process and writes
+    them with one bulk INSERT per batch instead of one INSERT per ping
+    (rows or packed segments, see track_storage.py).
+
+    A flush happens when `batch_size` pings are pending or `flush_interval`
+    seconds after the first pending ping, whichever comes first. At most
+    `max_pending` pings are held; beyond that the oldest are dropped (and
+    counted), so a stalled database cannot grow memory without bound.
+    Pings the database rejects are split out of their batch, dropped and
+    counted; only connection-level failures put the batch back in front.
+    Whatever is still pending at interpreter exit is written synchronously.
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_pending=50000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._pending = deque(maxlen=max_pending)
+        self._flush_lock = None
+        self._flush_task = None
+        self._timer = None
+        self.dropped = 0
+        self.rejected = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    # ----------------------------
+    # Producer side (event loop)
+    # ----------------------------
+    def add(self, job_id, provider_id, lat, lng, timestamp):
+        if len(self._pending) == self._pending.maxlen:
+            self.dropped += 1
+        self._pending.append((job_id, provider_id, lat, lng, timestamp))
+        if len(self._pending) >= self.batch_size:
+            # A running flush keeps draining until the buffer is empty.
+            if self._flush_task is None or self._flush_task.done():
+                self._flush_task = asyncio.get_running_loop().create_task(self.flush())
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.flush_interval, lambda: asyncio.ensure_future(self.flush())
+            )
+
+    async def flush(self):
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+            while self._pending:
+                batch = self._take(self.batch_size)
+                if not await database_sync_to_async(self._write)(batch):
+                    self._requeue(batch)
+                    break
+
+    # ----------------------------
+    # Writing (worker thread / exit)
+    # ----------------------------
+    def _take(self, count):
+        return [self._pending.popleft() for _ in range(min(count, len(self._pending)))]
+
+    def _requeue(self, batch):
+        # Put a failed batch back in front; the next ping re-arms the timer.
+        free = self._pending.maxlen - len(self._pending)
+        self.dropped += max(len(batch) - free, 0)
+        self._pending.extendleft(reversed(batch[-free:] if free else []))
+
+    def _write(self, batch):
+        started = time.perf_counter()
+        try:
+            written = self._write_valid(batch)
+        except Exception:
+            self.failed_flushes += 1
+            logger.exception("Writing %d buffered location pings failed", len(batch))
+            return False
+        elapsed_ms = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.flushed += written
+        self.last_flush_ms = round(elapsed_ms, 2)
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+        return True
+
+    def _write_valid(self, batch):
+        # Bisect around rejected pings: a batch with one bad row costs
+        # about 2 * log2(len(batch)) extra INSERTs, not one per row.
+        try:
+            with transaction.atomic():
+                write_pings(batch)
+            return len(batch)
+        except BAD_PING_ERRORS:
+            if len(batch) == 1:
+                self.rejected += 1
+                logger.warning("Dropping location ping rejected by the database: %r", batch[0])
+                return 0
+            middle = len(batch) // 2
+            return self._write_valid(batch[:middle]) + self._write_valid(batch[middle:])
+
+    def flush_sync(self):
+        while self._pending:
+            batch = self._take(self.batch_size)
+            if not self._write(batch):
+                self._requeue(batch)
+                break
+
+    def stats(self):
+        return {
+            "pending": len(self._pending),
+            "capacity": self._pending.maxlen,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+        }
+
+
+location_buffer = LocationBuffer(
+    batch_size=getattr(settings, "LOCATION_BUFFER_BATCH_SIZE", 500),
+    flush_interval=getattr(settings, "LOCATION_BUFFER_FLUSH_INTERVAL", 1.0),
+    max_pending=getattr(settings, "LOCATION_BUFFER_MAX_PENDING", 50000),
+)
+atexit.register(location_buffer.flush_sync)
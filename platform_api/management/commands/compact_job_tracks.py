@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+
+from platform_api import tracks
+from platform_api.track_storage import jobs_to_merge, merge_segments
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge packed location chunks, store simplified tracks for finished jobs "
+        "and prune old full-resolution location pings"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--tolerance", type=float, default=tracks.default_tolerance_m(),
+            help="Douglas-Peucker tolerance in metres (default: TRACK_TOLERANCE_M or 5)",
+        )
+        parser.add_argument(
+            "--retention-days", type=int, default=tracks.default_retention_days(),
+            help="Keep raw pings of compacted jobs this long (default: TRACK_RAW_RETENTION_DAYS or 30)",
+        )
+        parser.add_argument(
+            "--rebuild", action="store_true",
+            help="Rebuild existing tracks that still have raw pings (e.g. after changing the tolerance)",
+        )
+
+    def handle(self, *args, **options):
+        # Live jobs too: their per-flush chunks are merged as they pile up.
+        merged = 0
+        for job_id in list(jobs_to_merge()):
+            merge_segments(job_id)
+            merged += 1
+
+        built = 0
+        for job_id in list(tracks.jobs_to_compact(rebuild=options["rebuild"])):
+            tracks.build_track(job_id, options["tolerance"])
+            built += 1
+
+        pruned = tracks.prune_raw_points(options["retention_days"])
+        self.stdout.write(self.style.SUCCESS(
+            f"✅ Merged location chunks of {merged} jobs, compacted {built} job tracks, "
+            f"pruned {pruned} raw location pings"
+        ))
@@ -0,0 +1,29 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Sum
+
+from platform_api.models import ProviderProfile, Review
+
+
+class Command(BaseCommand):
+    help = "Recompute provider rating aggregates from reviews (repairs drift)"
+
+    def handle(self, *args, **kwargs):
+        totals = {
+            row["provider_id"]: (row["count"], row["total"])
+            for row in Review.objects.values("provider_id").annotate(count=Count("id"), total=Sum("rating"))
+        }
+
+        repaired = []
+        for profile in ProviderProfile.objects.iterator():
+            count, total = totals.get(profile.id, (0, 0))
+            if (profile.rating_count, profile.rating_sum) == (count, total):
+                continue
+            profile.rating_count = count
+            profile.rating_sum = total
+            profile.rating = profile.average_rating()
+            repaired.append(profile)
+
+        for profile in repaired:
+            profile.save(update_fields=["rating_count", "rating_sum", "rating", "updated_at"])
+
+        self.stdout.write(self.style.SUCCESS(f"✅ Recomputed ratings ({len(repaired)} providers repaired)"))
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0010_joblocationlog'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='providerprofile',
+            index=models.Index(fields=['-created_at', '-id'], name='provider_listing_idx'),
+        ),
+    ]
@@ -0,0 +1,75 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:10
+
+import django.contrib.postgres.search
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def create_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(
+        'CREATE INDEX IF NOT EXISTS searchdocument_vector_gin '
+        'ON platform_api_searchdocument USING gin (search_vector)'
+    )
+
+
+def drop_gin_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('DROP INDEX IF EXISTS searchdocument_vector_gin')
+
+
+def backfill_documents(apps, schema_editor):
+    ProviderProfile = apps.get_model('platform_api', 'ProviderProfile')
+    ProviderService = apps.get_model('platform_api', 'ProviderService')
+    SearchDocument = apps.get_model('platform_api', 'SearchDocument')
+
+    documents = [
+        SearchDocument(provider_id=profile.id, title=profile.location, body=profile.bio)
+        for profile in ProviderProfile.objects.all()
+    ]
+    documents += [
+        SearchDocument(
+            provider_id=service.provider_id,
+            service_id=service.id,
+            title=f"{service.title} {service.category.name}",
+            body=service.description,
+        )
+        for service in ProviderService.objects.select_related('category')
+    ]
+    SearchDocument.objects.bulk_create(documents, batch_size=500)
+
+    if schema_editor.connection.vendor == 'postgresql':
+        schema_editor.execute(
+            "UPDATE platform_api_searchdocument SET search_vector = "
+            "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+            "setweight(to_tsvector('english', coalesce(body, '')), 'B')"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0011_provider_listing_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(blank=True, max_length=255)),
+                ('body', models.TextField(blank=True)),
+                ('search_vector', django.contrib.postgres.search.SearchVectorField(editable=False, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True, db_index=True)),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_documents', to='platform_api.providerprofile')),
+                ('service', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='search_document', to='platform_api.providerservice')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(condition=models.Q(('service__isnull', True)), fields=('provider',), name='unique_provider_search_document')],
+            },
+        ),
+        migrations.RunPython(create_gin_index, drop_gin_index),
+        migrations.RunPython(backfill_documents, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:16
+
+import django.db.models.deletion
+from bisect import bisect_right
+
+from django.db import migrations, models
+
+# Snapshot of platform_api.facets.PRICE_BUCKET_BOUNDS at the time of writing.
+PRICE_BUCKET_BOUNDS = (5000, 10000, 25000, 50000, 100000)
+
+
+def backfill_facet_counts(apps, schema_editor):
+    ProviderService = apps.get_model('platform_api', 'ProviderService')
+    ServiceFacetCount = apps.get_model('platform_api', 'ServiceFacetCount')
+
+    counts = {}
+    for category_id, price in ProviderService.objects.values_list('category_id', 'price').iterator():
+        key = (category_id, bisect_right(PRICE_BUCKET_BOUNDS, price))
+        counts[key] = counts.get(key, 0) + 1
+    ServiceFacetCount.objects.bulk_create([
+        ServiceFacetCount(category_id=category_id, price_bucket=bucket, count=count)
+        for (category_id, bucket), count in counts.items()
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0015_version_stamps'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ServiceFacetCount',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('price_bucket', models.PositiveSmallIntegerField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='providerservice',
+            index=models.Index(fields=['category', 'price'], name='service_category_price_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='providerservice',
+            index=models.Index(fields=['provider', 'price'], name='service_provider_price_idx'),
+        ),
+        migrations.AddField(
+            model_name='servicefacetcount',
+            name='category',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='facet_counts', to='platform_api.servicecategory'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='servicefacetcount',
+            unique_together={('category', 'price_bucket')},
+        ),
+        migrations.RunPython(backfill_facet_counts, migrations.RunPython.noop),
+    ]
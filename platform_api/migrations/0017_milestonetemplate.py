@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:17
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0016_service_facets'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MilestoneTemplate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('title', models.CharField(max_length=255)),
+                ('amount_percent', models.DecimalField(decimal_places=2, default=0, max_digits=5, validators=[django.core.validators.MinValueValidator(0), django.core.validators.MaxValueValidator(100)])),
+                ('position', models.PositiveSmallIntegerField(default=0)),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='milestone_templates', to='platform_api.servicecategory')),
+            ],
+            options={
+                'ordering': ['category', 'position', 'id'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0017_milestonetemplate'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='jobstatuslog',
+            index=models.Index(fields=['job', '-timestamp', '-id'], name='job_status_timeline_idx'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def backfill_job_category(apps, schema_editor):
+    Job = apps.get_model('platform_api', 'Job')
+    ProviderService = apps.get_model('platform_api', 'ProviderService')
+    Job.objects.filter(category__isnull=True, service__isnull=False).update(
+        category_id=Subquery(
+            ProviderService.objects.filter(pk=OuterRef('service_id')).values('category_id')[:1]
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0018_job_status_timeline_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='job',
+            name='category',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.PROTECT, related_name='jobs', to='platform_api.servicecategory'),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='site_latitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='site_longitude',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='provider',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='provider_jobs', to='platform_api.providerprofile'),
+        ),
+        migrations.AlterField(
+            model_name='job',
+            name='service',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='jobs', to='platform_api.providerservice'),
+        ),
+        migrations.CreateModel(
+            name='JobOffer',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('declined', 'Declined'), ('expired', 'Expired')], default='pending', max_length=20)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='offers', to='platform_api.job')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='job_offers', to='platform_api.providerprofile')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['provider', 'status', '-created_at'], name='joboffer_provider_status_idx')],
+                'unique_together': {('job', 'provider')},
+            },
+        ),
+        migrations.RunPython(backfill_job_category, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,64 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:27
+
+import django.core.validators
+import django.db.models.deletion
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.models import DateTimeField, ExpressionWrapper, F
+
+
+def backfill_scheduled_end(apps, schema_editor):
+    # Existing jobs get the default duration of 60 minutes.
+    Job = apps.get_model('platform_api', 'Job')
+    Job.objects.filter(scheduled_end__isnull=True).update(
+        scheduled_end=ExpressionWrapper(
+            F('scheduled_for') + timedelta(minutes=60), output_field=DateTimeField()
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0019_job_dispatch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProviderAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('weekday', models.PositiveSmallIntegerField(choices=[(0, 'Monday'), (1, 'Tuesday'), (2, 'Wednesday'), (3, 'Thursday'), (4, 'Friday'), (5, 'Saturday'), (6, 'Sunday')])),
+                ('start_time', models.TimeField()),
+                ('end_time', models.TimeField()),
+            ],
+            options={
+                'ordering': ('provider', 'weekday', 'start_time'),
+            },
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='duration_minutes',
+            field=models.PositiveIntegerField(default=60, validators=[django.core.validators.MinValueValidator(1)]),
+        ),
+        migrations.AddField(
+            model_name='job',
+            name='scheduled_end',
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.RunPython(backfill_scheduled_end, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['provider', 'scheduled_for', 'scheduled_end'], name='job_provider_schedule_idx'),
+        ),
+        migrations.AddField(
+            model_name='provideravailability',
+            name='provider',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='availability', to='platform_api.providerprofile'),
+        ),
+        migrations.AddIndex(
+            model_name='provideravailability',
+            index=models.Index(fields=['weekday', 'start_time', 'end_time'], name='availability_weekday_idx'),
+        ),
+    ]
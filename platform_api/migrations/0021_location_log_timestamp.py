@@ -0,0 +1,19 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:28
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0020_provider_schedule'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='joblocationlog',
+            name='timestamp',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
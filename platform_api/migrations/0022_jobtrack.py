@@ -0,0 +1,28 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:30
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0021_location_log_timestamp'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='JobTrack',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('points', models.JSONField(default=list)),
+                ('tolerance_m', models.FloatField()),
+                ('raw_point_count', models.PositiveIntegerField()),
+                ('raw_pruned', models.BooleanField(default=False)),
+                ('started_at', models.DateTimeField(null=True)),
+                ('ended_at', models.DateTimeField(null=True)),
+                ('compacted_at', models.DateTimeField(auto_now=True)),
+                ('job', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='track', to='platform_api.job')),
+            ],
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0022_jobtrack'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='joblocationlog',
+            index=models.Index(fields=['job', 'timestamp', 'id'], name='joblocationlog_job_time_idx'),
+        ),
+    ]
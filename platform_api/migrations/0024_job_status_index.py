@@ -0,0 +1,17 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:34
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0023_location_log_job_time_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='job',
+            index=models.Index(fields=['status'], name='job_status_idx'),
+        ),
+    ]
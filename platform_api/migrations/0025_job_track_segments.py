@@ -0,0 +1,34 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:38
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0024_job_status_index'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='joblocationlog',
+            options={},
+        ),
+        migrations.CreateModel(
+            name='JobTrackSegment',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('started_at', models.DateTimeField()),
+                ('ended_at', models.DateTimeField()),
+                ('point_count', models.PositiveIntegerField()),
+                ('data', models.BinaryField()),
+                ('job', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='track_segments', to='platform_api.job')),
+                ('provider', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['job', 'started_at', 'id'], name='tracksegment_job_time_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:39
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def backfill_room_summary(apps, schema_editor):
+    # Rooms without messages count as active from their creation.
+    ChatRoom = apps.get_model('platform_api', 'ChatRoom')
+    Message = apps.get_model('platform_api', 'Message')
+    latest = Message.objects.filter(room=OuterRef('pk')).order_by('-created_at', '-id')
+    ChatRoom.objects.update(
+        last_message=Subquery(latest.values('id')[:1]),
+        last_activity_at=Coalesce(Subquery(latest.values('created_at')[:1]), F('created_at')),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0025_job_track_segments'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_activity_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.AddField(
+            model_name='chatroom',
+            name='last_message',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='platform_api.message'),
+        ),
+        migrations.RunPython(backfill_room_summary, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chatroom',
+            index=models.Index(fields=['-last_activity_at', '-id'], name='chatroom_activity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(condition=models.Q(('read', False)), fields=['room'], name='message_unread_idx'),
+        ),
+    ]
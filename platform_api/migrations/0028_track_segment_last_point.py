@@ -0,0 +1,50 @@
+# Generated by Django 6.0.1 on 2026-10-18 02:51
+
+from django.db import migrations, models
+
+
+# Snapshot of platform_api.track_storage.decode_points at the time of
+# writing, yielding fixed-point (epoch_ms, lat, lng).
+def decode_points(data, base_ms):
+    values = [base_ms, 0, 0]
+    field = shift = accumulator = 0
+    for byte in data:
+        accumulator |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values[field] += (accumulator >> 1) ^ -(accumulator & 1)
+        accumulator = shift = 0
+        field += 1
+        if field == 3:
+            field = 0
+            yield tuple(values)
+
+
+def backfill_last_point(apps, schema_editor):
+    JobTrackSegment = apps.get_model('platform_api', 'JobTrackSegment')
+    for segment in JobTrackSegment.objects.iterator(chunk_size=500):
+        base_ms = int(segment.started_at.timestamp() * 1000)
+        _, segment.last_lat, segment.last_lng = max(decode_points(bytes(segment.data), base_ms))
+        segment.save(update_fields=['last_lat', 'last_lng'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('platform_api', '0027_message_room_time_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='jobtracksegment',
+            name='last_lat',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='jobtracksegment',
+            name='last_lng',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(backfill_last_point, migrations.RunPython.noop),
+    ]
@@ -1,5 +1,11 @@
-from django.db import models
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.contrib.postgres.search import SearchVectorField
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.contrib.auth.models import AbstractUser
+from django.utils import timezone
 from django.utils.text import slugify
 from django.conf import settings
 
@@ -22,6 +28,35 @@ class CustomUser(AbstractUser):
 # ----------------------------
 # Provider Profile
 # ----------------------------
+class ProviderProfileQuerySet(models.QuerySet):
+    def with_listing_relations(self):
+        """
+        Load everything the marketplace serializers touch in a fixed number
+        of queries: the user is joined, services (with their category) are
+        prefetched in one extra query regardless of page size.
+        """
+        return self.select_related('user').prefetch_related(
+            models.Prefetch(
+                'services',
+                queryset=ProviderService.objects.select_related('category'),
+            )
+        )
+
+    def adjust_rating(self, provider_id, count_delta, sum_delta):
+        """
+        Apply a review insert/update/delete to the stored rating aggregates
+        under a row lock, so ratings never need re-aggregating from reviews.
+        """
+        with transaction.atomic():
+            profile = self.select_for_update().filter(pk=provider_id).first()
+            if profile is None:
+                return
+            profile.rating_count += count_delta
+            profile.rating_sum += sum_delta
+            profile.rating = profile.average_rating()
+            profile.save(update_fields=['rating_count', 'rating_sum', 'rating', 'updated_at'])
+
+
 class ProviderProfile(models.Model):
     user = models.OneToOneField(
         settings.AUTH_USER_MODEL,
@@ -32,8 +67,27 @@ class ProviderProfile(models.Model):
     slug = models.SlugField(unique=True, blank=True)
     bio = models.TextField(blank=True)
     location = models.CharField(max_length=255, blank=True)
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    geohash = models.CharField(max_length=12, blank=True, default='', db_index=True, editable=False)
     rating = models.DecimalField(max_digits=3, decimal_places=2, default=0.0)
+    rating_count = models.PositiveIntegerField(default=0)
+    rating_sum = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ProviderProfileQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='provider_listing_idx'),
+            models.Index(fields=['-rating', '-id'], name='provider_rating_idx'),
+        ]
+
+    def average_rating(self):
+        if not self.rating_count:
+            return Decimal('0.00')
+        return (Decimal(self.rating_sum) / self.rating_count).quantize(Decimal('0.01'))
 
     def save(self, *args, **kwargs):
         if not self.slug:
@@ -44,6 +98,36 @@ class ProviderProfile(models.Model):
         return f"{self.user.username} Profile"
 
 
+class ProviderAvailability(models.Model):
+    """
+    A weekly working window, in the site's local time. Providers without
+    any windows are treated as available at all times.
+    """
+    WEEKDAY_CHOICES = [
+        (0, "Monday"),
+        (1, "Tuesday"),
+        (2, "Wednesday"),
+        (3, "Thursday"),
+        (4, "Friday"),
+        (5, "Saturday"),
+        (6, "Sunday"),
+    ]
+
+    provider = models.ForeignKey(ProviderProfile, on_delete=models.CASCADE, related_name="availability")
+    weekday = models.PositiveSmallIntegerField(choices=WEEKDAY_CHOICES)
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+
+    class Meta:
+        ordering = ("provider", "weekday", "start_time")
+        indexes = [
+            models.Index(fields=["weekday", "start_time", "end_time"], name="availability_weekday_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.provider_id}: {self.get_weekday_display()} {self.start_time}-{self.end_time}"
+
+
 # ----------------------------
 # Service Category
 # ----------------------------
@@ -74,14 +158,79 @@ class ProviderService(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     class Meta:
         unique_together = ('provider', 'category', 'title')
+        indexes = [
+            models.Index(fields=['category', 'price'], name='service_category_price_idx'),
+            models.Index(fields=['provider', 'price'], name='service_provider_price_idx'),
+        ]
 
     def __str__(self):
         return f"{self.title} by {self.provider.user.username}"
 
 
+class ServiceFacetCount(models.Model):
+    """
+    Number of services per (category, price bucket), maintained on
+    ProviderService save/delete (see platform_api.facets).
+    """
+    category = models.ForeignKey(
+        ServiceCategory,
+        on_delete=models.CASCADE,
+        related_name='facet_counts'
+    )
+    price_bucket = models.PositiveSmallIntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('category', 'price_bucket')
+
+    def __str__(self):
+        return f"{self.category} / bucket {self.price_bucket}: {self.count}"
+
+
+# ----------------------------
+# Marketplace search
+# ----------------------------
+class SearchDocument(models.Model):
+    """
+    Denormalized text of a provider profile or one of its services, kept in
+    sync on save (see platform_api.search) so searching never has to join
+    profiles, services and categories per query.
+    """
+    provider = models.ForeignKey(
+        ProviderProfile,
+        on_delete=models.CASCADE,
+        related_name='search_documents'
+    )
+    service = models.OneToOneField(
+        ProviderService,
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name='search_document'
+    )
+    title = models.CharField(max_length=255, blank=True)
+    body = models.TextField(blank=True)
+    # Only populated on PostgreSQL, where it carries a GIN index.
+    search_vector = SearchVectorField(null=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['provider'],
+                condition=models.Q(service__isnull=True),
+                name='unique_provider_search_document',
+            ),
+        ]
+
+    def __str__(self):
+        return f"SearchDocument #{self.id} ({self.title})"
+
+
 # ----------------------------
 # Job & Booking
 # ----------------------------
@@ -100,24 +249,80 @@ class Job(models.Model):
         related_name="customer_jobs",
         limit_choices_to={'role': 'customer'}
     )
+    # Open jobs (offered through dispatch) have no provider/service until
+    # an offer is accepted.
     provider = models.ForeignKey(
         ProviderProfile,
         on_delete=models.CASCADE,
-        related_name="provider_jobs"
+        related_name="provider_jobs",
+        null=True,
+        blank=True
     )
     service = models.ForeignKey(
         ProviderService,
         on_delete=models.CASCADE,
-        related_name="jobs"
+        related_name="jobs",
+        null=True,
+        blank=True
+    )
+    category = models.ForeignKey(
+        ServiceCategory,
+        on_delete=models.PROTECT,
+        related_name="jobs",
+        null=True,
+        blank=True
     )
+    site_latitude = models.FloatField(null=True, blank=True)
+    site_longitude = models.FloatField(null=True, blank=True)
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="created")
     scheduled_for = models.DateTimeField()
+    duration_minutes = models.PositiveIntegerField(default=60, validators=[MinValueValidator(1)])
+    # Stored so overlap checks are plain range comparisons on an index.
+    scheduled_end = models.DateTimeField(null=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["provider", "scheduled_for", "scheduled_end"], name="job_provider_schedule_idx"),
+            models.Index(fields=["status"], name="job_status_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.scheduled_end = self.scheduled_for + timedelta(minutes=self.duration_minutes)
+        update_fields = kwargs.get("update_fields")
+        if update_fields is not None and {"scheduled_for", "duration_minutes"} & set(update_fields):
+            kwargs["update_fields"] = {*update_fields, "scheduled_end"}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return f"Job #{self.id} ({self.status})"
 
 
+class JobOffer(models.Model):
+    STATUS_CHOICES = [
+        ("pending", "Pending"),
+        ("accepted", "Accepted"),
+        ("declined", "Declined"),
+        ("expired", "Expired"),
+    ]
+
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="offers")
+    provider = models.ForeignKey(ProviderProfile, on_delete=models.CASCADE, related_name="job_offers")
+    score = models.FloatField()
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default="pending")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ("job", "provider")
+        indexes = [
+            models.Index(fields=["provider", "status", "-created_at"], name="joboffer_provider_status_idx"),
+        ]
+
+    def __str__(self):
+        return f"Offer of Job #{self.job_id} to {self.provider_id} ({self.status})"
+
+
 class Booking(models.Model):
     job = models.OneToOneField(
         Job,
@@ -141,6 +346,11 @@ class JobStatusLog(models.Model):
     status = models.CharField(max_length=20, choices=Job.STATUS_CHOICES)
     timestamp = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["job", "-timestamp", "-id"], name="job_status_timeline_idx"),
+        ]
+
     def __str__(self):
         return f"Job #{self.job.id} → {self.status}"
     
@@ -165,15 +375,98 @@ class JobMilestone(models.Model):
     def __str__(self):
         return f"{self.title} ({self.job}) - {self.status}"
 
+
+class MilestoneTemplate(models.Model):
+    """
+    Milestones created for every new job in a category. amount_percent is
+    the share of the service price assigned to the milestone.
+    """
+    category = models.ForeignKey(
+        ServiceCategory,
+        on_delete=models.CASCADE,
+        related_name="milestone_templates"
+    )
+    title = models.CharField(max_length=255)
+    amount_percent = models.DecimalField(
+        max_digits=5,
+        decimal_places=2,
+        default=0,
+        validators=[MinValueValidator(0), MaxValueValidator(100)]
+    )
+    position = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["category", "position", "id"]
+
+    def __str__(self):
+        return f"{self.category} #{self.position}: {self.title}"
+
+# ----------------------------
+# Reviews
+# ----------------------------
+class Review(models.Model):
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, related_name="review")
+    provider = models.ForeignKey(ProviderProfile, on_delete=models.CASCADE, related_name="reviews")
+    customer = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        related_name="reviews_written"
+    )
+    rating = models.PositiveSmallIntegerField(
+        validators=[MinValueValidator(1), MaxValueValidator(5)]
+    )
+    comment = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["provider", "-created_at", "-id"], name="review_provider_recent_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        with transaction.atomic():
+            previous = None
+            if self.pk:
+                previous = (
+                    Review.objects.select_for_update()
+                    .filter(pk=self.pk)
+                    .values_list("provider_id", "rating")
+                    .first()
+                )
+            super().save(*args, **kwargs)
+            if previous is None:
+                ProviderProfile.objects.adjust_rating(self.provider_id, 1, self.rating)
+            elif previous[0] != self.provider_id:
+                ProviderProfile.objects.adjust_rating(previous[0], -1, -previous[1])
+                ProviderProfile.objects.adjust_rating(self.provider_id, 1, self.rating)
+            elif previous[1] != self.rating:
+                ProviderProfile.objects.adjust_rating(self.provider_id, 0, self.rating - previous[1])
+
+    def __str__(self):
+        return f"Review for Job #{self.job_id} ({self.rating}/5)"
+
+
 # ----------------------------
 # ChatRoom & Message (Week 5)
 # ----------------------------
 class ChatRoom(models.Model):
     job = models.OneToOneField(Job, on_delete=models.CASCADE, related_name="chat_room")
     created_at = models.DateTimeField(auto_now_add=True)
+    # Inbox summary, maintained by Message.save() so listing rooms never
+    # touches their history.
+    last_message = models.ForeignKey(
+        "Message", on_delete=models.SET_NULL, related_name="+", null=True, blank=True
+    )
+    last_activity_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-last_activity_at", "-id"], name="chatroom_activity_idx"),
+        ]
 
     def __str__(self):
-        return f"ChatRoom for Job {self.job.id}"
+        return f"ChatRoom for Job {self.job_id}"
 
 
 class Message(models.Model):
@@ -185,9 +478,24 @@ class Message(models.Model):
 
     class Meta:
         ordering = ["created_at"]
+        indexes = [
+            models.Index(fields=["room", "created_at", "id"], name="message_room_time_idx"),
+            # Unread counts only ever scan a room's unread messages.
+            models.Index(fields=["room"], condition=models.Q(read=False), name="message_unread_idx"),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        super().save(*args, **kwargs)
+        if adding:
+            # The guard keeps a slower concurrent insert from rolling the
+            # summary back to an older message.
+            ChatRoom.objects.filter(pk=self.room_id, last_activity_at__lte=self.created_at).update(
+                last_message=self, last_activity_at=self.created_at
+            )
 
     def __str__(self):
-        return f"{self.sender} in Room {self.room.id}"
+        return f"{self.sender} in Room {self.room_id}"
     
 # ----------------------------
 # Wallet System (Week 6)
@@ -251,12 +559,60 @@ class JobLocationLog(models.Model):
     provider = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, limit_choices_to={"role": "provider"})
     lat = models.FloatField()
     lng = models.FloatField()
-    timestamp = models.DateTimeField(auto_now_add=True)
+    # Set when the ping is received, not when its batch is written.
+    timestamp = models.DateTimeField(default=timezone.now)
 
     class Meta:
-        ordering = ['timestamp']
+        # No default ordering: readers order explicitly along the index.
+        indexes = [
+            models.Index(fields=['job', 'timestamp', 'id'], name='joblocationlog_job_time_idx'),
+        ]
 
     def __str__(self):
         return f"Job {self.job.id} - {self.lat}, {self.lng} @ {self.timestamp}"
 
 
+class JobTrack(models.Model):
+    """
+    Simplified route of a finished job, built by the compact_job_tracks
+    command. Points are [lat, lng, unix_timestamp] in time order.
+    """
+    job = models.OneToOneField(Job, on_delete=models.CASCADE, related_name="track")
+    points = models.JSONField(default=list)
+    tolerance_m = models.FloatField()
+    raw_point_count = models.PositiveIntegerField()
+    # Set once old raw pings were deleted; the track can't be rebuilt then.
+    raw_pruned = models.BooleanField(default=False)
+    started_at = models.DateTimeField(null=True)
+    ended_at = models.DateTimeField(null=True)
+    compacted_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Track of Job #{self.job_id} ({len(self.points)}/{self.raw_point_count} points)"
+
+
+class JobTrackSegment(models.Model):
+    """
+    Immutable packed run of a job's pings (LOCATION_STORAGE = "segments");
+    see track_storage.py for the encoding. Each flush inserts a small
+    chunk, and compact_job_tracks merges chunks into segments of up to
+    TRACK_SEGMENT_MAX_POINTS pings.
+    """
+    job = models.ForeignKey(Job, on_delete=models.CASCADE, related_name="track_segments")
+    provider = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="+")
+    started_at = models.DateTimeField()
+    ended_at = models.DateTimeField()
+    point_count = models.PositiveIntegerField()
+    # Last point (the one at ended_at) in fixed point, so the newest
+    # position can be read without decoding `data`.
+    last_lat = models.IntegerField(default=0)
+    last_lng = models.IntegerField(default=0)
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['job', 'started_at', 'id'], name='tracksegment_job_time_idx'),
+        ]
+
+    def __str__(self):
+        return f"Job {self.job_id} segment {self.started_at} ({self.point_count} points)"
@@ -0,0 +1,43 @@
+from .dispatch import ACTIVE_JOB_STATUSES
+from .models import Job
+from .positions import current_version, last_positions
+
+
+def parse_bbox(value):
+    """
+    "min_lng,min_lat,max_lng,max_lat" -> tuple of floats; ValueError if
+    malformed.
+    """
+    min_lng, min_lat, max_lng, max_lat = (float(part) for part in value.split(","))
+    if min_lng > max_lng or min_lat > max_lat:
+        raise ValueError("Empty bounding box.")
+    return min_lng, min_lat, max_lng, max_lat
+
+
+def snapshot(bbox=None, since=None):
+    """
+    Latest positions of active jobs, read from the last-known-position
+    cache (only the active job ids come from the database).
+
+    `active` lists every visible job so clients can drop the rest; `jobs`
+    holds only positions changed after version `since` (all of them when
+    since is None, or when the version counter was reset). The version is
+    read before the positions, so a change racing the read is sent again
+    next time rather than missed.
+    """
+    version = current_version()
+    if since is not None and since > version:
+        since = None
+
+    job_ids = list(Job.objects.filter(status__in=ACTIVE_JOB_STATUSES).values_list("id", flat=True))
+    visible, changed = [], []
+    for job_id, position in sorted(last_positions(job_ids).items()):
+        lat, lng = position["lat"], position["lng"]
+        if lat is None or lng is None:
+            continue
+        if bbox is not None and not (bbox[0] <= lng <= bbox[2] and bbox[1] <= lat <= bbox[3]):
+            continue
+        visible.append(job_id)
+        if since is None or position["version"] > since:
+            changed.append(dict(position, job_id=job_id))
+    return {"version": version, "full": since is None, "active": visible, "jobs": changed}
@@ -0,0 +1,139 @@
+import base64
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+
+
+class ProviderCursorPagination(CursorPagination):
+    """
+    Cursor pagination for the provider marketplace.
+
+    Opt-in: clients that send `cursor` or `page_size` get a paginated
+    envelope ({next, previous, results}); everyone else keeps receiving the
+    plain list the endpoint has always returned. The ordering is backed by
+    `provider_listing_idx`, so each page is a bounded index range scan no
+    matter how many providers exist.
+    """
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+    sort_query_param = 'sort'
+    sort_orderings = {
+        'newest': ('-created_at', '-id'),
+        'rating': ('-rating', '-id'),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        return self.sort_orderings.get(request.query_params.get(self.sort_query_param), self.ordering)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class ReviewCursorPagination(CursorPagination):
+    page_size = 20
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-created_at', '-id')
+
+
+class JobTimelineCursorPagination(CursorPagination):
+    """
+    Keyset pagination over a job's status log, newest first, served by
+    `job_status_timeline_idx` (job, -timestamp, -id).
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = ('-timestamp', '-id')
+
+
+class ChatRoomCursorPagination(CursorPagination):
+    """
+    Chat inbox, most recently active room first, served by
+    `chatroom_activity_idx` (-last_activity_at, -id).
+    """
+    page_size = 30
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-last_activity_at', '-id')
+
+
+class MessageKeysetPagination(BasePagination):
+    """
+    Keyset pagination over a room's history on (created_at, id), served by
+    `message_room_time_idx`. Without parameters the newest page is
+    returned; `before=<token>` pages back for infinite scroll and
+    `after=<token>` catches up on newer messages. Each page is one bounded
+    index range scan and its results are always oldest first.
+    """
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        size = self.get_page_size(request)
+        before = self.decode_token(request.query_params.get('before'))
+        after = self.decode_token(request.query_params.get('after'))
+        if after is not None:
+            rows = list(queryset.filter(self.newer_than(after)).order_by('created_at', 'id')[:size + 1])
+            self.page = rows[:size]
+            self.has_older, self.has_newer = True, len(rows) > size
+        else:
+            if before is not None:
+                queryset = queryset.filter(self.older_than(before))
+            rows = list(queryset.order_by('-created_at', '-id')[:size + 1])
+            self.page = rows[:size][::-1]
+            self.has_older, self.has_newer = len(rows) > size, before is not None
+        self.after = self.encode_token(self.page[-1]) if self.page else request.query_params.get('after')
+        return self.page
+
+    def get_paginated_response(self, data):
+        return Response({
+            'before': self.encode_token(self.page[0]) if self.page and self.has_older else None,
+            'after': self.after,
+            'has_newer': self.has_newer,
+            'results': data,
+        })
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except ValueError:
+            size = self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    @staticmethod
+    def newer_than(position):
+        created_at, pk = position
+        return Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+
+    @staticmethod
+    def older_than(position):
+        created_at, pk = position
+        return Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+
+    @staticmethod
+    def encode_token(message):
+        raw = f"{message.created_at.isoformat()}|{message.id}"
+        return base64.urlsafe_b64encode(raw.encode()).decode()
+
+    @staticmethod
+    def decode_token(token):
+        if not token:
+            return None
+        try:
+            created_at, pk = base64.urlsafe_b64decode(token.encode()).decode().split('|')
+            created_at, pk = parse_datetime(created_at), int(pk)
+        except (ValueError, UnicodeError):
+            created_at = None
+        if created_at is None:
+            raise ValidationError({'detail': 'Invalid message cursor.'})
+        return created_at, pk
@@ -0,0 +1,134 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import OuterRef, Subquery
+from django.utils import timezone
+
+from .models import Job, JobLocationLog, JobTrackSegment
+from .track_storage import SCALE
+
+
+def _ttl():
+    return getattr(settings, "JOB_POSITION_TTL", 60 * 60 * 24)
+
+
+VERSION_KEY = "job-position:version"
+
+
+def _key(job_id):
+    return f"job-position:{job_id}"
+
+
+def _entry(lat, lng, status, timestamp, version):
+    return {
+        "lat": lat,
+        "lng": lng,
+        "status": status,
+        "timestamp": timestamp.isoformat() if timestamp else None,
+        "version": version,
+    }
+
+
+# Every position change takes the next value of one global counter, so a
+# reader can ask for "everything newer than version N" (see ops_map.py).
+# Positions and the counter are written by both the HTTP workers and the
+# socket process, so they need the shared cache (REDIS_URL) in production.
+def next_version():
+    try:
+        return cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        return cache.incr(VERSION_KEY)
+
+
+def current_version():
+    return cache.get(VERSION_KEY, 0)
+
+
+def record_position(job_id, lat, lng, status=None, timestamp=None):
+    """
+    Remember a job's latest ping and return the cache entry. Only the
+    cache is written; the ping itself is persisted through the location
+    buffer and the Job row is untouched. The status is always the job's
+    own, never the client's: pass it if the caller has just read the job,
+    otherwise it is kept from the cached entry (update_status follows
+    every transition) or read from the database.
+    """
+    if status is None:
+        position = cache.get(_key(job_id))
+        if position is not None:
+            status = position["status"]
+        else:
+            status = Job.objects.filter(pk=job_id).values_list("status", flat=True).first()
+    entry = _entry(lat, lng, status, timestamp or timezone.now(), next_version())
+    cache.set(_key(job_id), entry, _ttl())
+    return entry
+
+
+def _load_positions(job_ids):
+    """
+    {job_id: entry} rebuilt from the database for jobs the cache has lost,
+    in one query: correlated subqueries pick each job's newest ping row
+    and newest packed segment off their (job, time) indexes. Jobs that
+    don't exist are left out; lat/lng are None for jobs that never
+    reported a position.
+    """
+    logs = JobLocationLog.objects.filter(job=OuterRef("pk")).order_by("-timestamp", "-id")
+    segments = JobTrackSegment.objects.filter(job=OuterRef("pk")).order_by("-started_at", "-id")
+    rows = (
+        Job.objects.filter(pk__in=job_ids)
+        .annotate(
+            log_lat=Subquery(logs.values("lat")[:1]),
+            log_lng=Subquery(logs.values("lng")[:1]),
+            log_timestamp=Subquery(logs.values("timestamp")[:1]),
+            segment_ended_at=Subquery(segments.values("ended_at")[:1]),
+            segment_lat=Subquery(segments.values("last_lat")[:1]),
+            segment_lng=Subquery(segments.values("last_lng")[:1]),
+        )
+        .values_list(
+            "id", "status", "log_lat", "log_lng", "log_timestamp",
+            "segment_ended_at", "segment_lat", "segment_lng",
+        )
+    )
+    # Rebuilt entries are not changes, so they don't take a new version.
+    version = current_version()
+    positions = {}
+    for job_id, status, lat, lng, timestamp, ended_at, segment_lat, segment_lng in rows:
+        # A segment's last point is stored beside it, so nothing is decoded.
+        if ended_at is not None and (timestamp is None or ended_at > timestamp):
+            timestamp, lat, lng = ended_at, segment_lat / SCALE, segment_lng / SCALE
+        positions[job_id] = _entry(lat, lng, status, timestamp, version)
+    if positions:
+        cache.set_many({_key(job_id): position for job_id, position in positions.items()}, _ttl())
+    return positions
+
+
+def last_position(job_id):
+    """
+    {"lat", "lng", "status", "timestamp", "version"} of a job's last known
+    position, falling back to its newest stored ping when the cache has
+    lost it. None if the job does not exist; lat/lng are None if it has
+    never reported a position.
+    """
+    position = cache.get(_key(job_id))
+    if position is not None:
+        return position
+    return _load_positions([job_id]).get(job_id)
+
+
+def last_positions(job_ids):
+    """
+    {job_id: position} for many jobs with one cache round trip, plus one
+    query for all the misses together.
+    """
+    keys = {_key(job_id): job_id for job_id in job_ids}
+    found = {keys[key]: position for key, position in cache.get_many(keys).items()}
+    missing = [job_id for job_id in job_ids if job_id not in found]
+    if missing:
+        found.update(_load_positions(missing))
+    return found
+
+
+def update_status(job_id, status):
+    position = cache.get(_key(job_id))
+    if position is not None:
+        cache.set(_key(job_id), dict(position, status=status, version=next_version()), _ttl())
@@ -0,0 +1,64 @@
+from django.core.cache import cache
+
+from .models import ProviderProfile
+from .provider_serializers import ProviderCardSerializer
+
+CARD_TIMEOUT = 60 * 60 * 24
+
+
+def _card_key(provider_id):
+    return f"provider-card:{provider_id}"
+
+
+def _slug_key(slug):
+    return f"provider-card:slug:{slug}"
+
+
+def _store(profiles):
+    cards = {profile.id: dict(ProviderCardSerializer(profile).data) for profile in profiles}
+    entries = {_card_key(provider_id): card for provider_id, card in cards.items()}
+    entries.update({_slug_key(card['slug']): provider_id for provider_id, card in cards.items()})
+    if entries:
+        cache.set_many(entries, CARD_TIMEOUT)
+    return cards
+
+
+def get_cards(provider_ids):
+    """
+    Return cards for provider_ids, in the same order, skipping providers that
+    no longer exist. Misses are built with one listing query and cached.
+    """
+    provider_ids = list(provider_ids)
+    cached = cache.get_many([_card_key(provider_id) for provider_id in provider_ids])
+    cards = {
+        provider_id: cached[_card_key(provider_id)]
+        for provider_id in provider_ids if _card_key(provider_id) in cached
+    }
+    missing = [provider_id for provider_id in provider_ids if provider_id not in cards]
+    if missing:
+        cards.update(_store(ProviderProfile.objects.with_listing_relations().filter(id__in=missing)))
+    return [cards[provider_id] for provider_id in provider_ids if provider_id in cards]
+
+
+def get_card_by_slug(slug):
+    provider_id = cache.get(_slug_key(slug))
+    if provider_id is not None:
+        card = cache.get(_card_key(provider_id))
+        if card is not None and card['slug'] == slug:
+            return card
+    profile = ProviderProfile.objects.with_listing_relations().filter(slug=slug).first()
+    if profile is None:
+        return None
+    return _store([profile])[profile.id]
+
+
+def rebuild_card(provider_id):
+    profile = ProviderProfile.objects.with_listing_relations().filter(id=provider_id).first()
+    if profile is None:
+        cache.delete(_card_key(provider_id))
+        return
+    _store([profile])
+
+
+def discard_cards(provider_ids):
+    cache.delete_many([_card_key(provider_id) for provider_id in provider_ids])
@@ -1,34 +1,68 @@
 from rest_framework import serializers
-from .models import ProviderProfile, ServiceCategory, ProviderService
+from .models import ProviderAvailability, ProviderProfile, ServiceCategory, ProviderService
 from django.contrib.auth import get_user_model
+from .sparse_fields import SparseFieldsMixin
 
 User = get_user_model()
 
 # Provider User Serializer
-class ProviderUserSerializer(serializers.ModelSerializer):
+class ProviderUserSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = User
         fields = ('id', 'username', 'email', 'phone', 'role')
 
 # Provider Profile Serializer
-class ProviderProfileSerializer(serializers.ModelSerializer):
+class ProviderProfileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     user = ProviderUserSerializer(read_only=True)
     services = serializers.StringRelatedField(many=True, read_only=True)
 
+    # ProviderService.__str__ reads provider.user, so rendering `services`
+    # needs the profile's user loaded as well.
+    eager_load_hints = {'services': ('user',)}
+
     class Meta:
         model = ProviderProfile
-        fields = ('id', 'user', 'slug', 'bio', 'location', 'rating', 'services')
+        fields = ('id', 'user', 'slug', 'bio', 'location', 'latitude', 'longitude', 'rating', 'services')
 
 # Service Category Serializer
-class ServiceCategorySerializer(serializers.ModelSerializer):
+class ServiceCategorySerializer(SparseFieldsMixin, serializers.ModelSerializer):
     class Meta:
         model = ServiceCategory
         fields = ('id', 'name', 'description')
 
 # Provider Service Serializer
-class ProviderServiceSerializer(serializers.ModelSerializer):
+class ProviderServiceSerializer(SparseFieldsMixin, serializers.ModelSerializer):
     category = ServiceCategorySerializer(read_only=True)
 
     class Meta:
         model = ProviderService
         fields = ('id', 'title', 'description', 'price', 'category', 'provider')
+
+
+# Provider Card Serializer (cached read model, see provider_cards.py)
+class ProviderCardSerializer(ProviderProfileSerializer):
+    categories = serializers.SerializerMethodField()
+
+    class Meta(ProviderProfileSerializer.Meta):
+        fields = ProviderProfileSerializer.Meta.fields + ('categories', 'updated_at')
+
+    def get_categories(self, obj):
+        categories = {service.category_id: service.category for service in obj.services.all()}
+        return [
+            {'id': category.id, 'name': category.name}
+            for category in sorted(categories.values(), key=lambda category: category.name)
+        ]
+
+
+# Provider weekly availability window
+class ProviderAvailabilitySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = ProviderAvailability
+        fields = ('id', 'weekday', 'start_time', 'end_time')
+
+    def validate(self, attrs):
+        start_time = attrs.get('start_time', getattr(self.instance, 'start_time', None))
+        end_time = attrs.get('end_time', getattr(self.instance, 'end_time', None))
+        if start_time >= end_time:
+            raise serializers.ValidationError("end_time must be after start_time.")
+        return attrs
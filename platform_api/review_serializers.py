@@ -0,0 +1,11 @@
+from rest_framework import serializers
+from .models import Review
+
+
+class ReviewSerializer(serializers.ModelSerializer):
+    customer_name = serializers.CharField(source="customer.username", read_only=True)
+
+    class Meta:
+        model = Review
+        fields = ["id", "job", "provider", "customer", "customer_name", "rating", "comment", "created_at", "updated_at"]
+        read_only_fields = ["job", "provider", "customer", "created_at", "updated_at"]
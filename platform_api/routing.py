@@ -1,6 +1,8 @@
 from django.urls import path
-from .consumers import JobConsumer
+from .consumers import ChatConsumer, JobConsumer, JobsConsumer
 
 websocket_urlpatterns = [
     path("ws/job/<int:job_id>/", JobConsumer.as_asgi()),
+    path("ws/jobs/", JobsConsumer.as_asgi()),
+    path("ws/chat/<int:job_id>/", ChatConsumer.as_asgi()),
 ]
\ No newline at end of file
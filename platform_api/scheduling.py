@@ -0,0 +1,252 @@
+import threading
+import time
+import uuid
+from bisect import bisect_left
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+
+from .models import Job, ProviderAvailability, ProviderProfile
+
+# Jobs in these states hold their provider's time slot.
+BLOCKING_STATUSES = ("created", "accepted", "in_progress")
+MAX_RANGE_DAYS = 31
+VERSION_TTL = 60 * 60 * 24
+
+
+def _cache_ttl():
+    # Upper bound on how stale read-path schedule data can get should an
+    # invalidation be missed; booking writes never use the caches.
+    return getattr(settings, "SCHEDULE_CACHE_TTL", 300)
+
+
+class ScheduleConflict(Exception):
+    pass
+
+
+def _version_key(provider_id):
+    return f"schedule-version:{provider_id}"
+
+
+def invalidate_schedules(*provider_ids):
+    cache.set_many(
+        {_version_key(provider_id): uuid.uuid4().hex for provider_id in provider_ids if provider_id}, VERSION_TTL
+    )
+
+
+# ----------------------------
+# Interval index
+# ----------------------------
+class IntervalIndex:
+    """
+    A provider's upcoming bookings sorted by start, with a running maximum
+    of end times. Everything starting before `end` sits left of one bisect,
+    and the running maximum says whether any of it reaches past `start`,
+    so an overlap test is O(log n) and listing overlaps stops as soon as
+    nothing further left can reach.
+    """
+    __slots__ = ("version", "loaded_at", "starts", "ends", "job_ids", "max_ends")
+
+    def __init__(self, version, rows):
+        rows = sorted(rows)
+        self.version = version
+        self.loaded_at = time.monotonic()
+        self.starts = [start for start, _, _ in rows]
+        self.ends = [end for _, end, _ in rows]
+        self.job_ids = [job_id for _, _, job_id in rows]
+        self.max_ends = []
+        for end in self.ends:
+            self.max_ends.append(max(end, self.max_ends[-1]) if self.max_ends else end)
+
+    def overlapping(self, start, end, exclude_job_id=None):
+        """
+        Yield (start, end, job_id) of bookings overlapping [start, end).
+        """
+        i = bisect_left(self.starts, end) - 1
+        while i >= 0 and self.max_ends[i] > start:
+            if self.ends[i] > start and self.job_ids[i] != exclude_job_id:
+                yield self.starts[i], self.ends[i], self.job_ids[i]
+            i -= 1
+
+    def is_free(self, start, end, exclude_job_id=None):
+        return next(self.overlapping(start, end, exclude_job_id), None) is None
+
+
+class ScheduleCache:
+    """
+    Per-process IntervalIndex per provider, reloaded with one indexed query
+    when a booking for that provider changes (signalled through a cache
+    version key, as with the dispatch pools) or once it is older than
+    SCHEDULE_CACHE_TTL. Version keys outlive that age, so an expired key
+    can never make a stale index look current.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes = {}
+
+    def index(self, provider_id):
+        version = cache.get(_version_key(provider_id))
+        with self._lock:
+            index = self._indexes.get(provider_id)
+            if (
+                index is not None
+                and index.version == version
+                and time.monotonic() - index.loaded_at < _cache_ttl()
+            ):
+                return index
+        index = IntervalIndex(version, blocking_jobs(provider_id).values_list("scheduled_for", "scheduled_end", "id"))
+        with self._lock:
+            self._indexes[provider_id] = index
+        return index
+
+
+schedules = ScheduleCache()
+
+
+def blocking_jobs(provider_id, start=None, end=None):
+    # Bookings that already finished can never conflict with new ones, so
+    # the index only holds the current and future part of the calendar.
+    jobs = Job.objects.filter(
+        provider_id=provider_id,
+        status__in=BLOCKING_STATUSES,
+        scheduled_end__gt=start or timezone.now(),
+    )
+    if end is not None:
+        jobs = jobs.filter(scheduled_for__lt=end)
+    return jobs
+
+
+# ----------------------------
+# Availability windows
+# ----------------------------
+def _windows_key(provider_id):
+    return f"availability-windows:{provider_id}"
+
+
+def load_availability_windows(provider_id):
+    """
+    {weekday: [(start_time, end_time), ...]} for a provider, straight from
+    the database. An empty dict means no working hours were configured.
+    """
+    windows = {}
+    for weekday, start_time, end_time in ProviderAvailability.objects.filter(
+        provider_id=provider_id
+    ).values_list("weekday", "start_time", "end_time"):
+        windows.setdefault(weekday, []).append((start_time, end_time))
+    return windows
+
+
+def availability_windows(provider_id):
+    """
+    load_availability_windows(), cached between edits for the read paths.
+    """
+    windows = cache.get(_windows_key(provider_id))
+    if windows is None:
+        windows = load_availability_windows(provider_id)
+        cache.set(_windows_key(provider_id), windows, _cache_ttl())
+    return windows
+
+
+def discard_availability_windows(provider_id):
+    cache.delete(_windows_key(provider_id))
+
+
+def _open_intervals(windows, start, end):
+    """
+    Expand weekly windows into aware local-time intervals clipped to
+    [start, end).
+    """
+    if not windows:
+        yield start, end
+        return
+    tz = timezone.get_current_timezone()
+    day = timezone.localtime(start).date()
+    last_day = timezone.localtime(end).date()
+    while day <= last_day:
+        for start_time, end_time in sorted(windows.get(day.weekday(), ())):
+            open_start = timezone.make_aware(datetime.combine(day, start_time), tz)
+            open_end = timezone.make_aware(datetime.combine(day, end_time), tz)
+            if open_end > start and open_start < end:
+                yield max(open_start, start), min(open_end, end)
+        day += timedelta(days=1)
+
+
+def within_working_hours(windows, start, end):
+    return any(
+        open_start <= start and end <= open_end
+        for open_start, open_end in _open_intervals(windows, start, end)
+    )
+
+
+# ----------------------------
+# Queries
+# ----------------------------
+def free_slots(provider_id, start, end, min_minutes=0):
+    """
+    [(slot_start, slot_end), ...] within [start, end) that fall inside the
+    provider's working hours and overlap no booking.
+    """
+    index = schedules.index(provider_id)
+    minimum = timedelta(minutes=min_minutes)
+    slots = []
+    for open_start, open_end in _open_intervals(availability_windows(provider_id), start, end):
+        busy = sorted((s, e) for s, e, _ in index.overlapping(open_start, open_end))
+        cursor = open_start
+        for busy_start, busy_end in busy:
+            if busy_start > cursor and busy_start - cursor >= minimum:
+                slots.append((cursor, busy_start))
+            cursor = max(cursor, busy_end)
+        if open_end > cursor and open_end - cursor >= minimum:
+            slots.append((cursor, open_end))
+    return slots
+
+
+def check_conflicts(provider_id, start, end, exclude_job_id=None):
+    """
+    Raise ScheduleConflict if [start, end) is outside the provider's working
+    hours or overlaps another booking. Reads the database rather than the
+    caches: callers hold the provider row lock, and a cache may not have
+    seen a booking or an hours change committed a moment ago.
+    """
+    if not within_working_hours(load_availability_windows(provider_id), start, end):
+        raise ScheduleConflict("The provider is not available at that time.")
+    clashes = blocking_jobs(provider_id, start, end)
+    if exclude_job_id is not None:
+        clashes = clashes.exclude(pk=exclude_job_id)
+    if clashes.exists():
+        raise ScheduleConflict("The provider is already booked at that time.")
+
+
+def providers_free_at(start, end, category_id=None):
+    """
+    ProviderProfile queryset of providers whose working hours cover
+    [start, end) and who have no overlapping booking. Both tests are
+    correlated EXISTS subqueries on the schedule and weekday indexes.
+    """
+    local_start, local_end = timezone.localtime(start), timezone.localtime(end)
+    busy = Job.objects.filter(
+        provider=OuterRef("pk"),
+        status__in=BLOCKING_STATUSES,
+        scheduled_for__lt=end,
+        scheduled_end__gt=start,
+    )
+    has_hours = ProviderAvailability.objects.filter(provider=OuterRef("pk"))
+    providers = ProviderProfile.objects.filter(~Exists(busy))
+    if local_start.date() == local_end.date():
+        covering = has_hours.filter(
+            weekday=local_start.weekday(),
+            start_time__lte=local_start.time(),
+            end_time__gte=local_end.time(),
+        )
+        providers = providers.filter(Exists(covering) | ~Exists(has_hours))
+    else:
+        # Windows never cross midnight, so only providers without
+        # configured hours can take a booking spanning two days.
+        providers = providers.filter(~Exists(has_hours))
+    if category_id is not None:
+        providers = providers.filter(services__category_id=category_id).distinct()
+    return providers
@@ -0,0 +1,169 @@
+import math
+import re
+import threading
+from collections import defaultdict
+
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVector
+from django.db import connection
+from django.db.models import Count, F, Max
+
+from .models import ProviderService, SearchDocument
+
+SEARCH_CONFIG = 'english'
+TITLE_WEIGHT = 1.0
+BODY_WEIGHT = 0.4
+
+_TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def tokenize(text):
+    return [token for token in _TOKEN_RE.findall((text or '').lower()) if len(token) > 1]
+
+
+# ----------------------------
+# Document maintenance (called from signals)
+# ----------------------------
+def index_provider(profile):
+    document, _ = SearchDocument.objects.update_or_create(
+        provider=profile,
+        service=None,
+        defaults={'title': profile.location, 'body': profile.bio},
+    )
+    _update_vector(document)
+
+
+def index_service(service):
+    document, _ = SearchDocument.objects.update_or_create(
+        service=service,
+        defaults={
+            'provider_id': service.provider_id,
+            'title': f"{service.title} {service.category.name}",
+            'body': service.description,
+        },
+    )
+    _update_vector(document)
+
+
+def index_category(category):
+    for service in ProviderService.objects.filter(category=category).select_related('category'):
+        index_service(service)
+
+
+def _update_vector(document):
+    if connection.vendor != 'postgresql':
+        return
+    SearchDocument.objects.filter(pk=document.pk).update(
+        search_vector=(
+            SearchVector('title', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('body', weight='B', config=SEARCH_CONFIG)
+        )
+    )
+
+
+# ----------------------------
+# In-process inverted index (SQLite / non-Postgres fallback)
+# ----------------------------
+class InvertedIndex:
+    """
+    Term -> {document id: weighted term frequency} postings kept in memory.
+
+    The index is synced lazily against SearchDocument: each query costs one
+    aggregate (count, max updated_at) and only documents touched since the
+    last sync are re-read, so saves elsewhere are picked up incrementally.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._postings = defaultdict(dict)
+        self._terms = {}
+        self._last_update = None
+        self._built = False
+
+    def search(self, query, limit):
+        terms = tokenize(query)
+        if not terms:
+            return []
+        with self._lock:
+            self._sync()
+            total = len(self._terms) or 1
+            scores = defaultdict(float)
+            for term in set(terms):
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + total / len(postings))
+                for document_id, frequency in postings.items():
+                    scores[document_id] += frequency * idf
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+        return ranked[:limit]
+
+    def _sync(self):
+        stats = SearchDocument.objects.aggregate(total=Count('id'), last_update=Max('updated_at'))
+        if not self._built:
+            self._rebuild()
+        elif stats['last_update'] and (
+            self._last_update is None or stats['last_update'] > self._last_update
+        ):
+            changed = SearchDocument.objects.all()
+            if self._last_update is not None:
+                changed = changed.filter(updated_at__gte=self._last_update)
+            for document in changed:
+                self._add(document)
+            self._last_update = stats['last_update']
+        # Fewer rows than indexed documents means something was deleted.
+        if len(self._terms) != stats['total']:
+            self._rebuild()
+
+    def _rebuild(self):
+        self._postings.clear()
+        self._terms.clear()
+        self._last_update = None
+        for document in SearchDocument.objects.iterator():
+            self._add(document)
+            if self._last_update is None or document.updated_at > self._last_update:
+                self._last_update = document.updated_at
+        self._built = True
+
+    def _add(self, document):
+        for term in self._terms.pop(document.id, ()):
+            self._postings[term].pop(document.id, None)
+        frequencies = defaultdict(float)
+        for term in tokenize(document.title):
+            frequencies[term] += TITLE_WEIGHT
+        for term in tokenize(document.body):
+            frequencies[term] += BODY_WEIGHT
+        for term, frequency in frequencies.items():
+            self._postings[term][document.id] = frequency
+        self._terms[document.id] = tuple(frequencies)
+
+
+_fallback_index = InvertedIndex()
+
+
+# ----------------------------
+# Query
+# ----------------------------
+def search(query, limit=20):
+    """
+    Return a list of (SearchDocument, score) ordered by relevance.
+    """
+    if connection.vendor == 'postgresql':
+        search_query = SearchQuery(query, search_type='websearch', config=SEARCH_CONFIG)
+        documents = (
+            SearchDocument.objects
+            .filter(search_vector=search_query)
+            .annotate(rank=SearchRank(F('search_vector'), search_query))
+            .select_related('provider__user', 'service__category')
+            .order_by('-rank', 'id')[:limit]
+        )
+        return [(document, float(document.rank)) for document in documents]
+
+    ranked = _fallback_index.search(query, limit)
+    documents = SearchDocument.objects.select_related(
+        'provider__user', 'service__category'
+    ).in_bulk([document_id for document_id, _ in ranked])
+    return [
+        (documents[document_id], score)
+        for document_id, score in ranked
+        if document_id in documents
+    ]
@@ -0,0 +1,262 @@
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from .job_workflow import job_status_changed
+from .models import (
+    Job,
+    JobMilestone,
+    MilestoneTemplate,
+    ProviderAvailability,
+    ProviderProfile,
+    ProviderService,
+    Review,
+    ServiceCategory,
+)
+from . import dispatch, eta, facets, geo, job_workflow, positions, provider_cards, scheduling, search
+
+User = get_user_model()
+
+
+# ----------------------------
+# Version stamps (conditional GET)
+# ----------------------------
+# Nested payloads are versioned by their root row, so changes to children
+# bump the parent's updated_at with a single UPDATE (no save(), no signals).
+@receiver(post_save, sender=ProviderService)
+@receiver(post_delete, sender=ProviderService)
+def touch_service_provider(sender, instance, **kwargs):
+    ProviderProfile.objects.filter(pk=instance.provider_id).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=User)
+def touch_user_provider(sender, instance, created, **kwargs):
+    if not created and instance.role == 'provider':
+        ProviderProfile.objects.filter(user=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=ServiceCategory)
+def touch_category_services(sender, instance, created, **kwargs):
+    if not created:
+        ProviderService.objects.filter(category=instance).update(updated_at=timezone.now())
+
+
+@receiver(post_save, sender=JobMilestone)
+@receiver(post_delete, sender=JobMilestone)
+def touch_milestone_job(sender, instance, **kwargs):
+    Job.objects.filter(pk=instance.job_id).update(updated_at=timezone.now())
+
+
+# ----------------------------
+# Search index maintenance
+# ----------------------------
+@receiver(post_save, sender=ProviderProfile)
+def index_provider_profile(sender, instance, **kwargs):
+    search.index_provider(instance)
+
+
+@receiver(post_save, sender=ProviderService)
+def index_provider_service(sender, instance, **kwargs):
+    search.index_service(instance)
+
+
+@receiver(post_save, sender=ServiceCategory)
+def reindex_category_services(sender, instance, created, **kwargs):
+    if not created:
+        search.index_category(instance)
+
+
+# ----------------------------
+# Geo grid maintenance
+# ----------------------------
+@receiver(pre_save, sender=ProviderProfile)
+def set_provider_geohash(sender, instance, **kwargs):
+    if instance.latitude is not None and instance.longitude is not None:
+        instance.geohash = geo.encode_geohash(instance.latitude, instance.longitude)
+    else:
+        instance.geohash = ''
+    instance._previous_geohash = (
+        ProviderProfile.objects.filter(pk=instance.pk).values_list('geohash', flat=True).first()
+        if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=ProviderProfile)
+def invalidate_provider_cells(sender, instance, **kwargs):
+    geo.invalidate_cells(instance.geohash, getattr(instance, '_previous_geohash', None))
+
+
+@receiver(post_delete, sender=ProviderProfile)
+def invalidate_deleted_provider_cells(sender, instance, **kwargs):
+    geo.invalidate_cells(instance.geohash)
+
+
+@receiver(post_save, sender=ProviderService)
+@receiver(post_delete, sender=ProviderService)
+def invalidate_service_provider_cells(sender, instance, **kwargs):
+    geohash = ProviderProfile.objects.filter(pk=instance.provider_id).values_list('geohash', flat=True).first()
+    geo.invalidate_cells(geohash)
+
+
+# ----------------------------
+# Provider card read model
+# ----------------------------
+@receiver(post_save, sender=ProviderProfile)
+def rebuild_provider_card(sender, instance, **kwargs):
+    transaction.on_commit(lambda: provider_cards.rebuild_card(instance.pk))
+
+
+@receiver(post_delete, sender=ProviderProfile)
+def discard_provider_card(sender, instance, **kwargs):
+    provider_id = instance.pk  # cleared on the instance once the delete finishes
+    transaction.on_commit(lambda: provider_cards.discard_cards([provider_id]))
+
+
+@receiver(post_save, sender=ProviderService)
+@receiver(post_delete, sender=ProviderService)
+def rebuild_service_provider_card(sender, instance, **kwargs):
+    transaction.on_commit(lambda: provider_cards.rebuild_card(instance.provider_id))
+
+
+@receiver(post_save, sender=ServiceCategory)
+def discard_category_provider_cards(sender, instance, created, **kwargs):
+    if created:
+        return
+    provider_ids = list(
+        ProviderService.objects.filter(category=instance).values_list('provider_id', flat=True).distinct()
+    )
+    transaction.on_commit(lambda: provider_cards.discard_cards(provider_ids))
+
+
+@receiver(post_save, sender=User)
+def rebuild_user_provider_card(sender, instance, created, **kwargs):
+    if created or instance.role != 'provider':
+        return
+    provider_id = ProviderProfile.objects.filter(user=instance).values_list('id', flat=True).first()
+    if provider_id is not None:
+        transaction.on_commit(lambda: provider_cards.rebuild_card(provider_id))
+
+
+# ----------------------------
+# Rating aggregates
+# ----------------------------
+@receiver(post_delete, sender=Review)
+def remove_review_from_rating(sender, instance, **kwargs):
+    # Inserts and updates are applied in Review.save(); deletes are handled
+    # here so cascaded and queryset deletes are counted too.
+    ProviderProfile.objects.adjust_rating(instance.provider_id, -1, -instance.rating)
+
+
+# ----------------------------
+# Service facet counts
+# ----------------------------
+@receiver(pre_save, sender=ProviderService)
+def remember_service_facet(sender, instance, **kwargs):
+    previous = (
+        ProviderService.objects.filter(pk=instance.pk).values_list('category_id', 'price').first()
+        if instance.pk else None
+    )
+    instance._previous_facet = (previous[0], facets.price_bucket(previous[1])) if previous else None
+
+
+@receiver(post_save, sender=ProviderService)
+def update_service_facet(sender, instance, **kwargs):
+    facets.record_service_change(
+        getattr(instance, '_previous_facet', None),
+        (instance.category_id, facets.price_bucket(instance.price)),
+    )
+
+
+@receiver(post_delete, sender=ProviderService)
+def remove_service_facet(sender, instance, **kwargs):
+    facets.record_service_change((instance.category_id, facets.price_bucket(instance.price)), None)
+
+
+# ----------------------------
+# Milestone templates
+# ----------------------------
+@receiver(post_save, sender=MilestoneTemplate)
+@receiver(post_delete, sender=MilestoneTemplate)
+def discard_cached_milestone_templates(sender, instance, **kwargs):
+    transaction.on_commit(lambda: job_workflow.discard_milestone_templates(instance.category_id))
+
+
+# ----------------------------
+# Dispatch candidate pools
+# ----------------------------
+@receiver(post_save, sender=ProviderProfile)
+def invalidate_provider_pools(sender, instance, created, **kwargs):
+    if created:
+        return
+    category_ids = set(instance.services.values_list('category_id', flat=True))
+    if category_ids:
+        transaction.on_commit(lambda: dispatch.invalidate_pools(category_ids))
+
+
+@receiver(post_save, sender=ProviderService)
+@receiver(post_delete, sender=ProviderService)
+def invalidate_service_pools(sender, instance, **kwargs):
+    category_ids = {instance.category_id}
+    previous = getattr(instance, '_previous_facet', None)
+    if previous:
+        category_ids.add(previous[0])
+    transaction.on_commit(lambda: dispatch.invalidate_pools(category_ids))
+
+
+@receiver(job_status_changed)
+def track_provider_workload(sender, provider_id, previous, status, **kwargs):
+    if provider_id is None:
+        return
+    was_active = previous in dispatch.ACTIVE_JOB_STATUSES
+    is_active = status in dispatch.ACTIVE_JOB_STATUSES
+    if was_active != is_active:
+        dispatch.dispatcher.adjust_workload(provider_id, 1 if is_active else -1)
+
+
+# ----------------------------
+# Provider schedules
+# ----------------------------
+@receiver(post_save, sender=Job)
+@receiver(post_delete, sender=Job)
+def invalidate_job_schedule(sender, instance, **kwargs):
+    if instance.provider_id:
+        transaction.on_commit(lambda: scheduling.invalidate_schedules(instance.provider_id))
+
+
+@receiver(job_status_changed)
+def release_finished_job_slot(sender, provider_id, status, **kwargs):
+    # Completed and closed jobs stop holding their slot.
+    if provider_id and status not in scheduling.BLOCKING_STATUSES:
+        scheduling.invalidate_schedules(provider_id)
+
+
+@receiver(post_save, sender=ProviderAvailability)
+@receiver(post_delete, sender=ProviderAvailability)
+def discard_cached_availability(sender, instance, **kwargs):
+    transaction.on_commit(lambda: scheduling.discard_availability_windows(instance.provider_id))
+
+
+# ----------------------------
+# Last known positions
+# ----------------------------
+@receiver(job_status_changed)
+def update_position_status(sender, job_id, status, **kwargs):
+    positions.update_status(job_id, status)
+
+
+# ----------------------------
+# ETA trackers
+# ----------------------------
+@receiver(post_save, sender=Job)
+def reset_eta_tracker(sender, instance, created, **kwargs):
+    # The site may have moved; the tracker reloads it on the next ping.
+    if not created:
+        transaction.on_commit(lambda: eta.discard(instance.pk))
+
+
+@receiver(job_status_changed)
+def discard_finished_eta_tracker(sender, job_id, status, **kwargs):
+    if status in ("completed", "closed"):
+        eta.discard(job_id)
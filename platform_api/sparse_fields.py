@@ -0,0 +1,123 @@
+from rest_framework import serializers
+
+
+def parse_field_spec(value):
+    """
+    "id,service.title,service.category" -> {"id": {}, "service": {"title": {}, "category": {}}}
+    Returns None when the parameter was not given.
+    """
+    if value is None:
+        return None
+    tree = {}
+    for path in value.split(","):
+        node = tree
+        for part in filter(None, path.strip().split(".")):
+            node = node.setdefault(part, {})
+    return tree
+
+
+# ----------------------------
+# Serializer side
+# ----------------------------
+class SparseFieldsMixin:
+    """
+    Accepts `fields` and `expand` trees (see parse_field_spec).
+
+    Without either, the serializer behaves exactly as declared. With either,
+    only the requested fields are kept and nested relations are rendered as
+    primary keys unless they are expanded (listed in `expand`, or given
+    sub-fields in `fields`); expanded relations receive their sub-trees.
+    """
+
+    def __init__(self, *args, fields=None, expand=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        if fields is None and expand is None:
+            return
+        fields = fields or {}
+        expand = expand or {}
+
+        if fields:
+            wanted = set(fields) | set(expand)
+            for name in list(self.fields):
+                if name not in wanted and not self.fields[name].write_only:
+                    self.fields.pop(name)
+
+        for name, field in list(self.fields.items()):
+            many = isinstance(field, serializers.ListSerializer)
+            nested = field.child if many else field
+            if field.write_only or not isinstance(nested, serializers.BaseSerializer):
+                continue
+            source = {} if field.source == name else {"source": field.source}
+            sub_fields, sub_expand = fields.get(name) or None, expand.get(name)
+            if sub_fields is None and sub_expand is None:
+                self.fields[name] = serializers.PrimaryKeyRelatedField(read_only=True, many=many, **source)
+            elif isinstance(nested, SparseFieldsMixin) and (sub_fields or sub_expand):
+                self.fields[name] = nested.__class__(
+                    many=many, read_only=True, fields=sub_fields, expand=sub_expand or None, **source
+                )
+
+
+def eager_loading(serializer):
+    """
+    Derive (select_related, prefetch_related) lookups from the fields a
+    serializer instance will actually render.
+    """
+    if isinstance(serializer, serializers.ListSerializer):
+        serializer = serializer.child
+    select, prefetch = set(), set()
+    _collect(serializer, "", False, select, prefetch)
+    return sorted(select), sorted(prefetch)
+
+
+def _collect(serializer, prefix, under_many, select, prefetch):
+    def add(path, many):
+        (prefetch if under_many or many else select).add(prefix + path)
+
+    for name, field in serializer.fields.items():
+        if field.write_only or field.source == "*":
+            continue
+        path = "__".join(field.source_attrs)
+        if isinstance(field, serializers.ListSerializer):
+            add(path, True)
+            _collect(field.child, prefix + path + "__", True, select, prefetch)
+        elif isinstance(field, serializers.BaseSerializer):
+            add(path, False)
+            _collect(field, prefix + path + "__", under_many, select, prefetch)
+        elif isinstance(field, serializers.ManyRelatedField):
+            add(path, True)
+        elif isinstance(field, serializers.PrimaryKeyRelatedField):
+            continue
+        elif isinstance(field, serializers.RelatedField):
+            add(path, False)
+        elif len(field.source_attrs) > 1:
+            add("__".join(field.source_attrs[:-1]), False)
+        else:
+            continue
+        for extra in getattr(serializer, "eager_load_hints", {}).get(name, ()):
+            add(extra, False)
+
+
+# ----------------------------
+# View side
+# ----------------------------
+class SparseFieldsViewMixin:
+    """
+    Reads ?fields= and ?expand= for GET requests and passes them to the
+    serializer; optimize_queryset() loads exactly the relations rendered.
+    """
+
+    def get_field_specs(self):
+        if self.request.method != "GET":
+            return None, None
+        params = self.request.query_params
+        return parse_field_spec(params.get("fields")), parse_field_spec(params.get("expand"))
+
+    def get_serializer(self, *args, **kwargs):
+        fields, expand = self.get_field_specs()
+        kwargs.setdefault("fields", fields)
+        kwargs.setdefault("expand", expand)
+        return super().get_serializer(*args, **kwargs)
+
+    def optimize_queryset(self, queryset):
+        select, prefetch = eager_loading(self.get_serializer())
+        return queryset.select_related(*select).prefetch_related(*prefetch)
@@ -1,3 +1,1523 @@
-from django.test import TestCase
+import asyncio
+import json
+from datetime import time, timedelta
+from decimal import Decimal
+from io import StringIO
+from itertools import count
+from unittest import mock
 
-# Create your tests here.
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import OperationalError
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework.test import APIClient
+
+from .models import (
+    Booking,
+    ChatRoom,
+    CustomUser,
+    Job,
+    JobLocationLog,
+    JobMilestone,
+    JobStatusLog,
+    JobTrack,
+    JobTrackSegment,
+    Message,
+    MilestoneTemplate,
+    ProviderAvailability,
+    ProviderProfile,
+    ProviderService,
+    Review,
+    ServiceCategory,
+    ServiceFacetCount,
+)
+from . import dispatch, eta, scheduling, search, tracks
+from .coalescing import LocationCoalescer, should_broadcast
+from .frames import SUBPROTOCOL, FrameDecoder, FrameEncoder
+from .job_workflow import transition_job
+from .location_buffer import LocationBuffer
+from .positions import last_position, record_position
+from .routing import websocket_urlpatterns
+from .track_storage import SCALE, decode_points, encode_points, jobs_to_merge, merge_segments, write_pings
+
+_serial = count(1)
+
+
+def make_user(role="customer", **kwargs):
+    return CustomUser.objects.create_user(username=f"{role}{next(_serial)}", role=role, **kwargs)
+
+
+def make_provider(**kwargs):
+    return ProviderProfile.objects.create(user=make_user("provider"), **kwargs)
+
+
+def make_job(status="accepted", customer=None, provider=None, **kwargs):
+    kwargs.setdefault("scheduled_for", timezone.now())
+    return Job.objects.create(
+        customer=customer or make_user(),
+        provider=provider if provider is not None else make_provider(),
+        status=status,
+        **kwargs,
+    )
+
+
+def client_for(user=None):
+    client = APIClient()
+    if user is not None:
+        client.force_authenticate(user)
+    return client
+
+
+@override_settings(CHANNEL_LAYERS={"default": {"BACKEND": "channels.layers.InMemoryChannelLayer"}})
+class CacheTestCase(TestCase):
+    """
+    The read models (cards, positions, schedules) live in the cache, which
+    outlives each test's transaction. Broadcasts go to an in-memory layer.
+    """
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+
+# ----------------------------
+# Provider listing
+# ----------------------------
+class ProviderListPaginationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.providers = [make_provider() for _ in range(7)]
+        # Equal created_at values: the id tiebreaker has to keep pages apart.
+        ProviderProfile.objects.update(created_at=timezone.now())
+
+    def test_plain_list_without_cursor_params(self):
+        response = client_for().get("/api/providers/")
+        self.assertIsInstance(response.data, list)
+        self.assertEqual(len(response.data), 7)
+
+    def test_cursor_pages_cover_every_provider_once(self):
+        client = client_for()
+        response = client.get("/api/providers/", {"page_size": 3})
+        seen = [card["id"] for card in response.data["results"]]
+        while response.data["next"]:
+            response = client.get(response.data["next"])
+            seen += [card["id"] for card in response.data["results"]]
+        self.assertEqual(seen, sorted((p.id for p in self.providers), reverse=True))
+
+    def test_page_cost_does_not_grow_with_page_size(self):
+        client = client_for()
+        client.get("/api/providers/", {"page_size": 7})  # warm the cards
+        with self.assertNumQueries(1):
+            client.get("/api/providers/", {"page_size": 7})
+        cache.clear()
+        with self.assertNumQueries(3):
+            client.get("/api/providers/", {"page_size": 7})
+
+    def test_sort_by_rating(self):
+        ProviderProfile.objects.filter(pk=self.providers[2].pk).update(rating="4.50")
+        response = client_for().get("/api/providers/", {"page_size": 3, "sort": "rating"})
+        self.assertEqual(response.data["results"][0]["id"], self.providers[2].id)
+
+
+# ----------------------------
+# Search
+# ----------------------------
+class SearchTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        # A fresh fallback index per test: ids are reused across rollbacks.
+        fresh = mock.patch.object(search, "_fallback_index", search.InvertedIndex())
+        fresh.start()
+        self.addCleanup(fresh.stop)
+        plumbing = ServiceCategory.objects.create(name="Plumbing")
+        self.leak = ProviderService.objects.create(
+            provider=make_provider(location="Lagos"), category=plumbing,
+            title="Leak repair", description="Burst pipes and dripping taps", price=Decimal("100.00"),
+        )
+        self.boiler = ProviderService.objects.create(
+            provider=make_provider(location="Abuja", bio="Gas boilers and the odd leak"),
+            category=ServiceCategory.objects.create(name="Heating"), title="Boiler service", price=Decimal("80.00"),
+        )
+
+    def search(self, q):
+        response = client_for().get("/api/search/", {"q": q})
+        self.assertEqual(response.status_code, 200)
+        return [(result["type"], result["id"]) for result in response.data["results"]]
+
+    def test_title_matches_outrank_body_matches(self):
+        self.assertEqual(
+            self.search("leak"), [("service", self.leak.id), ("provider", self.boiler.provider_id)]
+        )
+
+    def test_category_and_location_are_searchable(self):
+        self.assertEqual(self.search("plumbing"), [("service", self.leak.id)])
+        self.assertEqual(self.search("abuja"), [("provider", self.boiler.provider_id)])
+
+    def test_index_follows_saves_and_deletes(self):
+        self.assertEqual(self.search("radiator"), [])
+        self.boiler.title = "Radiator bleeding"
+        self.boiler.save()
+        self.assertEqual(self.search("radiator"), [("service", self.boiler.id)])
+        self.boiler.delete()
+        self.assertEqual(self.search("radiator"), [])
+
+    def test_query_is_required(self):
+        self.assertEqual(client_for().get("/api/search/").status_code, 400)
+        self.assertEqual(client_for().get("/api/search/", {"q": "leak", "limit": "x"}).status_code, 400)
+
+
+# ----------------------------
+# Nearby providers
+# ----------------------------
+class NearbyProviderTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.plumbing = ServiceCategory.objects.create(name="Plumbing")
+        # Roughly 1 km, 3 km and 30 km east of the search point.
+        self.near, self.further, self.far = (
+            make_provider(latitude=6.5, longitude=3.4 + offset) for offset in (0.009, 0.027, 0.27)
+        )
+        for provider in (self.near, self.further, self.far):
+            ProviderService.objects.create(
+                provider=provider, category=self.plumbing, title="Plumbing", price=Decimal("50.00")
+            )
+        self.electrician = make_provider(latitude=6.5, longitude=3.4)
+
+    def nearby(self, **params):
+        params = dict({"lat": 6.5, "lng": 3.4, "radius": 5}, **params)
+        response = client_for().get("/api/providers/nearby/", params)
+        self.assertEqual(response.status_code, 200)
+        return [(card["id"], round(card["distance_km"])) for card in response.data]
+
+    def test_nearest_first_within_the_radius(self):
+        self.assertEqual(
+            self.nearby(), [(self.electrician.id, 0), (self.near.id, 1), (self.further.id, 3)]
+        )
+        self.assertEqual(self.nearby(limit=1), [(self.electrician.id, 0)])
+
+    def test_category_filter(self):
+        self.assertEqual(self.nearby(category=self.plumbing.id), [(self.near.id, 1), (self.further.id, 3)])
+
+    def test_moving_provider_invalidates_cached_cells(self):
+        self.assertEqual(self.nearby(category=self.plumbing.id, radius=2), [(self.near.id, 1)])
+        self.far.longitude = 3.4
+        self.far.save()
+        self.assertEqual(
+            self.nearby(category=self.plumbing.id, radius=2), [(self.far.id, 0), (self.near.id, 1)]
+        )
+
+    def test_invalid_parameters(self):
+        invalid = (
+            {"lat": 6.5},
+            {"lat": 900, "lng": 3.4},
+            {"lat": "x", "lng": 3.4},
+            {"lat": 6.5, "lng": 3.4, "radius": 0},
+        )
+        for params in invalid:
+            self.assertEqual(client_for().get("/api/providers/nearby/", params).status_code, 400, params)
+
+
+# ----------------------------
+# Provider cards
+# ----------------------------
+class ProviderCardTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.provider = make_provider(bio="Pipes")
+        self.category = ServiceCategory.objects.create(name="Plumbing")
+        self.url = f"/api/providers/{self.provider.slug}/"
+
+    def card(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            pass
+        return client_for().get(self.url).data
+
+    def test_detail_is_served_from_the_cache(self):
+        self.card()
+        with self.assertNumQueries(0):
+            self.assertEqual(client_for().get(self.url).data["bio"], "Pipes")
+
+    def test_card_follows_profile_service_user_and_category_changes(self):
+        self.card()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.bio = "Pipes and drains"
+            self.provider.save()
+        self.assertEqual(self.card()["bio"], "Pipes and drains")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            ProviderService.objects.create(
+                provider=self.provider, category=self.category, title="Leaks", price=Decimal("10.00")
+            )
+        self.assertEqual(self.card()["categories"], [{"id": self.category.id, "name": "Plumbing"}])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = "Plumbing & drains"
+            self.category.save()
+        self.assertEqual(self.card()["categories"][0]["name"], "Plumbing & drains")
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.user.username = "renamed"
+            self.provider.user.save()
+        self.assertEqual(self.card()["user"]["username"], "renamed")
+
+    def test_deleted_provider_is_gone(self):
+        self.card()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.provider.delete()
+        self.assertEqual(client_for().get(self.url).status_code, 404)
+        self.assertEqual(client_for().get("/api/providers/").data, [])
+
+
+# ----------------------------
+# Conditional GET
+# ----------------------------
+class ConditionalGetTests(CacheTestCase):
+    def assertRevalidates(self, client, url, change):
+        """A matching ETag gives 304 until `change()` runs, then 200 with a new one."""
+        response = client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+        self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        with self.captureOnCommitCallbacks(execute=True):
+            change()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+
+    def test_provider_detail(self):
+        provider = make_provider()
+        url = f"/api/providers/{provider.slug}/"
+        client = client_for()
+        etag = client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            self.assertEqual(client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        def change():
+            provider.bio = "New bio"
+            provider.save()
+        self.assertRevalidates(client, url, change)
+
+    def test_service_list_sees_edits_and_deletes(self):
+        service = ProviderService.objects.create(
+            provider=make_provider(), category=ServiceCategory.objects.create(name="Plumbing"),
+            title="Leaks", price=Decimal("10.00"),
+        )
+        client = client_for()
+
+        def edit():
+            service.price = Decimal("12.00")
+            service.save()
+        self.assertRevalidates(client, "/api/provider-services/", edit)
+        self.assertRevalidates(client, "/api/provider-services/", service.delete)
+
+    def test_job_detail(self):
+        job = make_job()
+        client = client_for(job.customer)
+        self.assertRevalidates(client, f"/api/jobs/{job.pk}/", lambda: transition_job(job, "in_progress"))
+
+        # Validators are per participant query, so outsiders still get 404.
+        self.assertEqual(client_for(make_user()).get(f"/api/jobs/{job.pk}/").status_code, 404)
+
+
+# ----------------------------
+# Milestones and escrow
+# ----------------------------
+class MilestonePermissionTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job(status="in_progress")
+        self.milestone = JobMilestone.objects.create(job=self.job, title="Deposit", amount=Decimal("100.00"))
+        self.customer = client_for(self.job.customer)
+        self.provider = client_for(self.job.provider.user)
+
+    def test_provider_edits_title_but_not_funding_state(self):
+        response = self.provider.patch(
+            f"/api/milestones/{self.milestone.pk}/",
+            {"title": "Deposit (50%)", "funded": True, "released": True, "status": "released"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.milestone.refresh_from_db()
+        self.assertEqual(self.milestone.title, "Deposit (50%)")
+        self.assertEqual(
+            (self.milestone.funded, self.milestone.released, self.milestone.status), (False, False, "pending")
+        )
+
+    def test_other_providers_cannot_edit(self):
+        other = make_provider().user
+        response = client_for(other).patch(
+            f"/api/milestones/{self.milestone.pk}/", {"title": "Mine now"}, format="json"
+        )
+        self.assertEqual(response.status_code, 404)
+
+    def test_funding_moves_money_into_escrow(self):
+        wallet = self.job.customer.wallet
+        wallet.balance = Decimal("150.00")
+        wallet.save()
+
+        self.assertEqual(self.customer.post(f"/api/milestones/{self.milestone.pk}/fund/").status_code, 200)
+        self.milestone.refresh_from_db()
+        self.assertEqual((self.milestone.funded, self.milestone.status), (True, "funded"))
+        self.assertEqual(self.milestone.escrow.amount, Decimal("100.00"))
+        wallet.refresh_from_db()
+        self.assertEqual(wallet.balance, Decimal("50.00"))
+
+        self.assertEqual(self.customer.post(f"/api/milestones/{self.milestone.pk}/fund/").status_code, 400)
+        self.assertEqual(self.provider.post(f"/api/milestones/{self.milestone.pk}/submit/").status_code, 200)
+
+    def test_other_customers_cannot_fund(self):
+        self.assertEqual(
+            client_for(make_user()).post(f"/api/milestones/{self.milestone.pk}/fund/").status_code, 403
+        )
+
+    def test_unassigned_job_cannot_be_funded(self):
+        open_job = Job.objects.create(customer=self.job.customer, scheduled_for=timezone.now())
+        milestone = JobMilestone.objects.create(job=open_job, title="Deposit", amount=Decimal("10.00"))
+        self.assertEqual(self.customer.post(f"/api/milestones/{milestone.pk}/fund/").status_code, 400)
+
+
+class JobCreationTests(CacheTestCase):
+    def test_milestones_follow_the_category_templates(self):
+        category = ServiceCategory.objects.create(name="Plumbing")
+        MilestoneTemplate.objects.create(category=category, title="Parts", amount_percent=30, position=0)
+        MilestoneTemplate.objects.create(category=category, title="Labour", amount_percent=70, position=1)
+        service = ProviderService.objects.create(
+            provider=make_provider(), category=category, title="Fix a leak", price=Decimal("250.00")
+        )
+        customer = make_user()
+
+        response = client_for(customer).post(
+            "/api/jobs/",
+            {"service_id": service.pk, "scheduled_for": timezone.now().isoformat()},
+            format="json",
+        )
+        self.assertEqual(response.status_code, 201)
+        job = Job.objects.get(pk=response.data["id"])
+        self.assertEqual(
+            list(job.milestones.order_by("id").values_list("title", "amount")),
+            [("Parts", Decimal("75.00")), ("Labour", Decimal("175.00"))],
+        )
+        self.assertEqual(job.provider_id, service.provider_id)
+        self.assertTrue(Booking.objects.filter(job=job).exists())
+        self.assertTrue(ChatRoom.objects.filter(job=job).exists())
+        self.assertEqual(list(job.status_logs.values_list("status", flat=True)), ["created"])
+
+    def test_service_or_category_is_required(self):
+        response = client_for(make_user()).post(
+            "/api/jobs/", {"scheduled_for": timezone.now().isoformat()}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+
+
+# ----------------------------
+# Sparse fields on jobs and bookings
+# ----------------------------
+class SparseFieldsTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_user()
+        category = ServiceCategory.objects.create(name="Plumbing")
+        for _ in range(3):
+            provider = make_provider()
+            service = ProviderService.objects.create(
+                provider=provider, category=category, title="Leaks", price=Decimal("10.00")
+            )
+            job = make_job(customer=self.customer, provider=provider, service=service)
+            JobMilestone.objects.create(job=job, title="Deposit", amount=Decimal("5.00"))
+            Booking.objects.create(job=job)
+        self.client = client_for(self.customer)
+
+    def test_full_payload_in_constant_queries(self):
+        # Jobs with their users and services, then milestones, then the
+        # providers' services: three queries however many jobs there are.
+        with self.assertNumQueries(3):
+            response = self.client.get("/api/jobs/")
+        self.assertEqual(response.data[0]["service"]["category"]["name"], "Plumbing")
+        self.assertEqual(response.data[0]["milestones"][0]["title"], "Deposit")
+
+    def test_only_requested_fields_are_rendered_and_loaded(self):
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/jobs/", {"fields": "id,status"})
+        self.assertEqual(set(response.data[0]), {"id", "status"})
+
+        response = self.client.get("/api/jobs/", {"fields": "id,service.title,provider"})
+        self.assertEqual(set(response.data[0]), {"id", "service", "provider"})
+        self.assertEqual(response.data[0]["service"], {"title": "Leaks"})
+        self.assertIsInstance(response.data[0]["provider"], int)
+
+    def test_expand_on_bookings(self):
+        response = self.client.get("/api/bookings/", {"fields": "id,job.status", "expand": "job.milestones"})
+        self.assertEqual(set(response.data[0]["job"]), {"status", "milestones"})
+        self.assertEqual(response.data[0]["job"]["milestones"][0]["title"], "Deposit")
+
+
+# ----------------------------
+# Dispatch
+# ----------------------------
+@override_settings(DISPATCH_OFFERS_PER_JOB=2, DISPATCH_MAX_DISTANCE_KM=50)
+class DispatchTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        # Pools are per process and keyed by category id, which the test
+        # database reuses.
+        fresh = mock.patch.object(dispatch, "dispatcher", dispatch.Dispatcher())
+        fresh.start()
+        self.addCleanup(fresh.stop)
+        self.plumbing = ServiceCategory.objects.create(name="Plumbing")
+        # 1 km, 5 km and 100 km away, plus a plumber without coordinates.
+        self.near, self.mid, self.far = (
+            self.plumber(latitude=6.5, longitude=3.4 + offset) for offset in (0.009, 0.045, 0.9)
+        )
+        self.unplaced = self.plumber()
+        make_provider(latitude=6.5, longitude=3.4)  # an electrician next door
+        self.customer = make_user()
+
+    def plumber(self, **kwargs):
+        provider = make_provider(**kwargs)
+        ProviderService.objects.create(
+            provider=provider, category=self.plumbing, title="Leaks", price=Decimal("10.00")
+        )
+        return provider
+
+    def open_job(self):
+        response = client_for(self.customer).post("/api/jobs/", {
+            "category": self.plumbing.pk,
+            "site_latitude": 6.5,
+            "site_longitude": 3.4,
+            "scheduled_for": (timezone.now() + timedelta(days=1)).isoformat(),
+        }, format="json")
+        self.assertEqual(response.status_code, 201)
+        return Job.objects.get(pk=response.data["id"])
+
+    def offered(self, job):
+        return list(job.offers.order_by("-score").values_list("provider_id", flat=True))
+
+    def test_new_jobs_are_offered_to_the_best_candidates(self):
+        job = self.open_job()
+        self.assertEqual(self.offered(job), [self.near.id, self.mid.id])
+
+        response = client_for(self.customer).post(f"/api/jobs/{job.pk}/dispatch/")
+        self.assertEqual([offer["provider"] for offer in response.data["offers"]], [self.unplaced.id])
+        self.assertEqual(client_for(self.customer).post(f"/api/jobs/{job.pk}/dispatch/").data["offers"], [])
+
+    def test_ranking_reads_the_pool_not_the_database(self):
+        job = self.open_job()
+        with self.assertNumQueries(0):
+            dispatch.dispatcher.rank(job)
+
+    def test_pools_follow_service_changes_and_workload(self):
+        job = self.open_job()
+        closer = self.plumber(latitude=6.5, longitude=3.4)
+        with self.captureOnCommitCallbacks(execute=True):
+            ProviderService.objects.filter(provider=self.mid).delete()
+        self.assertEqual([p for p, _ in dispatch.dispatcher.rank(job)], [closer.id, self.near.id])
+
+        # Workload changes are applied to the loaded pool in place.
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                transition_job(make_job(provider=closer, status="created"), "accepted")
+        self.assertEqual([p for p, _ in dispatch.dispatcher.rank(job)], [self.near.id, closer.id])
+
+    def test_accepting_binds_the_job_and_expires_the_other_offers(self):
+        job = self.open_job()
+        near_offer, mid_offer = (job.offers.get(provider=provider) for provider in (self.near, self.mid))
+
+        response = client_for(self.near.user).post(f"/api/offers/{near_offer.pk}/accept/")
+        self.assertEqual(response.status_code, 200)
+        job.refresh_from_db()
+        self.assertEqual((job.provider_id, job.status), (self.near.id, "accepted"))
+        mid_offer.refresh_from_db()
+        self.assertEqual(mid_offer.status, "expired")
+        self.assertEqual(client_for(self.mid.user).post(f"/api/offers/{mid_offer.pk}/accept/").status_code, 409)
+        self.assertEqual(client_for(self.mid.user).get("/api/offers/").data, [])
+
+    def test_decline_and_foreign_offers(self):
+        job = self.open_job()
+        offer = job.offers.get(provider=self.near)
+        self.assertEqual(client_for(self.mid.user).post(f"/api/offers/{offer.pk}/decline/").status_code, 404)
+        self.assertEqual(client_for(self.near.user).post(f"/api/offers/{offer.pk}/decline/").status_code, 200)
+        offer.refresh_from_db()
+        self.assertEqual(offer.status, "declined")
+
+
+# ----------------------------
+# Provider schedules
+# ----------------------------
+class ScheduleTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.provider = make_provider()
+        self.day = (timezone.now() + timedelta(days=7)).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def at(self, hour):
+        return self.day + timedelta(hours=hour)
+
+    def book(self, hour, minutes=60, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return make_job(provider=self.provider, scheduled_for=self.at(hour), duration_minutes=minutes, **kwargs)
+
+    def test_interval_index_overlaps(self):
+        index = scheduling.IntervalIndex(None, [
+            (self.at(9), self.at(17), 1),   # long booking hides inside the running max
+            (self.at(10), self.at(11), 2),
+            (self.at(18), self.at(19), 3),
+        ])
+        self.assertEqual([job for _, _, job in index.overlapping(self.at(12), self.at(13))], [1])
+        self.assertEqual(sorted(job for _, _, job in index.overlapping(self.at(10), self.at(18.5))), [1, 2, 3])
+        self.assertTrue(index.is_free(self.at(17), self.at(18)))
+        self.assertTrue(index.is_free(self.at(12), self.at(13), exclude_job_id=1))
+
+    def test_free_slots_skip_bookings_and_follow_new_ones(self):
+        url = f"/api/providers/{self.provider.slug}/availability/"
+        params = {"start": self.at(9).isoformat(), "end": self.at(13).isoformat()}
+        self.book(10)
+        self.assertEqual(len(client_for().get(url, params).data["slots"]), 2)
+
+        self.book(12)
+        slots = client_for().get(url, params).data["slots"]
+        self.assertEqual(
+            [(slot["start"], slot["end"]) for slot in slots],
+            [(self.at(9), self.at(10)), (self.at(11), self.at(12))],
+        )
+
+    def test_working_hours_limit_bookings(self):
+        ProviderAvailability.objects.create(
+            provider=self.provider, weekday=self.day.weekday(), start_time=time(8), end_time=time(12)
+        )
+        with self.assertRaises(scheduling.ScheduleConflict):
+            scheduling.check_conflicts(self.provider.pk, self.at(11), self.at(13))
+        scheduling.check_conflicts(self.provider.pk, self.at(8), self.at(9))
+
+        free = scheduling.providers_free_at(self.at(8), self.at(9))
+        self.assertIn(self.provider, free)
+        self.assertNotIn(self.provider, scheduling.providers_free_at(self.at(13), self.at(14)))
+
+    def test_rescheduling_onto_a_booking_is_rejected_before_saving(self):
+        self.book(10)
+        other = self.book(14)
+        response = client_for(other.customer).patch(
+            f"/api/jobs/{other.pk}/", {"scheduled_for": self.at(10.5).isoformat()}, format="json"
+        )
+        self.assertEqual(response.status_code, 400)
+        other.refresh_from_db()
+        self.assertEqual(other.scheduled_for, self.at(14))
+
+        response = client_for(other.customer).patch(
+            f"/api/jobs/{other.pk}/", {"scheduled_for": self.at(14.5).isoformat()}, format="json"
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_finished_jobs_free_their_slot(self):
+        job = self.book(10, status="in_progress")
+        self.assertFalse(scheduling.schedules.index(self.provider.pk).is_free(self.at(10), self.at(11)))
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_job(job, "completed")
+        self.assertTrue(scheduling.schedules.index(self.provider.pk).is_free(self.at(10), self.at(11)))
+
+
+# ----------------------------
+# Location write buffer
+# ----------------------------
+class LocationBufferTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job()
+
+    def ping(self, lat=6.5):
+        return (self.job.pk, self.job.provider.user_id, lat, 3.4, timezone.now())
+
+    def test_batches_are_written_in_order(self):
+        buffer = LocationBuffer(batch_size=4)
+        buffer._pending.extend(self.ping(6.5 + i / 1000) for i in range(10))
+        buffer.flush_sync()
+        self.assertEqual((buffer.stats()["flushes"], buffer.stats()["flushed"]), (3, 10))
+        self.assertEqual(len(list(tracks.iter_points(self.job.pk))), 10)
+
+    def test_bad_ping_is_dropped_and_the_rest_written(self):
+        buffer = LocationBuffer(batch_size=100)
+        buffer._pending.extend([self.ping()] * 10 + [self.ping(lat="not a number")] + [self.ping()] * 9)
+        with self.assertLogs("platform_api.location_buffer", "WARNING"):
+            buffer.flush_sync()
+        stats = buffer.stats()
+        self.assertEqual((stats["pending"], stats["flushed"], stats["rejected"]), (0, 19, 1))
+        self.assertEqual(JobLocationLog.objects.count(), 19)
+
+    def test_connection_failure_keeps_the_batch(self):
+        buffer = LocationBuffer(batch_size=100)
+        buffer._pending.extend([self.ping()] * 5)
+        with mock.patch("platform_api.location_buffer.write_pings", side_effect=OperationalError), \
+                self.assertLogs("platform_api.location_buffer", "ERROR"):
+            buffer.flush_sync()
+        stats = buffer.stats()
+        self.assertEqual((stats["pending"], stats["failed_flushes"], stats["rejected"]), (5, 1, 0))
+
+        buffer.flush_sync()
+        self.assertEqual(JobLocationLog.objects.count(), 5)
+
+    async def test_oldest_pings_are_dropped_when_full(self):
+        buffer = LocationBuffer(batch_size=100, max_pending=3)
+        for i in range(5):
+            buffer.add(*self.ping(6.5 + i))
+        buffer._timer.cancel()
+        self.assertEqual(buffer.stats()["dropped"], 2)
+        self.assertEqual([lat for _, _, lat, _, _ in buffer._pending], [8.5, 9.5, 10.5])
+
+
+# ----------------------------
+# Chat history
+# ----------------------------
+class MessageHistoryPaginationTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job()
+        self.room = ChatRoom.objects.create(job=self.job)
+        sender = self.job.provider.user
+        self.messages = Message.objects.bulk_create(
+            [Message(room=self.room, sender=sender, text=f"m{i}") for i in range(25)]
+        )
+        # Ties on created_at must still page without gaps or repeats.
+        Message.objects.filter(room=self.room).update(created_at=timezone.now())
+        self.client = client_for(self.job.customer)
+        self.url = f"/api/chat/rooms/{self.job.pk}/messages/"
+
+    def test_pages_back_through_the_whole_history(self):
+        response = self.client.get(self.url, {"page_size": 10})
+        self.assertEqual([m["text"] for m in response.data["results"]], [f"m{i}" for i in range(15, 25)])
+        seen = [m["id"] for m in response.data["results"]]
+        before = response.data["before"]
+        while before:
+            response = self.client.get(self.url, {"page_size": 10, "before": before})
+            seen = [m["id"] for m in response.data["results"]] + seen
+            before = response.data["before"]
+        self.assertEqual(seen, [message.id for message in self.messages])
+
+    def test_after_returns_only_newer_messages(self):
+        after = self.client.get(self.url).data["after"]
+        Message.objects.create(room=self.room, sender=self.job.customer, text="new")
+        response = self.client.get(self.url, {"after": after})
+        self.assertEqual([m["text"] for m in response.data["results"]], ["new"])
+        self.assertFalse(response.data["has_newer"])
+
+        again = self.client.get(self.url, {"after": response.data["after"]})
+        self.assertEqual(again.data["results"], [])
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {"before": "nonsense"}).status_code, 400)
+
+    def test_reading_never_creates_a_room(self):
+        other_job = make_job(customer=self.job.customer)
+        response = self.client.get(f"/api/chat/rooms/{other_job.pk}/messages/")
+        self.assertEqual(response.data["results"], [])
+        self.assertFalse(ChatRoom.objects.filter(job=other_job).exists())
+
+    def test_outsiders_cannot_read(self):
+        self.assertEqual(client_for(make_user()).get(self.url).status_code, 404)
+
+
+class ChatInboxTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_user()
+        self.rooms = [ChatRoom.objects.create(job=make_job(customer=self.customer)) for _ in range(3)]
+        ChatRoom.objects.create(job=make_job())  # someone else's
+        self.client = client_for(self.customer)
+
+    def say(self, room, sender, text):
+        return Message.objects.create(room=room, sender=sender, text=text)
+
+    def inbox(self, **params):
+        response = self.client.get("/api/chat/rooms/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_rooms_by_recency_with_last_message_and_unread_count(self):
+        first, second, third = self.rooms
+        provider = second.job.provider.user
+        self.say(second, provider, "hello")
+        self.say(second, provider, "are you there?")
+        self.say(first, self.customer, "ping")
+        self.say(second, self.customer, "yes")
+
+        rows = self.inbox()["results"]
+        self.assertEqual([row["id"] for row in rows], [second.id, first.id, third.id])
+        self.assertEqual((rows[0]["last_message"]["text"], rows[0]["unread_count"]), ("yes", 2))
+        self.assertEqual(rows[1]["unread_count"], 0)  # own messages are never unread
+        self.assertEqual((rows[2]["last_message"], rows[2]["unread_count"]), (None, 0))
+
+        Message.objects.filter(room=second).update(read=True)
+        self.assertEqual(self.inbox()["results"][0]["unread_count"], 0)
+
+    def test_pages_do_not_embed_history(self):
+        for room in self.rooms:
+            for i in range(5):
+                self.say(room, room.job.provider.user, f"m{i}")
+        with self.assertNumQueries(1):
+            page = self.inbox(page_size=2)
+        self.assertEqual(len(page["results"]), 2)
+        rest = self.client.get(page["next"]).data["results"]
+        self.assertEqual(
+            [row["id"] for row in page["results"] + rest], [room.id for room in reversed(self.rooms)]
+        )
+
+
+class ChatSocketTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job()
+        self.customer, self.provider = self.job.customer, self.job.provider.user
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), f"/ws/chat/{self.job.pk}/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        return communicator if connected else None
+
+    async def test_messages_are_stored_acked_and_fanned_out(self):
+        customer, provider = await self.connect(self.customer), await self.connect(self.provider)
+        await customer.send_json_to({"action": "send", "text": "On my way?", "client_id": "c1"})
+        ack = await customer.receive_json_from()
+        self.assertEqual((ack["type"], ack["client_id"], ack["message"]["text"]), ("ack", "c1", "On my way?"))
+        self.assertEqual(await customer.receive_json_from(), {"type": "message", "message": ack["message"]})
+        self.assertEqual(await provider.receive_json_from(), {"type": "message", "message": ack["message"]})
+        self.assertTrue(await Message.objects.filter(pk=ack["message"]["id"], room__job=self.job).aexists())
+
+        await provider.send_json_to({"action": "read", "up_to": ack["message"]["id"]})
+        read = {"type": "read", "user_id": self.provider.id, "up_to": ack["message"]["id"]}
+        self.assertEqual(await customer.receive_json_from(), read)
+        self.assertEqual(await provider.receive_json_from(), read)
+        self.assertTrue(await Message.objects.filter(pk=ack["message"]["id"], read=True).aexists())
+        await customer.disconnect()
+        await provider.disconnect()
+
+    async def test_typing_is_not_echoed(self):
+        customer, provider = await self.connect(self.customer), await self.connect(self.provider)
+        await customer.send_json_to({"action": "typing", "typing": True})
+        self.assertEqual(
+            await provider.receive_json_from(), {"type": "typing", "user_id": self.customer.id, "typing": True}
+        )
+        self.assertTrue(await customer.receive_nothing())
+        await customer.send_json_to({"action": "send", "text": "  "})
+        self.assertEqual((await customer.receive_json_from())["type"], "error")
+        await customer.disconnect()
+        await provider.disconnect()
+
+    async def test_outsiders_are_refused(self):
+        self.assertIsNone(await self.connect(await database_sync_to_async(make_user)()))
+        self.assertIsNone(await self.connect(AnonymousUser()))
+
+
+# ----------------------------
+# Location updates over HTTP
+# ----------------------------
+class JobLocationUpdateTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job(site_latitude=6.5, site_longitude=3.4)
+        self.url = f"/api/jobs/{self.job.pk}/update-location/"
+        # Right on the site: a ping here would move the job to in_progress.
+        self.ping = {"lat": 6.5, "lng": 3.4}
+
+    def assertNothingHappened(self):
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "accepted")
+        self.assertEqual(JobLocationLog.objects.count(), 0)
+        self.assertIsNone(cache.get(f"job-position:{self.job.pk}"))
+
+    def test_only_the_jobs_provider_may_post(self):
+        for client, status in (
+            (client_for(), 401),
+            (client_for(self.job.customer), 403),
+            (client_for(make_provider().user), 404),
+        ):
+            self.assertEqual(client.post(self.url, self.ping).status_code, status)
+            self.assertEqual(client.post(self.url, dict(self.ping, status="closed")).status_code, status)
+        self.assertNothingHappened()
+
+    def test_provider_ping_is_stored_and_broadcast(self):
+        response = client_for(self.job.provider.user).post(self.url, self.ping)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.data["broadcast"])
+        self.assertEqual([event["event"] for event in response.data["events"]], ["approaching", "arrived"])
+        log = JobLocationLog.objects.get()
+        self.assertEqual((log.provider_id, log.lat, log.lng), (self.job.provider.user_id, 6.5, 3.4))
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "in_progress")
+
+    def test_invalid_coordinates_and_transitions(self):
+        client = client_for(self.job.provider.user)
+        self.assertEqual(client.post(self.url, {"lat": 900, "lng": 3.4}).status_code, 400)
+        self.assertEqual(client.post(self.url, dict(self.ping, status="completed")).status_code, 400)
+        self.assertNothingHappened()
+
+
+class CoalescingTests(CacheTestCase):
+    def test_http_gate_drops_insignificant_and_throttled_updates(self):
+        self.assertTrue(should_broadcast(1, 6.5, 3.4, "accepted"))
+        # Same place, and a big move inside the interval: both dropped.
+        self.assertFalse(should_broadcast(1, 6.5, 3.4, "accepted"))
+        self.assertFalse(should_broadcast(1, 6.6, 3.4, "accepted"))
+        # A status change always goes out.
+        self.assertTrue(should_broadcast(1, 6.6, 3.4, "in_progress"))
+
+    @override_settings(LOCATION_BROADCAST_INTERVAL=0.05)
+    async def test_socket_coalescer_sends_only_the_latest_position(self):
+        coalescer = LocationCoalescer()
+        sent = []
+
+        async def send(lat, lng, status):
+            sent.append((lat, lng, status))
+
+        for lat in (6.5, 6.6, 6.7, 6.8):
+            coalescer.offer(1, lat, 3.4, "in_progress", send)
+        await asyncio.sleep(0)
+        self.assertEqual(sent, [(6.5, 3.4, "in_progress")])
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(sent, [(6.5, 3.4, "in_progress"), (6.8, 3.4, "in_progress")])
+
+        coalescer.offer(1, 6.8, 3.4, "in_progress", send)  # didn't move
+        await asyncio.sleep(0.1)
+        self.assertEqual(len(sent), 2)
+
+
+
+class FrameCodecTests(TestCase):
+    def test_key_then_delta_frames_round_trip(self):
+        encoder, decoder = FrameEncoder(), FrameDecoder()
+        frames = [encoder.encode(lat, 3.4, "in_progress") for lat in (6.5, 6.5001, 6.5002)]
+        self.assertEqual([len(frame) for frame in frames], [10, 6, 6])
+        self.assertEqual(
+            [decoder.decode(frame) for frame in frames],
+            [(6.5, 3.4, "in_progress"), (6.5001, 3.4, "in_progress"), (6.5002, 3.4, "in_progress")],
+        )
+        self.assertEqual(decoder.decode(encoder.encode(None, None, "completed")), (None, None, "completed"))
+
+    def test_delta_without_key_frame_is_rejected(self):
+        encoder = FrameEncoder()
+        encoder.encode(6.5, 3.4, None)
+        with self.assertRaises(ValueError):
+            FrameDecoder().decode(encoder.encode(6.5001, 3.4, None))
+
+class JobSocketTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job(status="accepted")
+        buffered = mock.patch("platform_api.consumers.location_buffer")
+        self.location_buffer = buffered.start()
+        self.addCleanup(buffered.stop)
+
+    async def connect(self, user, subprotocols=None):
+        communicator = WebsocketCommunicator(
+            URLRouter(websocket_urlpatterns), f"/ws/job/{self.job.pk}/", subprotocols=subprotocols,
+        )
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        # The last known position (none yet) comes first.
+        if subprotocols:
+            self.assertEqual(FrameDecoder().decode(await communicator.receive_from())[:2], (None, None))
+        else:
+            self.assertEqual((await communicator.receive_json_from())["lat"], None)
+        return communicator
+
+    async def test_frames_carry_the_jobs_status_not_the_clients(self):
+        provider = await self.connect(self.job.provider.user)
+        await provider.send_json_to({"lat": 6.5, "lng": 3.4, "status": "completed"})
+        self.assertEqual(await provider.receive_json_from(), {"lat": 6.5, "lng": 3.4, "status": "accepted"})
+        self.assertEqual((await database_sync_to_async(last_position)(self.job.pk))["status"], "accepted")
+        self.location_buffer.add.assert_called_once()
+        await provider.disconnect()
+
+    async def test_only_the_provider_can_send_positions(self):
+        customer = await self.connect(self.job.customer)
+        await customer.send_json_to({"lat": 6.5, "lng": 3.4})
+        self.assertTrue(await customer.receive_nothing())
+        self.location_buffer.add.assert_not_called()
+        await customer.disconnect()
+
+    async def test_binary_frames_are_range_checked(self):
+        provider = await self.connect(self.job.provider.user, [SUBPROTOCOL])
+        encoder = FrameEncoder()
+        await provider.send_to(bytes_data=encoder.encode(900, 900, None))
+        await provider.send_to(bytes_data=b"\x07junk")
+        self.assertTrue(await provider.receive_nothing())
+        self.location_buffer.add.assert_not_called()
+
+        await provider.send_to(bytes_data=FrameEncoder().encode(6.5, 3.4, None))
+        self.assertEqual(FrameDecoder().decode(await provider.receive_from()), (6.5, 3.4, "accepted"))
+        self.location_buffer.add.assert_called_once()
+        await provider.disconnect()
+
+    def test_cached_status_follows_transitions(self):
+        record_position(self.job.pk, 6.5, 3.4)
+        self.assertEqual(last_position(self.job.pk)["status"], "accepted")
+        with self.captureOnCommitCallbacks(execute=True):
+            transition_job(self.job, "in_progress")
+        record_position(self.job.pk, 6.6, 3.4)
+        self.assertEqual(last_position(self.job.pk)["status"], "in_progress")
+
+
+class JobsSocketTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.customer = make_user()
+        self.tracked, self.quiet = make_job(customer=self.customer), make_job(customer=self.customer)
+        self.foreign = make_job()
+        record_position(self.tracked.pk, 6.5, 3.4)
+
+    async def connect(self, user):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/jobs/")
+        communicator.scope["user"] = user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_subscribe_authorizes_each_job_and_sends_snapshots(self):
+        socket = await self.connect(self.customer)
+        await socket.send_json_to(
+            {"action": "subscribe", "job_ids": [self.tracked.pk, self.quiet.pk, self.foreign.pk]}
+        )
+        self.assertEqual(await socket.receive_json_from(), {
+            "type": "subscribed",
+            "job_ids": [self.tracked.pk, self.quiet.pk],
+            "denied": [self.foreign.pk],
+        })
+        snapshot = await socket.receive_json_from()
+        self.assertEqual(
+            (snapshot["type"], snapshot["job_id"], snapshot["lat"], snapshot["status"]),
+            ("position", self.tracked.pk, 6.5, "accepted"),
+        )
+        await socket.disconnect()
+
+    async def test_updates_stop_after_unsubscribing(self):
+        socket = await self.connect(self.customer)
+        await socket.send_json_to({"action": "subscribe", "job_ids": [self.quiet.pk]})
+        await socket.receive_json_from()
+        await socket.receive_json_from()  # its last position, still empty
+
+        update = {
+            "type": "job_update",
+            "job_id": self.quiet.pk,
+            "data": {"lat": 1.0, "lng": 2.0, "status": "accepted"},
+        }
+        await get_channel_layer().group_send(f"job_{self.quiet.pk}", update)
+        self.assertEqual(
+            await socket.receive_json_from(),
+            {"type": "position", "job_id": self.quiet.pk, "lat": 1.0, "lng": 2.0, "status": "accepted"},
+        )
+
+        await socket.send_json_to({"action": "unsubscribe", "job_ids": [self.quiet.pk]})
+        self.assertEqual(await socket.receive_json_from(), {"type": "unsubscribed", "job_ids": [self.quiet.pk]})
+        await get_channel_layer().group_send(f"job_{self.quiet.pk}", update)
+        self.assertTrue(await socket.receive_nothing())
+        await socket.disconnect()
+
+    @override_settings(JOBS_SOCKET_MAX_SUBSCRIPTIONS=1)
+    async def test_subscription_limit_and_bad_messages(self):
+        socket = await self.connect(self.customer)
+        await socket.send_json_to({"action": "subscribe", "job_ids": [self.tracked.pk, self.quiet.pk]})
+        self.assertEqual((await socket.receive_json_from())["denied"], [self.quiet.pk])
+        await socket.receive_json_from()
+        await socket.send_to(text_data="not json")
+        self.assertEqual((await socket.receive_json_from())["type"], "error")
+        await socket.disconnect()
+
+    async def test_anonymous_users_are_refused(self):
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), "/ws/jobs/")
+        communicator.scope["user"] = AnonymousUser()
+        connected, _ = await communicator.connect()
+        self.assertFalse(connected)
+
+
+# ----------------------------
+# Ops map
+# ----------------------------
+class OpsMapTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.lagos, self.abuja = make_job(status="in_progress"), make_job()
+        record_position(self.lagos.pk, 6.5, 3.4)
+        # Not cached: read back from the ping log.
+        JobLocationLog.objects.create(job=self.abuja, provider=self.abuja.provider.user, lat=9.05, lng=7.5)
+        finished = make_job(status="completed")
+        record_position(finished.pk, 6.5, 3.4)
+        self.client = client_for(make_user(is_staff=True))
+
+    def snapshot(self, **params):
+        response = self.client.get("/api/ops/map/", params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_active_jobs_only_and_bbox(self):
+        data = self.snapshot()
+        self.assertEqual((data["full"], data["active"]), (True, [self.lagos.pk, self.abuja.pk]))
+        self.assertEqual(
+            [(job["job_id"], job["lat"]) for job in data["jobs"]], [(self.lagos.pk, 6.5), (self.abuja.pk, 9.05)]
+        )
+        self.assertEqual(self.snapshot(bbox="3,6,4,7")["active"], [self.lagos.pk])
+
+    def test_since_returns_only_changes(self):
+        version = self.snapshot()["version"]
+        data = self.snapshot(since=version)
+        self.assertEqual(
+            (data["full"], data["active"], data["jobs"]), (False, [self.lagos.pk, self.abuja.pk], [])
+        )
+
+        record_position(self.abuja.pk, 9.06, 7.5)
+        data = self.snapshot(since=version)
+        self.assertEqual([(job["job_id"], job["lat"]) for job in data["jobs"]], [(self.abuja.pk, 9.06)])
+        self.assertGreater(data["version"], version)
+        # A version from before a cache reset gets a full snapshot.
+        self.assertTrue(self.snapshot(since=data["version"] + 100)["full"])
+
+    def test_staff_only_and_invalid_parameters(self):
+        self.assertEqual(client_for(make_user()).get("/api/ops/map/").status_code, 403)
+        for params in ({"bbox": "1,2,3"}, {"bbox": "4,6,3,7"}, {"since": "x"}):
+            self.assertEqual(self.client.get("/api/ops/map/", params).status_code, 400, params)
+
+
+# ----------------------------
+# ETA and arrival
+# ----------------------------
+@override_settings(ETA_APPROACH_RADIUS_M=500, ETA_ARRIVAL_RADIUS_M=75, ETA_BROADCAST_INTERVAL=10)
+class EtaTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job(site_latitude=6.5, site_longitude=3.4)
+
+    def ping(self, metres_north, at):
+        # 1e-3 degrees of latitude is ~111 m.
+        return eta.update(self.job.pk, 6.5 + metres_north / 111195, 3.4, now=at)
+
+    def test_smoothed_eta_then_approach_and_arrival(self):
+        first = self.ping(2000, at=1000)
+        self.assertEqual(first, [{"event": "eta", "distance_m": 2000, "speed_mps": None, "eta_seconds": None}])
+        self.assertEqual(self.ping(1900, at=1010), [
+            {"event": "eta", "distance_m": 1900, "speed_mps": 10.0, "eta_seconds": 190},
+        ])
+        self.assertEqual(self.ping(1850, at=1015), [])  # inside the broadcast interval
+        self.assertEqual(
+            [event["event"] for event in self.ping(450, at=1155)], ["eta", "approaching"]
+        )
+        self.assertEqual(self.ping(50, at=1195), [{"event": "arrived", "distance_m": 50}])
+        self.assertEqual(self.ping(40, at=1300), [])
+
+    def test_gps_jumps_do_not_move_the_speed(self):
+        self.ping(2000, at=1000)
+        self.ping(1900, at=1010)
+        self.assertEqual(self.ping(-5000, at=1020)[0]["speed_mps"], 10.0)
+
+    def test_jumping_inside_the_site_announces_the_approach_too(self):
+        self.ping(2000, at=1000)
+        self.assertEqual(
+            [event["event"] for event in self.ping(10, at=1100)], ["approaching", "arrived"]
+        )
+
+    def test_arrival_starts_an_accepted_job(self):
+        eta.process_ping(self.job.pk, 6.6, 3.4)
+        with self.captureOnCommitCallbacks(execute=True):
+            events = eta.process_ping(self.job.pk, 6.5, 3.4)
+        self.assertIn({"event": "arrived", "distance_m": 0}, events)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "in_progress")
+
+    def test_jobs_without_a_site_get_no_events(self):
+        job = make_job()
+        self.assertEqual(eta.update(job.pk, 6.5, 3.4), [])
+
+
+# ----------------------------
+# Routes and track compaction
+# ----------------------------
+class RouteTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job(status="in_progress")
+        self.client = client_for(self.job.customer)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        self.sent = 0
+
+    def ping(self, lat, lng, at=None):
+        JobLocationLog.objects.create(
+            job=self.job, provider=self.job.provider.user, lat=lat, lng=lng,
+            timestamp=at or self.start + timedelta(seconds=self.sent),
+        )
+        self.sent += 1
+
+    def route(self):
+        response = self.client.get(f"/api/jobs/{self.job.pk}/route/")
+        self.assertEqual(response.status_code, 200)
+        return response.data["compacted"], [tuple(point[:2]) for point in response.data["points"]]
+
+    def test_douglas_peucker(self):
+        line = [(6.5, 3.4 + i * 1e-3) for i in range(10)]
+        self.assertEqual(tracks.douglas_peucker(line, 5), [line[0], line[-1]])
+        # A 1 m wobble is dropped, a 50 m detour and a turning point are kept.
+        wobble = line[:5] + [(6.5 + 1e-5, 3.405)] + line[6:]
+        self.assertEqual(tracks.douglas_peucker(wobble, 5), [line[0], line[-1]])
+        detour = line[:5] + [(6.5005, 3.405)] + line[6:]
+        self.assertEqual(
+            tracks.douglas_peucker(detour, 5), [line[0], line[4], detour[5], line[6], line[-1]]
+        )
+        there_and_back = line + line[-2::-1]
+        self.assertEqual(tracks.douglas_peucker(there_and_back, 5), [line[0], line[-1], line[0]])
+
+    def test_live_route_is_extended_from_the_cached_one(self):
+        for i in range(5):
+            self.ping(6.5, 3.4 + i * 1e-3)
+        self.assertEqual(self.route(), (False, [(6.5, 3.4), (6.5, 3.404)]))
+        for i in range(1, 5):
+            self.ping(6.5 + i * 1e-3, 3.404)
+        with self.assertNumQueries(4):  # job check, track, two ping readers
+            self.assertEqual(self.route(), (False, [(6.5, 3.4), (6.5, 3.404), (6.504, 3.404)]))
+
+    def test_compaction_stores_the_route_and_prunes_old_pings(self):
+        for i in range(5):
+            self.ping(6.5, 3.4 + i * 1e-3, at=timezone.now() - timedelta(days=40, seconds=-i))
+        live = make_job(status="in_progress", provider=self.job.provider)
+        JobLocationLog.objects.create(
+            job=live, provider=self.job.provider.user, lat=6.5, lng=3.4,
+            timestamp=timezone.now() - timedelta(days=40),
+        )
+        transition_job(self.job, "completed")
+
+        call_command("compact_job_tracks", "--retention-days=30", stdout=StringIO())
+        track = JobTrack.objects.get(job=self.job)
+        self.assertEqual((track.raw_point_count, track.raw_pruned), (5, True))
+        self.assertEqual(self.route(), (True, [(6.5, 3.4), (6.5, 3.404)]))
+        self.assertFalse(self.job.location_logs.exists())
+        # Unfinished jobs keep their pings whatever their age.
+        self.assertEqual(live.location_logs.count(), 1)
+
+    def test_outsiders_cannot_read_routes(self):
+        self.assertEqual(client_for(make_user()).get(f"/api/jobs/{self.job.pk}/route/").status_code, 404)
+
+
+class TrackReplayTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job(status="in_progress")
+        self.client = client_for(self.job.provider.user)
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+        JobLocationLog.objects.bulk_create(
+            JobLocationLog(
+                job=self.job, provider=self.job.provider.user,
+                lat=6.5 + i * 1e-4, lng=3.4, timestamp=self.start + timedelta(milliseconds=1500 * i),
+            )
+            for i in range(5)
+        )
+        self.url = f"/api/jobs/{self.job.pk}/track/"
+
+    def replay(self, **params):
+        response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Cache-Control"], "no-store")
+        return b"".join(response.streaming_content)
+
+    def test_ndjson_resumes_after_since(self):
+        lines = [json.loads(line) for line in self.replay().decode().splitlines()]
+        self.assertEqual(len(lines), 5)
+        start_ms = int(self.start.timestamp() * 1000)
+        self.assertEqual(lines[1], {"t": start_ms + 1500, "lat": 6.5001, "lng": 3.4})
+
+        resumed = [json.loads(line) for line in self.replay(since=lines[2]["t"]).decode().splitlines()]
+        self.assertEqual(resumed, lines[3:])
+        self.assertEqual(self.replay(since=lines[-1]["t"]), b"")
+
+    def test_binary_records(self):
+        body = self.replay(encoding="binary")
+        records = list(tracks.BINARY_RECORD.iter_unpack(body))
+        self.assertEqual(len(records), 5)
+        self.assertEqual(records[4][1:], (65004000, 34000000))
+
+    def test_invalid_parameters_and_outsiders(self):
+        for params in ({"encoding": "xml"}, {"since": "yesterday"}, {"since": -1}, {"since": 10 ** 20}):
+            self.assertEqual(self.client.get(self.url, params).status_code, 400, params)
+        self.assertEqual(client_for(make_user()).get(self.url).status_code, 404)
+
+
+# ----------------------------
+# Packed track segments
+# ----------------------------
+class TrackCodecTests(TestCase):
+    points = [
+        (1_700_000_000_000, 6.5244, 3.3792),
+        (1_700_000_001_500, 6.5243, 3.3795),
+        (1_700_000_001_500, 6.5243, 3.3795),  # repeated fix
+        (1_700_000_900_000, -33.8688, 151.2093),  # large jump, negative lat
+        (1_700_000_905_000, -33.8689, 151.2090),
+    ]
+
+    def test_round_trip(self):
+        base_ms = self.points[0][0]
+        decoded = list(decode_points(encode_points(self.points, base_ms), base_ms))
+        self.assertEqual(len(decoded), len(self.points))
+        for (ms, lat, lng), (expected_ms, expected_lat, expected_lng) in zip(decoded, self.points):
+            self.assertEqual(ms, expected_ms)
+            self.assertAlmostEqual(lat, expected_lat, delta=1 / SCALE)
+            self.assertAlmostEqual(lng, expected_lng, delta=1 / SCALE)
+
+    def test_nearby_pings_pack_small(self):
+        points = [(1_700_000_000_000 + i * 2000, 6.5 + i * 1e-5, 3.4 + i * 1e-5) for i in range(1000)]
+        self.assertLess(len(encode_points(points, points[0][0])) / len(points), 8)
+
+
+@override_settings(LOCATION_STORAGE="segments", TRACK_SEGMENT_MAX_POINTS=100)
+class TrackSegmentStorageTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job()
+        self.provider_id = self.job.provider.user_id
+        self.start = timezone.now().replace(microsecond=0) - timedelta(hours=1)
+
+    def flush(self, first, count=1):
+        write_pings([
+            (self.job.pk, self.provider_id, 6.5 + i * 1e-4, 3.4 - i * 1e-4, self.start + timedelta(seconds=i))
+            for i in range(first, first + count)
+        ])
+
+    def stream(self):
+        return [(ms, round(lat, 7), round(lng, 7)) for ms, lat, lng in tracks.iter_points(self.job.pk)]
+
+    def test_each_flush_inserts_one_immutable_chunk(self):
+        self.flush(0, 5)
+        chunk = JobTrackSegment.objects.get()
+        with self.assertNumQueries(1):
+            self.flush(5, 5)
+        self.assertEqual(JobTrackSegment.objects.count(), 2)
+        self.assertEqual(bytes(JobTrackSegment.objects.get(pk=chunk.pk).data), bytes(chunk.data))
+
+    def test_merging_repacks_chunks_into_full_segments(self):
+        for i in range(0, 250):
+            self.flush(i)
+        self.flush(250, 5)
+        self.flush(255, 3)
+        write_pings([(self.job.pk, self.provider_id, 6.4, 3.3, self.start - timedelta(seconds=1))])  # late ping
+        before = self.stream()
+        self.assertEqual(list(jobs_to_merge()), [self.job.pk])
+
+        merge_segments(self.job.pk)
+        self.assertEqual(
+            list(JobTrackSegment.objects.order_by("started_at").values_list("point_count", flat=True)),
+            [100, 100, 59],
+        )
+        self.assertEqual(self.stream(), before)
+        self.assertEqual(list(jobs_to_merge()), [])
+
+        # Full segments are never rewritten; the partial one takes new chunks.
+        full = set(JobTrackSegment.objects.filter(point_count=100).values_list("id", flat=True))
+        self.flush(300, 2)
+        merge_segments(self.job.pk)
+        self.assertTrue(full <= set(JobTrackSegment.objects.values_list("id", flat=True)))
+        self.assertEqual(len(self.stream()), 261)
+
+    def test_compaction_merges_live_and_finished_jobs(self):
+        for i in range(10):
+            self.flush(i)
+        finished = make_job(status="completed")
+        write_pings([(finished.pk, finished.provider.user_id, 6.5, 3.4, self.start + timedelta(seconds=i))
+                     for i in range(3)])
+        write_pings([(finished.pk, finished.provider.user_id, 6.5, 3.4, self.start + timedelta(seconds=5))])
+
+        call_command("compact_job_tracks", stdout=StringIO())
+        self.assertEqual(JobTrackSegment.objects.filter(job=self.job).count(), 1)
+        self.assertEqual(JobTrackSegment.objects.filter(job=finished).count(), 1)
+        self.assertEqual(JobTrack.objects.get(job=finished).raw_point_count, 4)
+        self.assertFalse(JobTrack.objects.filter(job=self.job).exists())
+
+    def test_last_position_without_decoding(self):
+        self.flush(0, 3)
+        self.flush(3, 4)
+        position = last_position(self.job.pk)
+        self.assertEqual((position["lat"], position["lng"]), (6.5006, 3.3994))
+        self.assertEqual(parse_datetime(position["timestamp"]), self.start + timedelta(seconds=6))
+
+
+# ----------------------------
+# Service filters and facets
+# ----------------------------
+class ServiceFacetTests(CacheTestCase):
+    url = "/api/provider-services/"
+
+    def setUp(self):
+        super().setUp()
+        self.plumbing = ServiceCategory.objects.create(name="Plumbing")
+        self.cleaning = ServiceCategory.objects.create(name="Cleaning")
+        self.provider = make_provider()
+        for title, category, price in (
+            ("Leak", self.plumbing, "3000"),
+            ("Boiler", self.plumbing, "60000"),
+            ("Sink", self.plumbing, "7500"),   # string prices are bucketed too
+            ("Flat", self.cleaning, "8000"),
+        ):
+            ProviderService.objects.create(provider=self.provider, category=category, title=title, price=price)
+
+    def facets(self, **params):
+        response = client_for().get(self.url, dict(params, facets="true"))
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_counts_are_maintained_on_save_and_delete(self):
+        data = self.facets(category=self.plumbing.pk)
+        self.assertEqual(data["count"], 3)
+        self.assertEqual(
+            [(c["name"], c["count"]) for c in data["facets"]["categories"]], [("Cleaning", 1), ("Plumbing", 3)]
+        )
+        self.assertEqual([b["count"] for b in data["facets"]["price_buckets"]], [1, 1, 0, 0, 1, 0])
+
+        sink = ProviderService.objects.get(title="Sink")
+        sink.price = Decimal("150000")
+        sink.save()
+        ProviderService.objects.get(title="Leak").delete()
+        data = self.facets(category=self.plumbing.pk)
+        self.assertEqual([b["count"] for b in data["facets"]["price_buckets"]], [0, 0, 0, 0, 1, 1])
+        self.assertEqual(
+            list(ServiceFacetCount.objects.filter(count__gt=0).values_list("category__name", "price_bucket", "count")
+                 .order_by("category__name", "price_bucket")),
+            [("Cleaning", 1, 1), ("Plumbing", 4, 1), ("Plumbing", 5, 1)],
+        )
+
+    def test_price_range_facets(self):
+        data = self.facets(min_price="5000", max_price="10000")
+        self.assertEqual(sorted(s["title"] for s in data["results"]), ["Flat", "Sink"])
+        self.assertEqual([c["count"] for c in data["facets"]["categories"]], [1, 1])
+
+    def test_invalid_filters(self):
+        for params in ({"min_price": "NaN"}, {"max_price": "Infinity"}, {"category": "x"}):
+            self.assertEqual(client_for().get(self.url, params).status_code, 400)
+
+    def test_etag_changes_when_another_categorys_facets_do(self):
+        client = client_for()
+        params = {"category": self.plumbing.pk, "facets": "true"}
+        etag = client.get(self.url, params)["ETag"]
+        self.assertEqual(client.get(self.url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ProviderService.objects.create(provider=self.provider, category=self.cleaning, title="Office", price="9000")
+        response = client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["facets"]["categories"][0], {"id": self.cleaning.pk, "name": "Cleaning", "count": 2})
+
+        # Without facets the other category doesn't matter.
+        etag = client.get(self.url, {"category": self.plumbing.pk})["ETag"]
+        ProviderService.objects.create(provider=self.provider, category=self.cleaning, title="House", price="9000")
+        self.assertEqual(
+            client.get(self.url, {"category": self.plumbing.pk}, HTTP_IF_NONE_MATCH=etag).status_code, 304
+        )
+
+
+# ----------------------------
+# Reviews and rating aggregates
+# ----------------------------
+class ReviewTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.provider = make_provider()
+
+    def finished_job(self, *statuses):
+        job = make_job(status="created", provider=self.provider)
+        for status in statuses:
+            transition_job(job, status)
+        return job
+
+    def review(self, job, rating, method="post"):
+        return getattr(client_for(job.customer), method)(
+            f"/api/jobs/{job.pk}/review/", {"rating": rating}, format="json"
+        )
+
+    def assertRating(self, count, total, rating):
+        self.provider.refresh_from_db()
+        self.assertEqual(
+            (self.provider.rating_count, self.provider.rating_sum, self.provider.rating),
+            (count, total, Decimal(rating)),
+        )
+
+    def test_aggregates_follow_creates_updates_and_deletes(self):
+        first = self.finished_job("accepted", "in_progress", "completed")
+        second = self.finished_job("accepted", "in_progress", "completed", "closed")
+        self.assertEqual(self.review(first, 5).status_code, 201)
+        self.assertEqual(self.review(second, 2).status_code, 201)
+        self.assertRating(2, 7, "3.50")
+
+        self.assertEqual(self.review(second, 4, method="put").status_code, 200)
+        self.assertRating(2, 9, "4.50")
+        self.assertEqual(self.review(second, 4).status_code, 400)  # already reviewed
+
+        Review.objects.get(job=first).delete()
+        self.assertRating(1, 4, "4.00")
+
+    def test_only_completed_jobs_can_be_reviewed(self):
+        # Closed before anyone was dispatched
+        unassigned = Job.objects.create(customer=make_user(), scheduled_for=timezone.now())
+        transition_job(unassigned, "closed")
+        for job in (
+            self.finished_job("accepted", "in_progress"),
+            self.finished_job("accepted", "closed"),  # cancelled
+            unassigned,
+        ):
+            self.assertEqual(self.review(job, 5).status_code, 400)
+        self.assertRating(0, 0, "0.00")
+
+    def test_only_the_customer_can_review(self):
+        job = self.finished_job("accepted", "in_progress", "completed")
+        response = client_for(make_user()).post(f"/api/jobs/{job.pk}/review/", {"rating": 5}, format="json")
+        self.assertEqual(response.status_code, 403)
+
+    def test_recompute_repairs_drift(self):
+        self.review(self.finished_job("accepted", "in_progress", "completed"), 3)
+        ProviderProfile.objects.filter(pk=self.provider.pk).update(rating_count=9, rating_sum=1, rating=0)
+        call_command("recompute_ratings", stdout=StringIO())
+        self.assertRating(1, 3, "3.00")
+
+
+# ----------------------------
+# Job status transitions
+# ----------------------------
+class JobTransitionTests(CacheTestCase):
+    def setUp(self):
+        super().setUp()
+        self.job = make_job(status="created")
+        self.url = f"/api/jobs/{self.job.pk}/"
+
+    def patch(self, user, data):
+        return client_for(user).patch(self.url, data, format="json")
+
+    def test_transitions_are_validated_and_logged(self):
+        customer = self.job.customer
+        self.assertEqual(self.patch(customer, {"status": "completed"}).status_code, 400)
+        self.assertEqual(self.patch(customer, {"status": "nonsense"}).status_code, 400)
+        for status in ("accepted", "in_progress", "completed"):
+            self.assertEqual(self.patch(self.job.provider.user, {"status": status}).status_code, 200)
+        self.assertEqual(self.patch(customer, {"status": "accepted"}).status_code, 400)
+
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "completed")
+        timeline = client_for(customer).get(f"/api/jobs/{self.job.pk}/timeline/", {"page_size": 2})
+        self.assertEqual([entry["status"] for entry in timeline.data["results"]], ["completed", "in_progress"])
+        older = client_for(customer).get(timeline.data["next"])
+        self.assertEqual([entry["status"] for entry in older.data["results"]], ["accepted"])
+
+    def test_same_status_is_a_no_op(self):
+        self.assertEqual(self.patch(self.job.customer, {"status": "created"}).status_code, 200)
+        self.assertFalse(JobStatusLog.objects.filter(job=self.job).exists())
+
+    def test_only_participants_can_read_or_change_a_job(self):
+        outsider = make_user()
+        self.assertEqual(client_for(outsider).get(self.url).status_code, 404)
+        self.assertEqual(self.patch(outsider, {"status": "closed"}).status_code, 404)
+        self.assertEqual(
+            self.patch(outsider, {"scheduled_for": timezone.now().isoformat()}).status_code, 404
+        )
+        self.assertEqual(client_for(outsider).get(f"/api/jobs/{self.job.pk}/timeline/").status_code, 404)
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.status, "created")
+
+        staff = make_user(is_staff=True)
+        self.assertEqual(client_for(staff).get(self.url).status_code, 200)
+        self.assertEqual(client_for(self.job.provider.user).get(self.url).status_code, 200)
@@ -0,0 +1,205 @@
+import heapq
+from datetime import datetime, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count
+
+from .models import JobLocationLog, JobTrackSegment
+
+# Coordinates are stored as integers in units of 1e-7 degrees (~1 cm).
+SCALE = 10_000_000
+
+
+def max_segment_points():
+    return getattr(settings, "TRACK_SEGMENT_MAX_POINTS", 3600)
+
+
+def storage_mode():
+    """
+    "rows" (one JobLocationLog per ping) or "segments" (packed
+    JobTrackSegment blobs, roughly 6 bytes per ping once merged).
+    """
+    return getattr(settings, "LOCATION_STORAGE", "rows")
+
+
+def _epoch_ms(value):
+    return int(value.timestamp() * 1000)
+
+
+def _from_epoch_ms(value):
+    return datetime.fromtimestamp(value / 1000, dt_timezone.utc)
+
+
+# ----------------------------
+# Codec
+# ----------------------------
+# A segment is a run of (dt_ms, dlat, dlng) triples, each a zigzag varint,
+# with deltas taken against the previous point (the first point against
+# (started_at, 0, 0)). Pings a few seconds and a few metres apart take
+# 2 bytes per field.
+def _write_varint(out, value):
+    value = value * 2 if value >= 0 else -value * 2 - 1
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_points(points, base_ms):
+    """
+    Pack [(epoch_ms, lat, lng), ...] (in time order) into bytes.
+    """
+    out = bytearray()
+    previous_ms, previous_lat, previous_lng = base_ms, 0, 0
+    for epoch_ms, lat, lng in points:
+        lat, lng = round(lat * SCALE), round(lng * SCALE)
+        _write_varint(out, epoch_ms - previous_ms)
+        _write_varint(out, lat - previous_lat)
+        _write_varint(out, lng - previous_lng)
+        previous_ms, previous_lat, previous_lng = epoch_ms, lat, lng
+    return bytes(out)
+
+
+def decode_points(data, base_ms):
+    """
+    Lazily yield (epoch_ms, lat, lng) from a packed segment.
+    """
+    values = [base_ms, 0, 0]
+    field = shift = accumulator = 0
+    for byte in data:
+        accumulator |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        values[field] += (accumulator >> 1) ^ -(accumulator & 1)
+        accumulator = shift = 0
+        field += 1
+        if field == 3:
+            field = 0
+            yield values[0], values[1] / SCALE, values[2] / SCALE
+
+
+# ----------------------------
+# Writing
+# ----------------------------
+def write_pings(pings):
+    """
+    Persist buffered pings, [(job_id, provider_id, lat, lng, timestamp), ...],
+    in the configured storage mode. Segments mode inserts one small chunk
+    per job and provider for the batch; rows are never updated, so a flush
+    costs one INSERT however long the track already is. merge_segments()
+    repacks the chunks later.
+    """
+    if storage_mode() != "segments":
+        JobLocationLog.objects.bulk_create([
+            JobLocationLog(job_id=job_id, provider_id=provider_id, lat=lat, lng=lng, timestamp=timestamp)
+            for job_id, provider_id, lat, lng, timestamp in pings
+        ])
+        return
+
+    runs = {}
+    for job_id, provider_id, lat, lng, timestamp in pings:
+        runs.setdefault((job_id, provider_id), []).append((_epoch_ms(timestamp), lat, lng))
+    JobTrackSegment.objects.bulk_create([
+        build_segment(job_id, provider_id, points)
+        for (job_id, provider_id), points in runs.items()
+    ])
+
+
+def build_segment(job_id, provider_id, points):
+    points = sorted(points)
+    base_ms = points[0][0]
+    return JobTrackSegment(
+        job_id=job_id,
+        provider_id=provider_id,
+        started_at=_from_epoch_ms(base_ms),
+        ended_at=_from_epoch_ms(points[-1][0]),
+        point_count=len(points),
+        last_lat=round(points[-1][1] * SCALE),
+        last_lng=round(points[-1][2] * SCALE),
+        data=encode_points(points, base_ms),
+    )
+
+
+def jobs_to_merge():
+    """
+    Ids of jobs with more than one segment short of TRACK_SEGMENT_MAX_POINTS
+    (live or finished), i.e. whose chunks merge_segments() would repack.
+    """
+    return (
+        JobTrackSegment.objects.filter(point_count__lt=max_segment_points())
+        .values("job_id")
+        .annotate(chunks=Count("id"))
+        .filter(chunks__gt=1)
+        .order_by("job_id")
+        .values_list("job_id", flat=True)
+    )
+
+
+def merge_segments(job_id):
+    """
+    Repack a job's chunks (segments short of TRACK_SEGMENT_MAX_POINTS) into
+    full segments per provider, so a long track is read as a few large
+    blobs. Full segments are never rewritten; only the last, partial one
+    of each run is merged again on the next pass. Chunks inserted while
+    this runs are left for the next pass.
+    """
+    limit = max_segment_points()
+    with transaction.atomic():
+        segments = list(
+            JobTrackSegment.objects.select_for_update()
+            .filter(job_id=job_id, point_count__lt=limit)
+            .order_by("started_at", "id")
+        )
+        if len(segments) < 2:
+            return
+        runs = {}
+        for segment in segments:
+            runs.setdefault(segment.provider_id, []).append(
+                decode_points(bytes(segment.data), _epoch_ms(segment.started_at))
+            )
+        JobTrackSegment.objects.filter(pk__in=[segment.pk for segment in segments]).delete()
+        merged = []
+        for provider_id, decoders in runs.items():
+            points = list(heapq.merge(*decoders))
+            merged.extend(
+                build_segment(job_id, provider_id, points[start:start + limit])
+                for start in range(0, len(points), limit)
+            )
+        JobTrackSegment.objects.bulk_create(merged)
+
+
+# ----------------------------
+# Reading
+# ----------------------------
+def iter_segment_points(job_id, since_ms=None):
+    """
+    Yield (epoch_ms, lat, lng) of a job's packed pings in time order.
+    Segments arrive in start order and are merged, each opened only when
+    the merge reaches its start, so only segments overlapping in time
+    (normally one per provider) are held and decoded at once.
+    """
+    segments = JobTrackSegment.objects.filter(job_id=job_id)
+    if since_ms is not None:
+        segments = segments.filter(ended_at__gt=_from_epoch_ms(since_ms))
+    rows = segments.order_by("started_at", "id").values_list("started_at", "data").iterator(chunk_size=100)
+    upcoming = next(rows, None)
+    heap = []  # (point, tie-breaker, decoder)
+    opened = 0
+    while heap or upcoming is not None:
+        while upcoming is not None and (not heap or _epoch_ms(upcoming[0]) <= heap[0][0][0]):
+            decoder = decode_points(bytes(upcoming[1]), _epoch_ms(upcoming[0]))
+            first = next(decoder, None)
+            if first is not None:
+                heapq.heappush(heap, (first, opened, decoder))
+                opened += 1
+            upcoming = next(rows, None)
+        point, order, decoder = heap[0]
+        following = next(decoder, None)
+        if following is None:
+            heapq.heappop(heap)
+        else:
+            heapq.heapreplace(heap, (following, order, decoder))
+        if since_ms is None or point[0] > since_ms:
+            yield point
@@ -0,0 +1,227 @@
+import heapq
+import json
+import math
+import struct
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import Job, JobLocationLog, JobTrack, JobTrackSegment
+from .track_storage import iter_segment_points
+
+FINISHED_JOB_STATUSES = ("completed", "closed")
+ROUTE_CACHE_TTL = 60 * 60
+EARTH_RADIUS_M = 6371000
+
+
+def default_tolerance_m():
+    return getattr(settings, "TRACK_TOLERANCE_M", 5)
+
+
+def default_retention_days():
+    return getattr(settings, "TRACK_RAW_RETENTION_DAYS", 30)
+
+
+# ----------------------------
+# Simplification
+# ----------------------------
+def douglas_peucker(points, tolerance_m):
+    """
+    Simplify [(lat, lng, ...), ...] keeping every point that lies more than
+    tolerance_m from the segment between its kept neighbours. Coordinates
+    are projected to metres around the first point, which is accurate to
+    well under a metre over city-sized tracks. Iterative, so long tracks
+    cannot hit the recursion limit.
+    """
+    if len(points) < 3:
+        return list(points)
+    metres_per_degree = math.radians(1) * EARTH_RADIUS_M
+    x_scale = metres_per_degree * math.cos(math.radians(points[0][0]))
+    xy = [(point[1] * x_scale, point[0] * metres_per_degree) for point in points]
+
+    keep = [False] * len(points)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        first, last = stack.pop()
+        (ax, ay), (bx, by) = xy[first], xy[last]
+        dx, dy = bx - ax, by - ay
+        length_sq = dx * dx + dy * dy
+        farthest, farthest_index = tolerance_m, None
+        for i in range(first + 1, last):
+            px, py = xy[i]
+            # Distance to the segment (not the infinite line), so a track
+            # that doubles back on itself keeps its turning point.
+            t = 0 if not length_sq else max(0, min(1, ((px - ax) * dx + (py - ay) * dy) / length_sq))
+            distance = math.hypot(px - ax - t * dx, py - ay - t * dy)
+            if distance > farthest:
+                farthest, farthest_index = distance, i
+        if farthest_index is not None:
+            keep[farthest_index] = True
+            stack.append((first, farthest_index))
+            stack.append((farthest_index, last))
+    return [point for point, kept in zip(points, keep) if kept]
+
+
+def raw_points(job_id):
+    """
+    [(lat, lng, unix_timestamp), ...] of a job's full-resolution pings.
+    """
+    return [(lat, lng, epoch_ms // 1000) for epoch_ms, lat, lng in iter_points(job_id)]
+
+
+def _route_key(job_id, tolerance_m):
+    return f"job-route:{job_id}:{tolerance_m}"
+
+
+def route_points(job_id):
+    """
+    Simplified route of a job: the stored track once the job has been
+    compacted, otherwise the cached live route extended by the pings that
+    arrived since the last request. Each extension is simplified from the
+    route's last point (always the newest ping), so a request costs
+    O(new pings) rather than O(all pings).
+    """
+    track = JobTrack.objects.filter(job_id=job_id).values_list("points", flat=True).first()
+    if track is not None:
+        return track, True
+
+    tolerance_m = default_tolerance_m()
+    key = _route_key(job_id, tolerance_m)
+    route = cache.get(key) or {"points": [], "until_ms": None}
+    new = list(iter_points(job_id, since_ms=route["until_ms"]))
+    if new:
+        anchor = route["points"][-1:]
+        extension = douglas_peucker(
+            anchor + [[lat, lng, epoch_ms // 1000] for epoch_ms, lat, lng in new], tolerance_m
+        )
+        route = {
+            "points": route["points"] + [list(point) for point in extension[len(anchor):]],
+            "until_ms": new[-1][0],
+        }
+        cache.set(key, route, ROUTE_CACHE_TTL)
+    return route["points"], False
+
+
+# ----------------------------
+# Streaming replay
+# ----------------------------
+# Binary replay record: epoch milliseconds, lat * 1e7, lng * 1e7.
+BINARY_RECORD = struct.Struct("<qii")
+STREAM_CHUNK_SIZE = 2000
+# Largest `since` a datetime can represent (9999-12-31T23:59:59Z).
+MAX_SINCE_MS = 253402300799000
+
+
+def iter_points(job_id, since_ms=None):
+    """
+    Yield (epoch_ms, lat, lng) of a job's raw pings after since_ms, in time
+    order, merging JobLocationLog rows with packed segments (a job may have
+    both if LOCATION_STORAGE changed while it ran). Both sources are read
+    lazily, so memory stays flat however long the track is.
+    """
+    return heapq.merge(
+        _iter_row_points(job_id, since_ms),
+        iter_segment_points(job_id, since_ms),
+        key=lambda point: point[0],
+    )
+
+
+def _iter_row_points(job_id, since_ms=None):
+    # iterator() uses a server-side cursor on PostgreSQL.
+    rows = JobLocationLog.objects.filter(job_id=job_id)
+    if since_ms is not None:
+        # `t` is truncated to the millisecond; resume after that whole ms.
+        rows = rows.filter(timestamp__gte=datetime.fromtimestamp((since_ms + 1) / 1000, dt_timezone.utc))
+    for lat, lng, timestamp in (
+        rows.order_by("timestamp", "id")
+        .values_list("lat", "lng", "timestamp")
+        .iterator(chunk_size=STREAM_CHUNK_SIZE)
+    ):
+        yield int(timestamp.timestamp() * 1000), lat, lng
+
+
+def ndjson_chunks(points):
+    buffer = []
+    for epoch_ms, lat, lng in points:
+        buffer.append(json.dumps({"t": epoch_ms, "lat": lat, "lng": lng}) + "\n")
+        if len(buffer) == STREAM_CHUNK_SIZE:
+            yield "".join(buffer)
+            buffer = []
+    if buffer:
+        yield "".join(buffer)
+
+
+def binary_chunks(points):
+    buffer = bytearray()
+    for epoch_ms, lat, lng in points:
+        buffer += BINARY_RECORD.pack(epoch_ms, round(lat * 1e7), round(lng * 1e7))
+        if len(buffer) >= STREAM_CHUNK_SIZE * BINARY_RECORD.size:
+            yield bytes(buffer)
+            buffer.clear()
+    if buffer:
+        yield bytes(buffer)
+
+
+# ----------------------------
+# Compaction
+# ----------------------------
+def build_track(job_id, tolerance_m):
+    points = raw_points(job_id)
+    simplified = douglas_peucker(points, tolerance_m)
+    track, _ = JobTrack.objects.update_or_create(
+        job_id=job_id,
+        defaults={
+            "points": [list(point) for point in simplified],
+            "tolerance_m": tolerance_m,
+            "raw_point_count": len(points),
+            "started_at": datetime.fromtimestamp(points[0][2], dt_timezone.utc) if points else None,
+            "ended_at": datetime.fromtimestamp(points[-1][2], dt_timezone.utc) if points else None,
+        },
+    )
+    return track
+
+
+def jobs_to_compact(rebuild=False):
+    """
+    Ids of finished jobs with raw pings and no track yet (or, with
+    rebuild, also those whose track can still be rebuilt from complete raw
+    pings).
+    """
+    jobs = Job.objects.filter(
+        Q(location_logs__isnull=False) | Q(track_segments__isnull=False),
+        status__in=FINISHED_JOB_STATUSES,
+    )
+    if rebuild:
+        jobs = jobs.filter(Q(track__isnull=True) | Q(track__raw_pruned=False))
+    else:
+        jobs = jobs.filter(track__isnull=True)
+    return jobs.order_by("id").values_list("id", flat=True).distinct()
+
+
+def prune_raw_points(retention_days, chunk_size=500):
+    """
+    Delete pings older than the retention window for jobs that already
+    have a track. Returns the number of pings deleted.
+    """
+    cutoff = timezone.now() - timedelta(days=retention_days)
+    job_ids = sorted(set(
+        JobLocationLog.objects.filter(job__track__isnull=False, timestamp__lt=cutoff)
+        .values_list("job_id", flat=True).distinct()
+    ) | set(
+        JobTrackSegment.objects.filter(job__track__isnull=False, ended_at__lt=cutoff)
+        .values_list("job_id", flat=True).distinct()
+    ))
+    deleted = 0
+    for start in range(0, len(job_ids), chunk_size):
+        chunk = job_ids[start:start + chunk_size]
+        JobTrack.objects.filter(job_id__in=chunk).update(raw_pruned=True)
+        deleted += JobLocationLog.objects.filter(job_id__in=chunk, timestamp__lt=cutoff).delete()[0]
+        # A segment goes once all of its pings are past the cutoff.
+        segments = JobTrackSegment.objects.filter(job_id__in=chunk, ended_at__lt=cutoff)
+        deleted += sum(segments.values_list("point_count", flat=True))
+        segments.delete()
+    return deleted
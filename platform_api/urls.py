@@ -3,10 +3,24 @@ from .views import (
     RegisterView,
     MeView,
     ProviderListView,
+    ProviderNearbyView,
     ProviderDetailView,
+    ProviderReviewListView,
+    ProviderFreeSlotsView,
+    ProviderAvailableView,
+    ProviderAvailabilityListCreateView,
+    ProviderAvailabilityDetailView,
     ProviderServiceListView,
+    SearchView,
     JobListCreateView,
     JobDetailView,
+    JobTimelineView,
+    JobRouteView,
+    JobTrackView,
+    JobDispatchView,
+    JobOfferListView,
+    JobOfferRespondView,
+    JobReviewView,
     BookingListCreateView,
     JobMilestoneUpdateView,
     MessageListView,
@@ -17,7 +31,9 @@ from .views import (
     FundMilestoneView,
     ReleaseMilestoneView,
     SubmitMilestoneWorkView,
-    update_job_location, 
+    JobLocationUpdateView,
+    LocationBufferStatsView,
+    OpsMapView,
     FundWalletView,
     MyTokenObtainPairView # <- new import
 )
@@ -40,15 +56,30 @@ urlpatterns = [
     # Providers
     # ----------------------------
     path("providers/", ProviderListView.as_view(), name="provider-list"),
+    path("providers/nearby/", ProviderNearbyView.as_view(), name="provider-nearby"),
+    path("providers/available/", ProviderAvailableView.as_view(), name="provider-available"),
     path("providers/<slug:slug>/", ProviderDetailView.as_view(), name="provider-detail"),
+    path("providers/<slug:slug>/reviews/", ProviderReviewListView.as_view(), name="provider-reviews"),
+    path("providers/<slug:slug>/availability/", ProviderFreeSlotsView.as_view(), name="provider-free-slots"),
+    path("availability/", ProviderAvailabilityListCreateView.as_view(), name="availability-list-create"),
+    path("availability/<int:pk>/", ProviderAvailabilityDetailView.as_view(), name="availability-detail"),
     path("provider-services/", ProviderServiceListView.as_view(), name="provider-service-list"),
+    path("search/", SearchView.as_view(), name="search"),
 
     # ----------------------------
     # Jobs & Bookings
     # ----------------------------
     path("jobs/", JobListCreateView.as_view(), name="job-list-create"),
     path("jobs/<int:pk>/", JobDetailView.as_view(), name="job-detail"),
-    path("jobs/<int:job_id>/update-location/", update_job_location, name="update-job-location"),  # <- new
+    path("jobs/<int:job_id>/update-location/", JobLocationUpdateView.as_view(), name="update-job-location"),
+    path("jobs/<int:pk>/timeline/", JobTimelineView.as_view(), name="job-timeline"),
+    path("jobs/<int:pk>/route/", JobRouteView.as_view(), name="job-route"),
+    path("jobs/<int:pk>/track/", JobTrackView.as_view(), name="job-track"),
+    path("jobs/<int:job_id>/review/", JobReviewView.as_view(), name="job-review"),
+    path("jobs/<int:pk>/dispatch/", JobDispatchView.as_view(), name="job-dispatch"),
+    path("offers/", JobOfferListView.as_view(), name="job-offer-list"),
+    path("offers/<int:pk>/accept/", JobOfferRespondView.as_view(), {"action": "accept"}, name="job-offer-accept"),
+    path("offers/<int:pk>/decline/", JobOfferRespondView.as_view(), {"action": "decline"}, name="job-offer-decline"),
     path("bookings/", BookingListCreateView.as_view(), name="booking-list-create"),
 
     # ----------------------------
@@ -64,6 +95,12 @@ urlpatterns = [
     # ----------------------------
     path("wallet/fund/", FundWalletView.as_view(), name="fund-wallet"),
 
+    # ----------------------------
+    # Ops
+    # ----------------------------
+    path("ops/location-buffer/", LocationBufferStatsView.as_view(), name="location-buffer-stats"),
+    path("ops/map/", OpsMapView.as_view(), name="ops-map"),
+
     # ----------------------------
     # Chat
     # ----------------------------
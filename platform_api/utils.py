@@ -10,10 +10,42 @@ def broadcast_job_location(job_id, lat, lng, status):
         f"job_{job_id}",
         {
             "type": "job_update",  # matches JobConsumer.job_update
+            "job_id": job_id,
             "data": {
                 "lat": lat,
                 "lng": lng,
                 "status": status,
             },
         }
-    )
\ No newline at end of file
+    )
+
+
+def broadcast_job_event(job_id, event):
+    """
+    Broadcast an ETA/arrival event (see eta.py) to the job's WebSocket clients.
+    """
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        f"job_{job_id}",
+        {
+            "type": "job_event",  # matches JobConsumer.job_event
+            "job_id": job_id,
+            "data": event,
+        }
+    )
+
+
+def broadcast_chat_message(job_id, message):
+    """
+    Fan a stored chat message (MessageSerializer data) out to the job's
+    chat sockets (see ChatConsumer).
+    """
+    channel_layer = get_channel_layer()
+    async_to_sync(channel_layer.group_send)(
+        f"chat_{job_id}",
+        {
+            "type": "chat_message",  # matches ChatConsumer.chat_message
+            "job_id": job_id,
+            "message": dict(message),
+        }
+    )
@@ -3,9 +3,18 @@ from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
 from django.contrib.auth import get_user_model
 from rest_framework import generics
 from rest_framework.views import APIView
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAdminUser, IsAuthenticated, AllowAny
 from rest_framework.response import Response
+from rest_framework.exceptions import ValidationError
 from django.core.exceptions import ObjectDoesNotExist
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.http import Http404, StreamingHttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.utils.decorators import method_decorator
 from django.views.decorators.csrf import csrf_exempt
 import requests
@@ -21,13 +30,45 @@ from .models import (
     ProviderService,
     Job,
     Booking,
-    JobMilestone
+    JobMilestone,
+    JobOffer,
+    JobStatusLog,
+    ProviderAvailability,
+    Review,
 )
 from .chat_serializers import ChatRoomSerializer, MessageSerializer
-from .provider_serializers import ProviderProfileSerializer, ProviderServiceSerializer
-from .jobs_serializers import JobSerializer, BookingSerializer, JobMilestoneSerializer
+from .provider_serializers import (
+    ProviderAvailabilitySerializer,
+    ProviderProfileSerializer,
+    ProviderServiceSerializer,
+)
+from .jobs_serializers import (
+    JobSerializer,
+    BookingSerializer,
+    JobMilestoneSerializer,
+    JobOfferSerializer,
+    JobStatusLogSerializer,
+)
 from .user_serializers import RegisterSerializer, UserSerializer
 from .permissions import IsProvider, IsCustomer
+from .review_serializers import ReviewSerializer
+from .pagination import (
+    ChatRoomCursorPagination,
+    JobTimelineCursorPagination,
+    MessageKeysetPagination,
+    ProviderCursorPagination,
+    ReviewCursorPagination,
+)
+from .conditional import ConditionalGetMixin, make_etag, not_modified, set_validators
+from .sparse_fields import SparseFieldsViewMixin
+from .job_workflow import (
+    InvalidTransition,
+    can_transition,
+    create_job,
+    lock_provider_schedule,
+    transition_job,
+)
+from . import dispatch, eta, facets, geo, ops_map, provider_cards, scheduling, search, tracks
 
 User = get_user_model()
 
@@ -70,127 +111,710 @@ class CustomerOnlyView(APIView):
 # Provider endpoints (PUBLIC - Marketplace browsing)
 # ----------------------------
 class ProviderListView(generics.ListAPIView):
-    queryset = ProviderProfile.objects.all()
+    """
+    Paginates over bare profile ids and serves each row from the cached
+    provider card, so a warm page never joins users or services.
+    ?sort=rating orders by the stored rating aggregate (indexed).
+    """
     serializer_class = ProviderProfileSerializer
     permission_classes = [AllowAny]
+    pagination_class = ProviderCursorPagination
+
+    def get_queryset(self):
+        ordering = self.paginator.get_ordering(self.request, None, self)
+        return ProviderProfile.objects.only('id', 'created_at', 'rating').order_by(*ordering)
+
+    def list(self, request, *args, **kwargs):
+        queryset = self.filter_queryset(self.get_queryset())
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(provider_cards.get_cards(p.id for p in page))
+        return Response(provider_cards.get_cards(queryset.values_list('id', flat=True)))
+
+
+class ProviderNearbyView(APIView):
+    """
+    Nearest providers to a point, optionally offering a given category.
+    GET /api/providers/nearby/?lat=<lat>&lng=<lng>&radius=<km>&category=<id>&limit=<n>
+    """
+    permission_classes = [AllowAny]
+    max_limit = 100
+
+    def get(self, request):
+        params = request.query_params
+        try:
+            lat = float(params["lat"])
+            lng = float(params["lng"])
+            radius = float(params.get("radius", 10))
+            limit = min(int(params.get("limit", 20)), self.max_limit)
+            category_id = int(params["category"]) if params.get("category") else None
+        except KeyError:
+            return Response({"detail": "lat and lng are required."}, status=400)
+        except ValueError:
+            return Response({"detail": "Invalid numeric parameter."}, status=400)
+        if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+            return Response({"detail": "Coordinates out of range."}, status=400)
+        if not 0 < radius <= geo.MAX_RADIUS_KM:
+            return Response({"detail": f"radius must be between 0 and {geo.MAX_RADIUS_KM} km."}, status=400)
+
+        matches = geo.nearby_providers(lat, lng, radius, category_id=category_id, limit=max(limit, 1))
+        distances = dict(matches)
+        results = [
+            dict(card, distance_km=round(distances[card["id"]], 3))
+            for card in provider_cards.get_cards(distances)
+        ]
+        return Response(results)
 
 
 class ProviderDetailView(generics.RetrieveAPIView):
-    queryset = ProviderProfile.objects.all()
+    queryset = ProviderProfile.objects.with_listing_relations()
     serializer_class = ProviderProfileSerializer
     lookup_field = 'slug'
     permission_classes = [AllowAny]
 
+    def retrieve(self, request, *args, **kwargs):
+        card = provider_cards.get_card_by_slug(self.kwargs[self.lookup_field])
+        if card is None:
+            raise Http404
+        updated_at = parse_datetime(card["updated_at"])
+        etag = make_etag("provider", card["id"], card["updated_at"])
+        response = not_modified(request, etag, updated_at)
+        if response is not None:
+            return response
+        return set_validators(Response(card), etag, updated_at)
+
 
 # ----------------------------
 # Provider services (PUBLIC - Needed for frontend listing)
 # ----------------------------
-class ProviderServiceListView(generics.ListAPIView):
-    queryset = ProviderService.objects.all()
+def finite_decimal(value):
+    # Decimal() accepts "NaN" and "Infinity", which no price can match.
+    number = Decimal(value)
+    if not number.is_finite():
+        raise ValueError(value)
+    return number
+
+
+class ProviderServiceListView(ConditionalGetMixin, generics.ListAPIView):
+    """
+    Filters: ?category=<id>&provider=<id>&min_price=<n>&max_price=<n>
+    (backed by the (category, price) and (provider, price) indexes).
+    ?facets=true wraps the results with per-category and per-price-bucket
+    counts.
+    """
+    queryset = ProviderService.objects.select_related('category')
     serializer_class = ProviderServiceSerializer
     permission_classes = [AllowAny]
 
+    def get_filters(self):
+        params = self.request.query_params
+        filters = {}
+        try:
+            for param, lookup, cast in (
+                ("category", "category_id", int),
+                ("provider", "provider_id", int),
+                ("min_price", "price__gte", finite_decimal),
+                ("max_price", "price__lte", finite_decimal),
+            ):
+                if params.get(param):
+                    filters[lookup] = cast(params[param])
+        except (ValueError, InvalidOperation):
+            raise ValidationError({"detail": f"Invalid value for '{param}'."})
+        return filters
+
+    def filter_queryset(self, queryset):
+        return queryset.filter(**self.get_filters())
+
+    def wants_facets(self):
+        return self.request.query_params.get("facets", "").lower() in ("1", "true", "yes")
+
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        if not self.wants_facets():
+            return response
+
+        filters = self.get_filters()
+        if set(filters) <= {"category_id"}:
+            facet_counts = facets.facets_from_counts(filters.get("category_id"))
+        else:
+            without_category = {k: v for k, v in filters.items() if k != "category_id"}
+            facet_counts = facets.facets_from_queryset(
+                ProviderService.objects.filter(**filters),
+                ProviderService.objects.filter(**without_category),
+            )
+        return Response({
+            "count": len(response.data),
+            "results": response.data,
+            "facets": facet_counts,
+        })
+
+    def get_version(self):
+        # Row count catches deletes, max(updated_at) catches inserts/edits
+        # (category renames touch their services).
+        filters = self.get_filters()
+        if self.wants_facets():
+            # Category facets count every category, so the stamp has to
+            # cover them too; it is a superset of the filtered rows.
+            filters.pop("category_id", None)
+        stats = ProviderService.objects.filter(**filters).aggregate(
+            count=Count('id'), last_modified=Max('updated_at')
+        )
+        etag = make_etag(
+            "services", self.request.get_full_path(), stats['count'], stats['last_modified']
+        )
+        return etag, stats['last_modified']
+
+
+class ProviderReviewListView(generics.ListAPIView):
+    serializer_class = ReviewSerializer
+    permission_classes = [AllowAny]
+    pagination_class = ReviewCursorPagination
+
+    def get_queryset(self):
+        return Review.objects.filter(provider__slug=self.kwargs["slug"]).select_related("customer")
+
+
+# ----------------------------
+# Provider availability
+# ----------------------------
+def _parse_schedule_params(params, default_days):
+    """
+    (start, end, duration) from ?start=&end=&duration= (ISO datetimes,
+    minutes); raises ValidationError on bad input.
+    """
+    try:
+        start = parse_datetime(params["start"]) if params.get("start") else timezone.now()
+        end = parse_datetime(params["end"]) if params.get("end") else None
+        duration = int(params.get("duration", 0))
+    except ValueError:
+        raise ValidationError({"detail": "Invalid start, end or duration."})
+    if start is None or (params.get("end") and end is None):
+        raise ValidationError({"detail": "start and end must be ISO 8601 datetimes."})
+    if timezone.is_naive(start):
+        start = timezone.make_aware(start)
+    if end is None:
+        end = start + timedelta(days=default_days) if default_days else start + timedelta(minutes=duration or 60)
+    elif timezone.is_naive(end):
+        end = timezone.make_aware(end)
+    if not start < end <= start + timedelta(days=scheduling.MAX_RANGE_DAYS) or duration < 0:
+        raise ValidationError({"detail": f"end must be after start and within {scheduling.MAX_RANGE_DAYS} days."})
+    return start, end, duration
+
+
+class ProviderFreeSlotsView(APIView):
+    """
+    Free slots of one provider, answered from the in-process interval index.
+    GET /api/providers/<slug>/availability/?start=<iso>&end=<iso>&duration=<minutes>
+    (defaults: from now, for 7 days, any length).
+    """
+    permission_classes = [AllowAny]
+
+    def get(self, request, slug):
+        provider_id = ProviderProfile.objects.filter(slug=slug).values_list("id", flat=True).first()
+        if provider_id is None:
+            raise Http404
+        start, end, duration = _parse_schedule_params(request.query_params, default_days=7)
+        slots = scheduling.free_slots(provider_id, start, end, min_minutes=duration)
+        return Response({
+            "provider": slug,
+            "start": start,
+            "end": end,
+            "slots": [{"start": slot_start, "end": slot_end} for slot_start, slot_end in slots],
+        })
+
+
+class ProviderAvailableView(APIView):
+    """
+    Providers free for a whole booking.
+    GET /api/providers/available/?start=<iso>&duration=<minutes>&category=<id>&limit=<n>
+    """
+    permission_classes = [AllowAny]
+    max_limit = 100
+
+    def get(self, request):
+        params = request.query_params
+        if not params.get("start"):
+            return Response({"detail": "start is required."}, status=400)
+        start, end, _ = _parse_schedule_params(params, default_days=0)
+        try:
+            limit = min(int(params.get("limit", 20)), self.max_limit)
+            category_id = int(params["category"]) if params.get("category") else None
+        except ValueError:
+            return Response({"detail": "Invalid numeric parameter."}, status=400)
+
+        provider_ids = (
+            scheduling.providers_free_at(start, end, category_id=category_id)
+            .order_by("-rating", "-id")
+            .values_list("id", flat=True)[:max(limit, 1)]
+        )
+        return Response(provider_cards.get_cards(provider_ids))
+
+
+class ProviderAvailabilityListCreateView(generics.ListCreateAPIView):
+    """
+    The authenticated provider's weekly working hours.
+    """
+    serializer_class = ProviderAvailabilitySerializer
+    permission_classes = [IsAuthenticated, IsProvider]
+
+    def get_queryset(self):
+        return ProviderAvailability.objects.filter(provider__user=self.request.user)
+
+    def perform_create(self, serializer):
+        serializer.save(provider=self.request.user.provider_profile)
+
+
+class ProviderAvailabilityDetailView(generics.RetrieveUpdateDestroyAPIView):
+    serializer_class = ProviderAvailabilitySerializer
+    permission_classes = [IsAuthenticated, IsProvider]
+
+    def get_queryset(self):
+        return ProviderAvailability.objects.filter(provider__user=self.request.user)
+
+
+# ----------------------------
+# Marketplace search (PUBLIC)
+# ----------------------------
+class SearchView(APIView):
+    """
+    Ranked search over provider bios/locations, service titles/descriptions
+    and category names. GET /api/search/?q=<terms>&limit=<n>
+    """
+    permission_classes = [AllowAny]
+    max_limit = 50
+
+    def get(self, request):
+        query = request.query_params.get("q", "").strip()
+        if not query:
+            return Response({"detail": "Query parameter 'q' is required."}, status=400)
+        try:
+            limit = min(int(request.query_params.get("limit", 20)), self.max_limit)
+        except ValueError:
+            return Response({"detail": "limit must be an integer."}, status=400)
+
+        results = []
+        for document, score in search.search(query, limit=max(limit, 1)):
+            service = document.service
+            results.append({
+                "type": "service" if service else "provider",
+                "id": service.id if service else document.provider_id,
+                "provider": document.provider.slug,
+                "provider_name": document.provider.user.username,
+                "title": service.title if service else document.provider.user.username,
+                "category": service.category.name if service else None,
+                "price": str(service.price) if service else None,
+                "location": document.provider.location,
+                "score": round(score, 4),
+            })
+        return Response({"query": query, "results": results})
+
 
 # ----------------------------
 # Jobs & Bookings (AUTH REQUIRED)
 # ----------------------------
-class JobListCreateView(generics.ListCreateAPIView):
+class JobListCreateView(SparseFieldsViewMixin, generics.ListCreateAPIView):
+    """
+    Supports ?fields=id,status,service.title and ?expand=service,milestones;
+    only the requested relations are serialized and eager-loaded.
+    """
     serializer_class = JobSerializer
     permission_classes = [IsAuthenticated, IsCustomer]
 
     def get_queryset(self):
-        return Job.objects.filter(customer=self.request.user)
+        return self.optimize_queryset(Job.objects.filter(customer=self.request.user))
 
     def perform_create(self, serializer):
-        job = serializer.save(customer=self.request.user)
-
-        # Auto-create default milestones
-        default_milestones = [
-            {"title": "Initial Assessment", "amount": 0},
-            {"title": "Work In Progress", "amount": 0},
-            {"title": "Final Review", "amount": 0},
-        ]
-        for m in default_milestones:
-            JobMilestone.objects.create(
-                job=job,
-                title=m["title"],
-                amount=m["amount"],
-                completed=False
+        data = serializer.validated_data
+        site = None
+        if data.get("site_latitude") is not None and data.get("site_longitude") is not None:
+            site = (data["site_latitude"], data["site_longitude"])
+        try:
+            job = create_job(
+                customer=self.request.user,
+                scheduled_for=data["scheduled_for"],
+                service=data.get("service"),
+                category=data.get("category"),
+                site=site,
+                duration_minutes=data.get("duration_minutes", 60),
             )
-
-from django.http import JsonResponse
-from .utils import broadcast_job_location
+        except scheduling.ScheduleConflict as e:
+            raise ValidationError({"scheduled_for": [str(e)]})
+        if job.provider_id is None:
+            dispatch.dispatch_jobs([job])
+        serializer.instance = job
+
+from .utils import broadcast_chat_message, broadcast_job_event, broadcast_job_location
+from .location_buffer import location_buffer
+from .coalescing import should_broadcast
+from .positions import record_position
+from .track_storage import write_pings
 from .models import Job
 
-def update_job_location(request, job_id):
+class JobLocationUpdateView(APIView):
     """
-    Endpoint to update job location and broadcast to WebSocket clients.
-    Expects POST data: lat, lng, status
+    Location ping from the job's provider over HTTP, broadcast to the
+    job's WebSocket clients. Expects lat, lng and optionally status. The
+    ping is stored with the job's location history and the position goes
+    to the last-known-position cache; the Job row only changes when a
+    different status is posted.
     """
-    lat = request.POST.get("lat")
-    lng = request.POST.get("lng")
-    status = request.POST.get("status", "in_progress")
+    permission_classes = [IsAuthenticated, IsProvider]
 
-    # Save to database
-    try:
-        job = Job.objects.get(id=job_id)
-        job.lat = lat
-        job.lng = lng
-        job.status = status
-        job.save()
-    except Job.DoesNotExist:
-        return JsonResponse({"success": False, "detail": "Job not found"}, status=404)
+    def post(self, request, job_id):
+        job = Job.objects.filter(pk=job_id, provider__user=request.user).first()
+        if job is None:
+            return Response({"success": False, "detail": "Job not found"}, status=404)
 
-    # Broadcast to WebSocket
-    broadcast_job_location(job_id, lat, lng, status)
+        status = request.data.get("status")
+        try:
+            lat, lng = geo.parse_coordinates(request.data.get("lat"), request.data.get("lng"))
+        except ValueError as e:
+            return Response({"success": False, "detail": str(e)}, status=400)
+
+        if status and status != job.status:
+            try:
+                transition_job(job, status)
+            except InvalidTransition as e:
+                return Response({"success": False, "detail": str(e)}, status=400)
+        else:
+            status = job.status
+
+        events = []
+        if lat is not None and lng is not None:
+            received_at = timezone.now()
+            # There is no event loop here to drive the location buffer, so
+            # the ping is written directly.
+            write_pings([(job.pk, request.user.id, lat, lng, received_at)])
+            record_position(job_id, lat, lng, status, received_at)
+            events = eta.process_ping(job_id, lat, lng)
+
+        # Broadcast to WebSocket unless coalesced away
+        broadcast = should_broadcast(job_id, lat, lng, status)
+        if broadcast:
+            broadcast_job_location(job_id, lat, lng, status)
+        for event in events:
+            broadcast_job_event(job_id, event)
+
+        return Response({"success": True, "broadcast": broadcast, "events": events})
+
+
+class OpsMapView(APIView):
+    """
+    Live positions of all active jobs for the ops map.
+    GET /api/ops/map/?bbox=<min_lng>,<min_lat>,<max_lng>,<max_lat>&since=<version>
+    Poll with the returned `version` as `since` to receive only changes.
+    """
+    permission_classes = [IsAdminUser]
 
-    return JsonResponse({"success": True})
+    def get(self, request):
+        params = request.query_params
+        try:
+            bbox = ops_map.parse_bbox(params["bbox"]) if params.get("bbox") else None
+            since = int(params["since"]) if params.get("since") else None
+        except ValueError:
+            return Response({"detail": "Invalid bbox or since."}, status=400)
+        return Response(ops_map.snapshot(bbox=bbox, since=since))
 
 
-class JobDetailView(generics.RetrieveUpdateAPIView):
-    queryset = Job.objects.all()
+class LocationBufferStatsView(APIView):
+    """
+    Depth and flush latency of this process's location write buffer.
+    """
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response(location_buffer.stats())
+
+
+def participant_jobs(user):
+    """
+    Jobs the user is the customer or provider of (every job for staff).
+    """
+    if user.is_staff:
+        return Job.objects.all()
+    return Job.objects.filter(Q(customer=user) | Q(provider__user=user))
+
+
+class JobDetailView(ConditionalGetMixin, SparseFieldsViewMixin, generics.RetrieveUpdateAPIView):
+    """
+    A job for its customer, its provider and staff; 404 for anyone else,
+    so status changes and reschedules stay with the participants.
+    """
     serializer_class = JobSerializer
     permission_classes = [IsAuthenticated]
 
+    def get_queryset(self):
+        return self.optimize_queryset(participant_jobs(self.request.user))
+
+    def get_version(self):
+        stamps = (
+            participant_jobs(self.request.user).filter(pk=self.kwargs["pk"])
+            .values_list("updated_at", "service__updated_at", "provider__updated_at")
+            .first()
+        )
+        if stamps is None:
+            return None
+        etag = make_etag("job", self.kwargs["pk"], self.request.get_full_path(), *stamps)
+        return etag, max(stamp for stamp in stamps if stamp is not None)
+
+    def perform_update(self, serializer):
+        # Status changes go through the transition engine so they are
+        # validated and logged; everything else is a plain update.
+        status = serializer.validated_data.pop("status", None)
+        data, job = serializer.validated_data, serializer.instance
+        with transaction.atomic():
+            # Lock and check the new slot before writing it.
+            if job.provider_id and {"scheduled_for", "duration_minutes"} & set(data):
+                lock_provider_schedule(job.provider_id)
+                start = data.get("scheduled_for", job.scheduled_for)
+                end = start + timedelta(minutes=data.get("duration_minutes", job.duration_minutes))
+                try:
+                    scheduling.check_conflicts(job.provider_id, start, end, exclude_job_id=job.pk)
+                except scheduling.ScheduleConflict as e:
+                    raise ValidationError({"scheduled_for": [str(e)]})
+            job = serializer.save()
+            if status is not None:
+                try:
+                    transition_job(job, status)
+                except InvalidTransition as e:
+                    raise ValidationError({"status": [str(e)]})
+
+
+def check_job_participant(user, job_id):
+    """
+    404 unless the user is the job's customer, its provider or staff.
+    """
+    job = Job.objects.filter(pk=job_id).values("customer_id", "provider__user_id").first()
+    if job is None or not (
+        user.is_staff or user.id in (job["customer_id"], job["provider__user_id"])
+    ):
+        raise Http404
+
+
+class JobTimelineView(generics.ListAPIView):
+    """
+    Status history of a job, newest first, keyset-paginated.
+    """
+    serializer_class = JobStatusLogSerializer
+    permission_classes = [IsAuthenticated]
+    pagination_class = JobTimelineCursorPagination
+
+    def get_queryset(self):
+        check_job_participant(self.request.user, self.kwargs["pk"])
+        return JobStatusLog.objects.filter(job_id=self.kwargs["pk"])
+
+
+class JobTrackView(APIView):
+    """
+    Streams a job's full-resolution location history, oldest first.
+    GET /api/jobs/<id>/track/?encoding=ndjson|binary&since=<epoch_ms>
+
+    ndjson: one {"t", "lat", "lng"} object per line. binary: 16-byte
+    little-endian records (int64 epoch ms, int32 lat * 1e7, int32 lng * 1e7).
+    Pass the last `t` received as `since` to resume an interrupted replay.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        check_job_participant(request.user, pk)
+        encoding = request.query_params.get("encoding", "ndjson")
+        if encoding not in ("ndjson", "binary"):
+            return Response({"detail": "encoding must be 'ndjson' or 'binary'."}, status=400)
+        try:
+            since = int(request.query_params["since"]) if request.query_params.get("since") else None
+        except ValueError:
+            since = -1
+        if since is not None and not 0 <= since < tracks.MAX_SINCE_MS:
+            return Response({"detail": "since must be epoch milliseconds."}, status=400)
+
+        points = tracks.iter_points(pk, since_ms=since)
+        if encoding == "binary":
+            response = StreamingHttpResponse(tracks.binary_chunks(points), content_type="application/octet-stream")
+            response["X-Track-Record-Format"] = "<qii; epoch_ms, lat_e7, lng_e7"
+        else:
+            response = StreamingHttpResponse(tracks.ndjson_chunks(points), content_type="application/x-ndjson")
+        response["Cache-Control"] = "no-store"
+        return response
+
+
+class JobRouteView(APIView):
+    """
+    Simplified route of a job as [lat, lng, unix_timestamp] points; read
+    from the stored track once compact_job_tracks has processed the job.
+    """
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk):
+        check_job_participant(request.user, pk)
+        points, compacted = tracks.route_points(pk)
+        return Response({"job": pk, "compacted": compacted, "points": points})
+
 
-class BookingListCreateView(generics.ListCreateAPIView):
+# ----------------------------
+# Dispatch offers
+# ----------------------------
+class JobDispatchView(APIView):
+    """
+    (Re-)offer an open job to the best-scoring providers who have not been
+    offered it yet.
+    """
+    permission_classes = [IsAuthenticated, IsCustomer]
+
+    def post(self, request, pk):
+        try:
+            job = Job.objects.get(pk=pk, customer=request.user)
+        except Job.DoesNotExist:
+            return Response({"detail": "Job not found."}, status=404)
+        if job.provider_id is not None or job.status != "created":
+            return Response({"detail": "Job is not open for dispatch."}, status=400)
+
+        offers = dispatch.dispatch_jobs([job])
+        return Response({
+            "offers": [{"provider": offer.provider_id, "score": offer.score} for offer in offers]
+        })
+
+
+class JobOfferListView(generics.ListAPIView):
+    serializer_class = JobOfferSerializer
+    permission_classes = [IsAuthenticated, IsProvider]
+
+    def get_queryset(self):
+        return (
+            JobOffer.objects.filter(provider__user=self.request.user, status="pending")
+            .select_related("job__customer", "job__category")
+            .prefetch_related("job__milestones")
+            .order_by("-created_at")
+        )
+
+
+class JobOfferRespondView(APIView):
+    permission_classes = [IsAuthenticated, IsProvider]
+
+    def post(self, request, pk, action):
+        try:
+            offer = JobOffer.objects.get(pk=pk, provider__user=request.user)
+        except JobOffer.DoesNotExist:
+            return Response({"detail": "Offer not found."}, status=404)
+
+        if action == "decline":
+            JobOffer.objects.filter(pk=offer.pk, status="pending").update(status="declined")
+            return Response({"detail": "Offer declined."})
+
+        try:
+            job = dispatch.accept_offer(offer)
+        except dispatch.OfferUnavailable as e:
+            return Response({"detail": str(e)}, status=409)
+        return Response({"detail": "Offer accepted.", "job": job.id})
+
+
+class BookingListCreateView(SparseFieldsViewMixin, generics.ListCreateAPIView):
     serializer_class = BookingSerializer
     permission_classes = [IsAuthenticated]
 
     def get_queryset(self):
         user = self.request.user
         if user.role == "provider":
-            return Booking.objects.filter(job__service__provider__user=user)
-        return Booking.objects.filter(job__customer=user)
+            bookings = Booking.objects.filter(job__service__provider__user=user)
+        else:
+            bookings = Booking.objects.filter(job__customer=user)
+        return self.optimize_queryset(bookings)
+
+
+class JobReviewView(APIView):
+    """
+    Customer review of a completed job. POST creates it, PUT updates it;
+    the provider's rating aggregates are adjusted incrementally either way.
+    """
+    permission_classes = [IsAuthenticated, IsCustomer]
+
+    def post(self, request, job_id):
+        job, error = self._get_reviewable_job(request, job_id)
+        if error:
+            return error
+        if Review.objects.filter(job=job).exists():
+            return Response({"detail": "Job already reviewed."}, status=400)
+
+        serializer = ReviewSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(job=job, provider=job.provider, customer=request.user)
+        return Response(serializer.data, status=201)
+
+    def put(self, request, job_id):
+        job, error = self._get_reviewable_job(request, job_id)
+        if error:
+            return error
+        try:
+            review = job.review
+        except Review.DoesNotExist:
+            return Response({"detail": "Review not found."}, status=404)
+
+        serializer = ReviewSerializer(review, data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return Response(serializer.data)
+
+    def _get_reviewable_job(self, request, job_id):
+        try:
+            job = Job.objects.get(id=job_id)
+        except Job.DoesNotExist:
+            return None, Response({"detail": "Job not found."}, status=404)
+        if job.customer_id != request.user.id:
+            return None, Response({"detail": "Not your job."}, status=403)
+        # A closed job counts only if it was completed first; jobs closed
+        # before or instead of being worked on can't be reviewed.
+        completed = job.status == "completed" or (
+            job.status == "closed" and job.status_logs.filter(status="completed").exists()
+        )
+        if job.provider_id is None or not completed:
+            return None, Response({"detail": "Only completed jobs can be reviewed."}, status=400)
+        return job, None
 
 
 # ----------------------------
-# Milestone completion toggle (Provider only)
+# Milestone edits (Provider only)
 # ----------------------------
 class JobMilestoneUpdateView(generics.UpdateAPIView):
-    queryset = JobMilestone.objects.all()
+    """
+    Title and amount of the provider's own milestones; funding and release
+    state only change through the escrow views below.
+    """
     serializer_class = JobMilestoneSerializer
     permission_classes = [IsAuthenticated, IsProvider]
 
-    def perform_update(self, serializer):
-        milestone = serializer.save()
-        job = milestone.job
-        if all(m.completed for m in job.milestones.all()):
-            job.status = "completed"
-            job.save()
+    def get_queryset(self):
+        return JobMilestone.objects.filter(job__provider__user=self.request.user)
+
+
+def complete_job_if_released(job):
+    """
+    Move the job to completed once every milestone has been released.
+    """
+    if (
+        can_transition(job.status, "completed")
+        and not job.milestones.filter(released=False).exists()
+    ):
+        transition_job(job, "completed")
 
 
 # ----------------------------
 # Chat
 # ----------------------------
 class MessageListView(generics.ListAPIView):
+    """
+    A job's chat history, keyset-paginated (see MessageKeysetPagination).
+    Reading never creates the room; a job without one has no messages.
+    """
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageKeysetPagination
 
     def get_queryset(self):
         job_id = self.kwargs["room_id"]
-        room, _ = ChatRoom.objects.get_or_create(job_id=job_id)
-        return Message.objects.filter(room=room)
+        check_job_participant(self.request.user, job_id)
+        room_id = ChatRoom.objects.filter(job_id=job_id).values_list("id", flat=True).first()
+        if room_id is None:
+            return Message.objects.none()
+        return Message.objects.filter(room_id=room_id).select_related("sender")
 
 
 class MessageCreateView(generics.CreateAPIView):
@@ -199,17 +823,37 @@ class MessageCreateView(generics.CreateAPIView):
 
     def perform_create(self, serializer):
         job_id = self.kwargs["room_id"]
+        check_job_participant(self.request.user, job_id)
         room, _ = ChatRoom.objects.get_or_create(job_id=job_id)
         serializer.save(sender=self.request.user, room=room)
+        # Live chat sockets see HTTP sends too.
+        broadcast_chat_message(job_id, serializer.data)
 
 
 class ChatRoomListView(generics.ListAPIView):
+    """
+    The user's inbox: one row per room with its last message and unread
+    count, most recently active first, cursor-paginated.
+    """
     serializer_class = ChatRoomSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = ChatRoomCursorPagination
 
     def get_queryset(self):
         user = self.request.user
-        return ChatRoom.objects.filter(job__customer=user) | ChatRoom.objects.filter(job__service__provider__user=user)
+        unread = (
+            Message.objects.filter(room=OuterRef("pk"), read=False)
+            .exclude(sender=user)
+            .order_by()
+            .values("room")
+            .annotate(count=Count("id"))
+            .values("count")
+        )
+        return (
+            ChatRoom.objects.filter(Q(job__customer=user) | Q(job__provider__user=user))
+            .select_related("last_message__sender")
+            .annotate(unread_count=Coalesce(Subquery(unread), 0))
+        )
     
 class FundMilestoneView(APIView):
     permission_classes = [IsAuthenticated, IsCustomer]
@@ -218,6 +862,8 @@ class FundMilestoneView(APIView):
         user = request.user
         try:
             milestone = JobMilestone.objects.get(id=milestone_id)
+            if milestone.job.provider_id is None:
+                return Response({"detail": "Job has no provider yet."}, status=400)
             if milestone.funded:
                 return Response({"detail": "Milestone already funded."}, status=400)
             if milestone.job.customer != user:
@@ -242,6 +888,7 @@ class FundMilestoneView(APIView):
 
             # Mark milestone funded
             milestone.funded = True
+            milestone.status = "funded"
             milestone.save()
 
             # Log transaction
@@ -263,6 +910,8 @@ class ReleaseMilestoneView(APIView):
         user = request.user
         try:
             milestone = JobMilestone.objects.get(id=milestone_id)
+            if milestone.job.provider_id is None:
+                return Response({"detail": "Job has no provider yet."}, status=400)
             escrow = Escrow.objects.get(milestone=milestone)
 
             if milestone.job.customer != user:
@@ -285,9 +934,12 @@ class ReleaseMilestoneView(APIView):
             admin_wallet.balance += admin_cut
             admin_wallet.save()
 
-            # Mark escrow as released
+            # Mark escrow and milestone as released
             escrow.released = True
             escrow.save()
+            milestone.released = True
+            milestone.status = "released"
+            milestone.save(update_fields=["released", "status"])
 
             # Log transactions
             Transaction.objects.create(
@@ -303,6 +955,8 @@ class ReleaseMilestoneView(APIView):
                 description=f"Platform cut for milestone {milestone.title} Job {milestone.job.id}"
             )
 
+            complete_job_if_released(milestone.job)
+
             return Response({"detail": "Milestone released successfully."})
 
         except JobMilestone.DoesNotExist:
@@ -316,6 +970,8 @@ class SubmitMilestoneWorkView(APIView):
     def post(self, request, milestone_id):
         try:
             milestone = JobMilestone.objects.get(id=milestone_id)
+            if milestone.job.provider_id is None:
+                return Response({"detail": "Job has no provider yet."}, status=400)
 
             # Ensure the logged-in user is the provider
             if milestone.job.provider.user != request.user: